@@ -0,0 +1,54 @@
+
+
+"""This class keeps track of which balls are still on the table. Every ball has a stable index: its position in the table's
+list_all_balls, which never changes, so anything indexed by ball (the impact solver's acceptable distance tables, the broad
+phase's bounds) stays valid as balls are removed. The active set is the list of balls (and their indices) that are still in
+play; once a ball is pocketed it is removed, and every loop over the active set skips it at no cost. It behaves like a list
+of the active balls, so it can be passed straight to the ODE solver."""
+class Active_Set():
+
+    def __init__(self, balls):
+        self.all_balls = balls
+        self.reset()
+
+    """Puts every ball back in the active set."""
+    def reset(self):
+        self.indices = range(len(self.all_balls)) # stable indices of the active balls, in increasing order
+        self.balls = list(self.all_balls) # the active balls themselves, in the same order
+
+    """Removes every ball that has been pocketed (its last position is None). Returns the stable indices of the balls removed.
+    The lists are rebuilt rather than edited in place, so it is safe to call while nothing else is looping over them."""
+    def remove_sunk(self):
+        removed = []
+        indices = []
+        for index in self.indices:
+            ball = self.all_balls[index]
+            end = len(ball.position_x_record) - 1
+            if ball.position_x_record[end] == None or ball.position_y_record[end] == None:
+                removed.append(index)
+            else:
+                indices.append(index)
+        if removed:
+            self.indices = indices
+            self.balls = [self.all_balls[index] for index in indices]
+        return removed
+
+    """Puts a ball that was removed back in play (a scratched cue ball, or a spotted ball), keeping the indices in order."""
+    def add(self, index):
+        if index in self.indices:
+            return
+        self.indices = sorted(self.indices + [index])
+        self.balls = [self.all_balls[counter] for counter in self.indices]
+
+    """Returns True if the ball with the given stable index is still in play."""
+    def contains(self, index):
+        return index in self.indices
+
+    def __len__(self):
+        return len(self.balls)
+
+    def __iter__(self):
+        return iter(self.balls)
+
+    def __getitem__(self, position):
+        return self.balls[position]
@@ -0,0 +1,308 @@
+
+import Table_Class
+import Shot_Geometry
+import multiprocessing
+import collections
+import itertools
+import argparse
+import numpy
+import json
+import time
+import csv
+import sys
+
+"""This module runs shot lists from files: any number of [velocity, angle, x_position] rows (the take_shot arguments) in,
+one outcome per row out. It is meant as the main way of running shots made by other tools, rather than editing Player.py
+or Heatmap_Iterator.py. Run it as
+    python Batch_Runner.py shots.csv outcomes.csv [--processes 4] [--precision FAST] ...
+The input is read a chunk of rows at a time and every chunk's outcomes are written (and flushed) as soon as it is done, so
+memory stays the same however long the list is, and the outcomes of a run that is stopped part way are kept. Each worker
+re-racks one table for every row (see Table_Class.rerack) rather than building a new one, and drops the state history as it
+goes (keep_history off). With more than one process, only a couple of chunks per worker are ever waiting, and outcomes are
+still written in the order of the input.
+Input, by file name:
+    .npy: an array with a row per shot, of 2 (velocity, angle) or 3 (x_position too) columns, or a structured array with
+        those field names. It is memory mapped, so only the rows being run are read in.
+    anything else: comma separated text, one shot per line, velocity, angle and optionally x_position, with or without a
+        header line naming the columns (in any order). Blank lines and lines starting with # are skipped.
+    An x_position that is empty, nan or None is worked out from the angle, as take_shot does. Any other value that isn't a
+    finite number makes the row BAD_INPUT.
+Output, by file name: .jsonl gives one JSON dictionary per line; anything else, comma separated text with a header line
+(OUTPUT_COLUMNS, lists of balls written space separated). Every row gets an outcome: row (counting shots from 0),
+velocity, angle, x_position, status, balls_sunk, sunk_balls, first_contact, solver_steps and run_time. status is what
+take_shot returned, PRUNED_HOPELESS or PRUNED_TRIVIAL for a shot that was classified instead of simulated (see --prune and
+Shot_Geometry.py), BAD_INPUT for a row that couldn't be read, or ERROR for a shot the simulation failed on (an angle of 0
+with no x_position, for one). Neither stops the run.
+Like the sweeps, each shot runs until the balls stop, unless --stop-when-decided is given (see Table_Class.take_shot).
+
+Last measured (9-ball, FAST, random breaks, chunks of 50, --stop-when-decided): 250 rows and 2000 rows both peaked at
+56 MB, at 17-18 shots a second on one process; the 2000 rows from a .npy over 3 workers (sharing a single core) gave the
+same outcomes, with no process over 56 MB either."""
+
+
+OUTPUT_COLUMNS = ["row", "velocity", "angle", "x_position", "status", "balls_sunk", "sunk_balls", "first_contact",
+                  "solver_steps", "run_time"]
+INPUT_COLUMNS = ["velocity", "angle", "x_position"]
+npy_block = 4096 # rows read from a memory mapped .npy at a time.
+
+
+"""Returns x_position as take_shot wants it: None for a missing value."""
+def x_position_value(value):
+    if value == None:
+        return None
+    if isinstance(value, str):
+        if value.strip() in ["", "None", "none"]:
+            return None
+        value = float(value)
+    if numpy.isnan(value):
+        return None
+    return float(value)
+
+
+"""Returns [row, velocity, angle, x_position] for a shot read from a file, with the values as take_shot wants them. Raises
+ValueError if velocity or angle isn't a finite number, or x_position is neither a finite number nor missing."""
+def shot_values(row, velocity, angle, x_position):
+    velocity = float(velocity)
+    angle = float(angle)
+    x_position = x_position_value(x_position)
+    for value in [velocity, angle, x_position]:
+        if value != None and not numpy.isfinite(value):
+            raise ValueError("not a finite number: " + str(value))
+    return [row, velocity, angle, x_position]
+
+
+"""Yields [row, velocity, angle, x_position] for every shot in a comma separated file (see the module description). A line
+that can't be read is reported and yielded as [row, None, None, None]."""
+def read_csv_shots(path):
+    with open(path, "r") as input_file:
+        columns = None
+        row = 0
+        for line_number, fields in enumerate(csv.reader(input_file)):
+            fields = [field.strip() for field in fields]
+            if not fields or fields == [""] or fields[0].startswith("#"):
+                continue
+            if columns == None:
+                columns = [0, 1, 2]
+                names = [field.lower() for field in fields]
+                if [name for name in names if name in INPUT_COLUMNS]:
+                    if "velocity" not in names or "angle" not in names:
+                        print "Input header must name velocity and angle. Error Code: 8153096247"
+                        raise ValueError("input header must name velocity and angle")
+                    columns = [names.index(name) if name in names else None for name in INPUT_COLUMNS]
+                    continue
+            try:
+                x_position = None
+                if columns[2] != None and columns[2] < len(fields):
+                    x_position = fields[columns[2]]
+                shot = shot_values(row, fields[columns[0]], fields[columns[1]], x_position)
+            except (ValueError, IndexError):
+                print "Line " + str(line_number + 1) + " of " + path + " can't be read. Error Code: 4027718395"
+                shot = [row, None, None, None]
+            yield shot
+            row += 1
+
+
+"""Yields [row, velocity, angle, x_position] for every shot in a .npy file (see the module description)."""
+def read_npy_shots(path):
+    shots = numpy.load(path, mmap_mode = "r")
+    if shots.dtype.names != None:
+        columns = [name if name in shots.dtype.names else None for name in INPUT_COLUMNS]
+    elif shots.ndim == 2 and shots.shape[1] in [2, 3]:
+        columns = [0, 1, None]
+        if shots.shape[1] == 3:
+            columns[2] = 2
+    else:
+        print "A .npy shot list needs 2 or 3 columns. Error Code: 7391046285"
+        raise ValueError("a .npy shot list needs 2 or 3 columns")
+    for start in range(0, len(shots), npy_block):
+        block = numpy.array(shots[start:start + npy_block]) # the only part read into memory.
+        for counter in range(len(block)):
+            entry = block[counter]
+            x_position = None
+            if columns[2] != None:
+                x_position = float(entry[columns[2]])
+            try:
+                yield shot_values(start + counter, entry[columns[0]], entry[columns[1]], x_position)
+            except ValueError:
+                print "Row " + str(start + counter) + " of " + path + " can't be read. Error Code: 2864130957"
+                yield [start + counter, None, None, None]
+
+
+"""Yields every shot in the file at path, picking the reader by the file name."""
+def read_shots(path):
+    if path.lower().endswith(".npy"):
+        return read_npy_shots(path)
+    return read_csv_shots(path)
+
+
+"""Yields lists of up to size items from iterable, reading no further ahead than that."""
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# the tables a worker process keeps between chunks, by their settings.
+worker_tables = {}
+
+"""Runs a chunk of shots. The task is [shots, settings], with shots as read_shots yields them and settings a dictionary of
+game_type, table_size, precision, stop_when_decided and prune; a list of outcome dictionaries (see the module description)
+is returned in the same order. A shot the simulation fails on is reported and marked ERROR, and the rest of the chunk still
+runs. A plain module level function so that it can be handed to worker processes."""
+def run_chunk(task):
+    shots, settings = task
+    key = json.dumps([settings["game_type"], settings["table_size"], settings["precision"]], sort_keys = True)
+    outcomes = []
+    for row, velocity, angle, x_position in shots:
+        start_time = time.time()
+        outcome = {"row": row, "velocity": velocity, "angle": angle, "x_position": x_position, "status": "BAD_INPUT",
+                   "balls_sunk": None, "sunk_balls": None, "first_contact": None, "solver_steps": 0}
+        if velocity != None:
+            try:
+                run_row(worker_table(key, settings), velocity, angle, x_position, settings, outcome)
+            except Exception as error:
+                print "Shot on row " + str(row) + " failed (" + repr(error) + "). Error Code: 9305716482"
+                outcome.update({"status": "ERROR", "balls_sunk": None, "sunk_balls": None, "first_contact": None,
+                                "solver_steps": 0})
+                # the table may have been left part way through the shot, so the next row gets a new one.
+                worker_tables.pop(key, None)
+        outcome["run_time"] = time.time() - start_time
+        outcomes.append(outcome)
+    return outcomes
+
+
+"""Returns this worker's table for the given settings (see run_chunk), building it the first time."""
+def worker_table(key, settings):
+    if key not in worker_tables:
+        my_table = Table_Class.Pool_Table(settings["game_type"], settings["table_size"], settings["precision"])
+        my_table.keep_history = False # only the outcome is needed, so there is no point holding on to every step.
+        worker_tables[key] = my_table
+    return worker_tables[key]
+
+
+"""Re-racks my_table, takes one shot on it (or classifies it, see --prune) and fills in outcome."""
+def run_row(my_table, velocity, angle, x_position, settings, outcome):
+    my_table.rerack()
+    initial_ball_count = my_table.num_balls_remaining()
+    shot_class = None
+    if settings["prune"]:
+        shot_class = Shot_Geometry.Shot_Geometry(my_table).classify_break(velocity, angle, x_position)
+    if shot_class != None and shot_class["predicted_sunk"] != None:
+        outcome["status"] = "PRUNED_" + shot_class["class"]
+        outcome["sunk_balls"] = shot_class["predicted_sunk"]
+        outcome["balls_sunk"] = len(shot_class["predicted_sunk"])
+        if shot_class["first_ball"] != None:
+            outcome["first_contact"] = sorted([shot_class["first_ball"], my_table.cue_ball_index()])
+    else:
+        outcome["status"] = my_table.take_shot(velocity, angle, x_position, settings["stop_when_decided"])
+        outcome["sunk_balls"] = [counter for counter in range(len(my_table.list_all_balls))
+                                 if not my_table.list_active_balls.contains(counter)]
+        outcome["balls_sunk"] = initial_ball_count - my_table.num_balls_remaining()
+        outcome["first_contact"] = my_table.first_contact()
+        outcome["solver_steps"] = my_table.smart_guy.step_counter
+
+
+"""This class writes outcomes to a file as they come in (see the module description for the formats), flushing after
+every batch so that nothing finished is lost if the run is stopped."""
+class Outcome_Writer():
+
+    def __init__(self, path):
+        self.output_file = open(path, "w")
+        self.json_lines = path.lower().endswith(".jsonl")
+        self.count = 0
+        if not self.json_lines:
+            self.output_file.write(",".join(OUTPUT_COLUMNS) + "\n")
+
+    """Returns one value as written to a comma separated file."""
+    def csv_value(self, value):
+        if value == None:
+            return ""
+        if isinstance(value, list):
+            return " ".join([str(entry) for entry in value])
+        if isinstance(value, float):
+            return repr(value)
+        return str(value)
+
+    """Writes a list of outcomes, and makes sure they reach the file."""
+    def write(self, outcomes):
+        for outcome in outcomes:
+            if self.json_lines:
+                self.output_file.write(json.dumps(outcome) + "\n")
+            else:
+                self.output_file.write(",".join([self.csv_value(outcome[name]) for name in OUTPUT_COLUMNS]) + "\n")
+        self.output_file.flush()
+        self.count += len(outcomes)
+
+    def close(self):
+        self.output_file.close()
+
+
+"""Runs every shot in input_path and writes the outcomes to output_path, chunk_size shots at a time, over the given number
+of worker processes (see the module description). If report is True, progress is printed to standard error after every
+chunk. Returns the number of shots run."""
+def run_batch(input_path, output_path, game_type = "9_BALL", table_size = "9_FT", precision = "BALANCED", processes = 1,
+              chunk_size = 50, stop_when_decided = False, prune = False, report = False):
+    settings = {"game_type": game_type, "table_size": table_size, "precision": precision,
+                "stop_when_decided": stop_when_decided, "prune": prune}
+    writer = Outcome_Writer(output_path)
+    start_time = time.time()
+    pool = None
+    try:
+        tasks = ([chunk, settings] for chunk in chunks(read_shots(input_path), chunk_size))
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+            # a bounded window of chunks in flight: Pool.imap would read the whole input in ahead of the workers.
+            pending = collections.deque()
+            for task in tasks:
+                pending.append(pool.apply_async(run_chunk, [task]))
+                if len(pending) >= 2 * processes:
+                    writer.write(pending.popleft().get())
+                    if report:
+                        progress_report(writer.count, start_time)
+            while pending:
+                writer.write(pending.popleft().get())
+                if report:
+                    progress_report(writer.count, start_time)
+        else:
+            for task in tasks:
+                writer.write(run_chunk(task))
+                if report:
+                    progress_report(writer.count, start_time)
+    finally:
+        if pool != None:
+            pool.terminate()
+        writer.close()
+    return writer.count
+
+
+"""Prints the number of shots done so far, and how fast they are going, to standard error."""
+def progress_report(count, start_time):
+    elapsed = time.time() - start_time
+    if elapsed > 0:
+        sys.stderr.write("%d shots done, %.1f shots/s\n" % (count, count / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run a list of shots from a file, writing every outcome to another.")
+    parser.add_argument("input", help = "shot list: comma separated text, or .npy")
+    parser.add_argument("output", help = "outcomes: comma separated text, or .jsonl")
+    parser.add_argument("--game-type", default = "9_BALL")
+    parser.add_argument("--table-size", default = "9_FT", choices = ["9_FT", "8_FT", "7_FT"])
+    parser.add_argument("--precision", default = "BALANCED", choices = sorted(Table_Class.PRECISION_PRESETS.keys()))
+    parser.add_argument("--processes", type = int, default = 1)
+    parser.add_argument("--chunk-size", type = int, default = 50, help = "shots handed to a worker at a time")
+    parser.add_argument("--stop-when-decided", action = "store_true",
+                        help = "stop each shot once no more balls can be sunk")
+    parser.add_argument("--prune", action = "store_true", help = "don't simulate shots whose outcome geometry already tells")
+    parser.add_argument("--quiet", action = "store_true", help = "don't report progress")
+    arguments = parser.parse_args()
+    count = run_batch(arguments.input, arguments.output, arguments.game_type, arguments.table_size, arguments.precision,
+                      arguments.processes, arguments.chunk_size, arguments.stop_when_decided, arguments.prune,
+                      not arguments.quiet)
+    print "%d shots run, outcomes written to %s" % (count, arguments.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+
+import Table_Class
+import Shot_Geometry
+import multiprocessing
+import random
+import math
+
+"""This module searches for the best break directly, rather than sweeping a full grid with Heatmap_Iterator. A break is
+treated as a noisy black box: take_shot(velocity, angle, x_position) in, balls sunk out. Since a real player can't repeat a
+shot exactly (and the simulation is very sensitive to small changes), the objective is the expected score when the shot is
+perturbed slightly, estimated from a few perturbed samples. The score of a break is the number of object balls it sinks,
+less scratch_penalty if the cue ball goes down too. A perturbed sample that would put the cue ball off the table isn't a
+shot anyone can take, so it is left out of its candidate's average rather than simulated.
+
+The search is a simple evolution strategy, in the style of CMA-ES with a diagonal covariance: each generation draws a
+population of candidate shots around the current mean, evaluates them all in parallel, and moves the mean (and the
+search width in each direction) towards the best of them. Every candidate in a generation is perturbed with the same
+random offsets, so that the comparison between candidates isn't swamped by the noise of the samples themselves."""
+
+
+# search bounds for [velocity (m/s), angle (degrees), x position of the cue ball (m)]. None for the x position means as far
+# as the cue ball fits on the head string of the table being used (see cue_ball_bounds).
+DEFAULT_BOUNDS = [[5, 26], [65, 115], None]
+# standard deviation of the perturbation applied to each sample, in the same order.
+DEFAULT_PERTURBATION = [.25, .25, .005]
+
+
+"""Returns [lowest, highest] x position of the cue ball on the head string of the given table (a Pool_Table), keeping a
+ball radius clear of the cushions."""
+def cue_ball_bounds(my_table):
+    radius = my_table.list_all_balls[my_table.cue_ball_index()].ball_diameter / 2
+    left, right = my_table.geometry.span(my_table.geometry.head_string)
+    return [left + radius, right - radius]
+
+
+"""Runs a single perturbed break. The task is a list of [velocity, angle, x_position, game_type, table_size, prune,
+scratch_penalty], and the score is returned: object balls sunk, less scratch_penalty if the cue ball was sunk. None is
+returned, without simulating anything, if the cue ball wouldn't fit where the shot puts it. If prune is True, a break whose
+outcome is already known from geometry (see Shot_Geometry.py; mostly ones that miss the rack) isn't simulated. A plain
+module level function so that it can be handed to worker processes."""
+def simulate(task):
+    velocity, angle, x_position, game_type, table_size, prune, scratch_penalty = task
+    my_table = Table_Class.Pool_Table(game_type, table_size)
+    cue_index = my_table.cue_ball_index()
+    x, y = my_table.break_state(velocity, angle, x_position)[0:2]
+    if not my_table.geometry.fits(x, y, my_table.list_all_balls[cue_index].ball_diameter / 2):
+        return None
+    if prune:
+        predicted_sunk = Shot_Geometry.Shot_Geometry(my_table).classify_break(velocity, angle, x_position)["predicted_sunk"]
+        if predicted_sunk != None:
+            if cue_index in predicted_sunk:
+                return len(predicted_sunk) - 1 - scratch_penalty
+            return len(predicted_sunk)
+    # num_balls_remaining counts the cue ball too, so it is taken off separately.
+    initial_ball_count = my_table.num_balls_remaining()
+    my_table.take_shot(velocity, angle, x_position)
+    sunk = initial_ball_count - my_table.num_balls_remaining()
+    if not my_table.list_active_balls.contains(cue_index):
+        return sunk - 1 - scratch_penalty
+    return sunk
+
+
+class Break_Optimizer():
+
+    def __init__(self, game_type = "9_BALL", table_size = "9_FT", bounds = DEFAULT_BOUNDS, perturbation = DEFAULT_PERTURBATION,
+                 samples = 4, population = 8, processes = 1, seed = 0, prune = False, scratch_penalty = 1):
+        self.game_type = game_type
+        self.table_size = table_size
+        # the cue ball's x range is always kept to where it fits on this table.
+        table_range = cue_ball_bounds(Table_Class.Pool_Table(game_type, table_size))
+        self.bounds = [list(bound) for bound in bounds[0:2]]
+        if bounds[2] == None:
+            self.bounds.append(table_range)
+        else:
+            self.bounds.append([max(bounds[2][0], table_range[0]), min(bounds[2][1], table_range[1])])
+        self.scratch_penalty = scratch_penalty # balls taken off the score of a break that sinks the cue ball.
+        self.perturbation = perturbation
+        self.samples = samples # perturbed shots per candidate
+        self.population = population # candidates per generation
+        self.processes = processes
+        self.prune = prune # skip simulating breaks whose outcome geometry already tells, see simulate.
+        self.random = random.Random(seed)
+        self.simulations = 0 # number of breaks simulated so far
+        self.history = [] # [candidate, expected score] for every candidate evaluated
+        self.pool = None
+        if processes > 1:
+            self.pool = multiprocessing.Pool(processes)
+
+    """Evaluates a list of candidate shots, each [velocity, angle, x_position], and returns the expected score for each one,
+    averaged over the samples that keep the cue ball on the table (or -scratch_penalty, as bad as a plain scratch, if none
+    do). All the perturbed samples of all the candidates are run together, in parallel if more than one process is used."""
+    def evaluate(self, candidates):
+        offsets = []
+        for sample in range(self.samples):
+            offsets.append([self.random.gauss(0, deviation) for deviation in self.perturbation])
+        tasks = []
+        for candidate in candidates:
+            for offset in offsets:
+                tasks.append([candidate[0] + offset[0], candidate[1] + offset[1], candidate[2] + offset[2],
+                              self.game_type, self.table_size, self.prune, self.scratch_penalty])
+        if self.pool != None:
+            sample_scores = self.pool.map(simulate, tasks)
+        else:
+            sample_scores = map(simulate, tasks)
+        self.simulations += len([score for score in sample_scores if score != None])
+        values = []
+        for counter in range(len(candidates)):
+            scores = [score for score in sample_scores[counter * self.samples:(counter + 1) * self.samples] if score != None]
+            value = -self.scratch_penalty
+            if scores:
+                value = sum(scores) / float(len(scores))
+            values.append(value)
+            self.history.append([candidates[counter], value])
+        return values
+
+    """Keeps a candidate inside the search bounds."""
+    def clip(self, candidate):
+        return [min(max(candidate[counter], self.bounds[counter][0]), self.bounds[counter][1]) for counter in range(len(candidate))]
+
+    """Runs the search for the given number of generations, starting from 'start' (the middle of the bounds if not given).
+    Returns [best candidate, its expected score]. The best single result of a noisy search tends to be lucky, so at
+    the end it is checked against the final mean using more samples, and whichever holds up better is returned. Set verbose
+    to print the progress of each generation."""
+    def optimize(self, generations = 20, start = None, verbose = False):
+        dimensions = len(self.bounds)
+        if start == None:
+            start = [(low + high) / 2. for low, high in self.bounds]
+        mean = list(start)
+        # start by searching a quarter of each range
+        sigma = [(high - low) / 4. for low, high in self.bounds]
+        minimum_sigma = [deviation / 4. for deviation in self.perturbation]
+        parents = self.population / 2
+        # log-rank weights for recombining the best half, as in CMA-ES
+        weights = [math.log(parents + .5) - math.log(rank + 1) for rank in range(parents)]
+        weights = [weight / sum(weights) for weight in weights]
+
+        best = [mean, None]
+        for generation in range(generations):
+            candidates = []
+            for counter in range(self.population):
+                candidates.append(self.clip([self.random.gauss(mean[d], sigma[d]) for d in range(dimensions)]))
+            values = self.evaluate(candidates)
+            ranked = sorted(zip(values, candidates), key = lambda entry: -entry[0])
+            if best[1] == None or ranked[0][0] > best[1]:
+                best = [ranked[0][1], ranked[0][0]]
+
+            # move the mean towards the best candidates, and adapt the width of the search in each direction to how
+            # spread out the best candidates were.
+            old_mean = mean
+            mean = [sum([weights[rank] * ranked[rank][1][d] for rank in range(parents)]) for d in range(dimensions)]
+            for d in range(dimensions):
+                spread = math.sqrt(sum([weights[rank] * (ranked[rank][1][d] - old_mean[d])**2 for rank in range(parents)]))
+                sigma[d] = max(.7 * sigma[d] + .3 * spread, minimum_sigma[d])
+            if verbose:
+                print "Generation %d: best of generation %.2f, best so far %.2f at %s, %d simulations" % (generation,
+                    ranked[0][0], best[1], str([round(value, 3) for value in best[0]]), self.simulations)
+
+        samples = self.samples
+        self.samples = samples * 4
+        values = self.evaluate([best[0], mean])
+        self.samples = samples
+        if values[1] > values[0]:
+            return [mean, values[1]]
+        return [best[0], values[0]]
+
+    """Stops the worker processes, if any."""
+    def close(self):
+        if self.pool != None:
+            self.pool.terminate()
+            self.pool = None
+
+
+def main():
+    optimizer = Break_Optimizer(processes = multiprocessing.cpu_count(), prune = True)
+    try:
+        best, value = optimizer.optimize(generations = 20, verbose = True)
+    finally:
+        optimizer.close()
+    print "Best break found: velocity %.2f m/s, angle %.2f degrees, cue ball x %.3f m" % (best[0], best[1], best[2])
+    print "Expected object balls sunk, less scratches: %.2f, using %d simulations." % (value, optimizer.simulations)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+
+import Table_Geometry_Class
+
+"""This class decides which pairs of balls, and which ball/wall pairs, are worth checking for contact on each step. It sits
+between the ODE solver and the impact solver: the impact solver only runs its (exact) distance checks on the candidates
+listed here. Without spin, a ball moves in a straight line and only slows down until something hits it, so everywhere it
+can go before its next impact is covered by a swept bound: the line from where it is now, along its velocity, out to its
+max_travel_distance. Two balls whose bounds never come within touching distance can't hit each other, and a ball can't hit
+a wall its bound doesn't reach. A bound stays valid until the ball's velocity is changed by an impact (or the ball is sunk),
+at which point the impact solver invalidates it and only that ball's candidates are worked out again. Slow balls have short
+bounds, and balls heading away from each other have bounds that point apart, so neither costs any contact checks."""
+class Broad_Phase():
+
+    margin = .005 # meters. extra distance added to every test, on top of the solver overshoot margin in max_travel_distance.
+    step_fraction = .25 # the most any ball moves in one solver step, as a fraction of its diameter. Must match the ODE
+    # solver's steps_per_diameter, which the table takes care of when its precision is set.
+
+    def __init__(self, active_set, geometry, near_distance = 0):
+        self.active_set = active_set # only balls still in the active set are looked at. indices are the stable ball indices.
+        self.ball_list = active_set.all_balls
+        self.geometry = geometry
+        self.near_distance = near_distance # pairs this much further apart than touching are still candidates (see
+        # Impact_Solver.cluster_gap, clusters are built out of nearly touching pairs too).
+        self.reset()
+
+    """Throws away every bound and works them all out again from the balls' current states. Called at the start of a shot,
+    since the cue ball's velocity is set directly rather than by an impact."""
+    def reset(self):
+        self.bounds = [None] * len(self.ball_list)
+        self.candidate_matrix = []
+        for counter in range(len(self.ball_list)):
+            self.candidate_matrix.append([False] * len(self.ball_list))
+        self.ball_walls = [[] for ball in self.ball_list]
+        self.dirty = list(self.active_set.indices)
+        self.update()
+
+    """Marks a ball's bound as out of date, because its velocity has been changed by something other than friction."""
+    def invalidate(self, ball_index):
+        if ball_index not in self.dirty:
+            self.dirty.append(ball_index)
+
+    """Recomputes the bounds (and candidate lists) of every ball marked out of date. Must only be called when the balls'
+    current states are final (not about to be backed up by the solver), since the bounds start from them."""
+    def update(self):
+        if not self.dirty:
+            return
+        for ball_index in self.dirty:
+            self.bounds[ball_index] = self.swept_bound(self.ball_list[ball_index])
+        for ball_index in self.dirty:
+            bound = self.bounds[ball_index]
+            ball = self.ball_list[ball_index]
+            # ball to ball candidates
+            for other_index in self.active_set.indices:
+                if other_index == ball_index:
+                    continue
+                other_bound = self.bounds[other_index]
+                candidate = False
+                if bound != None and other_bound != None:
+                    touching = ball.ball_diameter / 2 + self.ball_list[other_index].ball_diameter / 2
+                    distance = Table_Geometry_Class.segment_distance(bound[0], bound[1], other_bound[0], other_bound[1])
+                    candidate = distance <= touching + self.near_distance + self.margin
+                self.candidate_matrix[ball_index][other_index] = candidate
+                self.candidate_matrix[other_index][ball_index] = candidate
+            # ball to wall candidates
+            walls = []
+            if bound != None:
+                for counter in range(len(self.geometry.wall_points)):
+                    start = self.geometry.wall_points[counter]
+                    end = self.geometry.wall_points[(counter + 1) % len(self.geometry.wall_points)]
+                    if Table_Geometry_Class.segment_distance(bound[0], bound[1], start, end) <= ball.ball_diameter / 2 + self.margin:
+                        walls.append(counter)
+            self.ball_walls[ball_index] = walls
+        self.dirty = []
+        self.pairs = []
+        indices = self.active_set.indices
+        for counter in range(len(indices)):
+            row = self.candidate_matrix[indices[counter]]
+            for other_index in indices[counter + 1:]:
+                if row[other_index]:
+                    self.pairs.append([indices[counter], other_index])
+
+    """Returns the swept bound for a ball, as the [start, end] points of the line it can travel along, or None if the ball
+    is off the table."""
+    def swept_bound(self, ball):
+        end = len(ball.position_x_record) - 1
+        x = ball.position_x_record[end]
+        y = ball.position_y_record[end]
+        if x == None or y == None:
+            return None
+        speed = ball.current_speed()
+        if speed == 0:
+            return [[x, y], [x, y]]
+        reach = ball.max_travel_distance(step_fraction = self.step_fraction)
+        return [[x, y], [x + ball.velocity_x_record[end] / speed * reach, y + ball.velocity_y_record[end] / speed * reach]]
+
+    """Returns the list of [ball index, ball index] pairs (lower index first, in order) that could be in contact."""
+    def candidate_pairs(self):
+        return self.pairs
+
+    """Returns the list of wall indices that the given ball could be touching."""
+    def candidate_walls(self, ball_index):
+        return self.ball_walls[ball_index]
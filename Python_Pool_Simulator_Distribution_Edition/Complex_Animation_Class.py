@@ -5,9 +5,15 @@
 
 import matplotlib.animation as animation
 import matplotlib.pyplot as plt
+import Trajectory_Class
+import Queue
+import numpy
 import math
 
 class Complex_Animation():
+    
+    frame_rate = 30 # frames per second of playback
+    
     def __init__(self):
         pass
     
@@ -16,6 +22,91 @@ class Complex_Animation():
     issues with the animations. """
     def draw(self, ball_list, wall_list, pocket_list, speed):
         
+        fig = self.setup_figure(ball_list, wall_list)
+        
+        # calculating the number of frames, assuming 30 frames per seconds. -- so a speed other than
+        # 1 will create more or less frames, still played back at 30 frames per second, which will cause the animation to appear
+        # faster or slower.
+        duration = self.max_time()
+        anim_duration = duration/(speed) # in seconds
+        num_frames = anim_duration * self.frame_rate
+        # adding buffer time at the end and making sure the frame number is an int.
+        num_frames = int(num_frames) + 60
+        
+        # debugging
+        print "The duration of the animation is " + str(anim_duration) + " seconds, and we will be using " + str(num_frames) + "frames."
+
+        # every ball's position at every frame, worked out up front (see Trajectory_Class.py). rows are balls, columns
+        # are frames after the delay at the start. nan once a ball has been sunk.
+        frame_times = numpy.arange(num_frames) * (speed / float(self.frame_rate))
+        self.frame_x = []
+        self.frame_y = []
+        for ball in ball_list:
+            states = Trajectory_Class.Trajectory(ball).states_at(frame_times)
+            self.frame_x.append(states[0])
+            self.frame_y.append(states[1])
+        
+        # making the actual animation. it is saved with a variable in case I want to save a video
+        # in the future, so for now I am getting the warning that this pointer is not used.
+        ani = animation.FuncAnimation(fig, self.animate,interval=int(1000/self.frame_rate), blit=True, init_func=self.animation_init, 
+                                      frames=num_frames)
+        
+        # finally, show the animation
+        plt.show()
+        
+        # some options for saving. Note that these require additional packages in python.
+        #ani.save('animation.mp4', fps=60, bitrate=1000, extra_args=['-vcodec', 'libx264'])
+        #ani.save('animation.mp4', fps=60, extra_args=['-vcodec', 'libx264'])
+        #ani.save('animation.mp4')
+
+    """This method plays an animation of a shot that is still being simulated. Frames are snapshots of every ball's position
+    ([x, y], or None once sunk), taken every frame_rate-th of a second of playback by the simulation running in another
+    process (see Live_Animation.py), and arrive through frame_queue. A frame is shown as soon as it arrives, so playback starts
+    almost straight away; if the simulation falls behind, the last frame is held until the next one is ready. A None in the
+    queue marks the end of the shot. The ball list is only used for the number and size of the balls."""
+    def draw_live(self, frame_queue, ball_list, wall_list):
+        fig = self.setup_figure(ball_list, wall_list)
+        self.frame_queue = frame_queue
+        ani = animation.FuncAnimation(fig, self.animate_live, interval=int(1000/self.frame_rate), blit=True,
+                                      init_func=self.animation_init, frames=self.live_frames, save_count=0)
+        plt.show()
+
+    """This generator hands frames from the queue to the animation, one per playback frame. The first frame is repeated to
+    create a delay at the start, as in the regular animation, and the last one is held for a moment at the end."""
+    def live_frames(self):
+        frame = None
+        while True:
+            try:
+                new_frame = self.frame_queue.get_nowait()
+            except Queue.Empty:
+                # the simulation hasn't caught up with playback yet. keep showing the last frame.
+                yield frame
+                continue
+            if new_frame == None:
+                break
+            if frame == None:
+                for counter in range(30):
+                    yield new_frame
+            frame = new_frame
+            yield frame
+        for counter in range(60):
+            yield frame
+
+    """perform one step of a live animation, by moving every ball to its position in the given frame."""
+    def animate_live(self, frame):
+        patches_to_return = []
+        for counter in range(len(self.printable_balls)):
+            patch = self.printable_balls[counter]
+            if frame == None:
+                patches_to_return.append(patch)
+            elif frame[counter] != None:
+                patch.center = (frame[counter][0], frame[counter][1])
+                patches_to_return.append(patch)
+        return patches_to_return
+
+    """This method creates the figure shared by both kinds of animation: the borders, the cushions, and a patch for every ball
+    (starting off screen). Returns the figure."""
+    def setup_figure(self, ball_list, wall_list):
         # create class scope variables, so that each sub-method can access the instance version and doesn't
         # need to get them passed in.
         self.ball_list = ball_list
@@ -31,19 +122,6 @@ class Complex_Animation():
         # the pool table look distorted.
         self.ax.set_aspect('equal', adjustable='box')
         
-        # calculating the number of frames, assuming 30 frames per seconds. -- so a speed other than
-        # 1 will create more or less frames, still played back at 30 frames per second, which will cause the animation to appear
-        # faster or slower.
-        self.frame_rate = 30
-        duration = self.max_time()
-        anim_duration = duration/(speed) # in seconds
-        num_frames = anim_duration * self.frame_rate
-        # adding buffer time at the end and making sure the frame number is an int.
-        num_frames = int(num_frames) + 60
-        
-        # debugging
-        print "The duration of the animation is " + str(anim_duration) + " seconds, and we will be using " + str(num_frames) + "frames."
-        
         # creating the balls
         self.printable_balls = []
         for ball in self.ball_list:
@@ -65,26 +143,14 @@ class Complex_Animation():
         plt.plot(x,y, 'b', linewidth=5)
         
         # plotting the pockets
-        # Note that for the current iteration, it makes more sense not to draw the pockets, since they are interpreted as circles with
-        # center points well off the table . . . it ends up looking more confusing if they are drawn.
+        # Note that the pocket list holds the center of each pocket mouth. The pocket itself is already visible as a notch
+        # in the cushions, so drawing a marker on top of it ends up looking more confusing.
         #for counter in range (0, len(pocket_list)):
         #    x = pocket_list[counter][0]
         #    y = pocket_list[counter][1]
-        #    pocket_patch = plt.Circle((x, y), radius = .5, fc='g')
+        #    pocket_patch = plt.Circle((x, y), radius = .05, fc='g')
         #    self.ax.add_patch(pocket_patch)
-        
-        # making the actual animation. it is saved with a variable in case I want to save a video
-        # in the future, so for now I am getting the warning that this pointer is not used.
-        ani = animation.FuncAnimation(fig, self.animate,interval=int(1000/self.frame_rate), blit=True, init_func=self.animation_init, 
-                                      frames=num_frames)
-        
-        # finally, show the animation
-        plt.show()
-        
-        # some options for saving. Note that these require additional packages in python.
-        #ani.save('animation.mp4', fps=60, bitrate=1000, extra_args=['-vcodec', 'libx264'])
-        #ani.save('animation.mp4', fps=60, extra_args=['-vcodec', 'libx264'])
-        #ani.save('animation.mp4')
+        return fig
     
     """this method will initialize the animation. It basically returns all the objects that need to move throughout the
     animation in their starting locations. In this case, it is just the balls. """
@@ -93,10 +159,9 @@ class Complex_Animation():
             self.ax.add_patch(ball_patch)
         return self.printable_balls
 
-    """perform one animation step- this function will return all of the patches that need to be plotted on the ith frame. The 
-    current iteration just uses the closest timestep to the ith frame. In future iterations, I would like to use interpolation 
-    to be more precise. at 30 frames per second, this is not noticeable. Also for future iterations, this function needs a revamp
-    for efficiency's sake. See comments throughout."""
+    """perform one animation step- this function will return all of the patches that need to be plotted on the ith frame. The
+    positions are exact for the frame's time rather than the closest timestep, and were all worked out when the animation
+    was set up (see draw), so this is just a lookup."""
     def animate(self,i):
         patches_to_remove = []
         patches_to_return = []
@@ -113,25 +178,10 @@ class Complex_Animation():
             # currently trusting that each entry in printable balls lines up with the corresponding entry in ball list.
             # this is a reasonable assumption, since they were added sequentially.
             for counter in range(0,len(self.printable_balls)):
-                ball = self.ball_list[counter]
                 patch = self.printable_balls[counter]
-                
-                # find closest timestep Current algorithm is horribly inefficient.
-                # a binary search, or at least stop once the times start decreasing, is 
-                # probably worth my while in the future. Also, once a ball stops moving,
-                # we should be able to just use its last spot rather than iterate the lists.
-                current_time = i*(1./self.frame_rate)
-                closest_timestep = 0
-                time_from_perfect = math.fabs(ball.time_record[0] - current_time)
-                for timesteps in range(0, len(ball.time_record)):
-                    check_time_from_perfect = math.fabs(ball.time_record[timesteps] - current_time)
-                    if check_time_from_perfect <= time_from_perfect: # select the LAST timestep- in case multiple are the same.
-                        # this becomes important for the final timestep, when the ball goes into a pocket.
-                        time_from_perfect = check_time_from_perfect
-                        closest_timestep = timesteps
-                new_x = ball.position_x_record[closest_timestep]
-                new_y = ball.position_y_record[closest_timestep]
-                if new_x == None or new_y == None:
+                new_x = self.frame_x[counter][i]
+                new_y = self.frame_y[counter][i]
+                if numpy.isnan(new_x) or numpy.isnan(new_y):
                     patches_to_remove.append(self.printable_balls[counter])
                 else:
                     patch.center = (new_x, new_y)
@@ -0,0 +1,87 @@
+
+import numpy
+
+# event types, as stored in the "event" field.
+BALL_BALL = 0 # ball hit another ball. "other" is the other ball's index.
+BALL_WALL = 1 # ball hit a cushion. "other" is the wall index (the segment starting at that point of the cushion polygon).
+SINK = 2 # ball was sunk. "other" is the pocket index.
+EVENT_NAMES = {BALL_BALL: "BALL_BALL", BALL_WALL: "BALL_WALL", SINK: "SINK"}
+
+# one entry per event. x and y are where the ball was when it happened. velocities are before and after the event, the
+# other ball's are only used for BALL_BALL (0 otherwise).
+EVENT_TYPE = numpy.dtype([("time", numpy.float64), ("event", numpy.int8), ("ball", numpy.int16), ("other", numpy.int16),
+                          ("x", numpy.float64), ("y", numpy.float64),
+                          ("velocity_x_before", numpy.float64), ("velocity_y_before", numpy.float64),
+                          ("velocity_x_after", numpy.float64), ("velocity_y_after", numpy.float64),
+                          ("other_velocity_x_before", numpy.float64), ("other_velocity_y_before", numpy.float64),
+                          ("other_velocity_x_after", numpy.float64), ("other_velocity_y_after", numpy.float64)])
+
+"""This class keeps a compact record of what happened during a shot: one typed entry per ball/ball impact, ball/cushion
+impact and sink, written by the impact solver as each one is solved (never for steps that end up being backed up). The
+full state history only shows impacts indirectly, as repeated times, and takes hundreds of state points per impact; an
+event is about a hundred bytes, so a whole break is a few KB, cheap enough to keep for every shot of a sweep.
+Entries go into a numpy structured array that is allocated up front and doubled whenever it fills up, so recording an
+event is a single row write. events() gives the recorded part, ready for numpy analysis, and save() exports it.
+In a contact cluster (several balls touching at once, see Impact_Solver.solve_contact_cluster) there is an event for every
+pair that actually pushed on each other, and the velocities are the ones before and after the whole cluster was solved."""
+class Event_Log():
+
+    def __init__(self, capacity = 256):
+        self.buffer = numpy.zeros(capacity, dtype = EVENT_TYPE)
+        self.count = 0
+
+    """Forgets every event (the buffer is kept). Called at the start of every shot."""
+    def clear(self):
+        self.count = 0
+
+    """Records one event. before and after are [velocity x, velocity y] of the ball, other_before and other_after the same
+    for the other ball of a BALL_BALL event."""
+    def record(self, time, event, ball, other, x, y, before, after, other_before = [0, 0], other_after = [0, 0]):
+        if self.count == len(self.buffer):
+            bigger = numpy.zeros(2 * len(self.buffer), dtype = EVENT_TYPE)
+            bigger[:self.count] = self.buffer
+            self.buffer = bigger
+        self.buffer[self.count] = (time, event, ball, other, x, y, before[0], before[1], after[0], after[1],
+                                   other_before[0], other_before[1], other_after[0], other_after[1])
+        self.count += 1
+
+    """Returns the events recorded so far, in the order they were solved, as a numpy structured array (a view of the buffer,
+    so copy it if it has to outlive the next shot)."""
+    def events(self):
+        return self.buffer[:self.count]
+
+    def __len__(self):
+        return self.count
+
+    """Returns [ball, other ball] (lower index first) for the first ball to ball impact of the shot that the given ball was
+    part of (any ball if None), or None if there wasn't one. Contacts solved in the same cluster are in ball order, so ask
+    for the cue ball's to find out which ball it hit first."""
+    def first_contact(self, ball = None):
+        events = self.events()
+        contacts = events[events["event"] == BALL_BALL]
+        if ball != None:
+            contacts = contacts[(contacts["ball"] == ball) | (contacts["other"] == ball)]
+        if len(contacts) == 0:
+            return None
+        return sorted([int(contacts[0]["ball"]), int(contacts[0]["other"])])
+
+    """Returns the [ball, pocket, time] of every ball sunk, in the order they dropped."""
+    def sinks(self):
+        events = self.events()
+        return [[int(event["ball"]), int(event["other"]), float(event["time"])] for event in events[events["event"] == SINK]]
+
+    """Writes the events to a file: comma separated text with a header line if the name ends in .csv (the event type
+    written as its name), numpy's .npy format otherwise (numpy.load gives back the same structured array)."""
+    def save(self, path):
+        events = self.events()
+        if not path.lower().endswith(".csv"):
+            numpy.save(path, events)
+            return
+        with open(path, "w") as output:
+            output.write(",".join(EVENT_TYPE.names) + "\n")
+            for event in events:
+                fields = [repr(float(value)) for value in event]
+                fields[1] = EVENT_NAMES[int(event["event"])]
+                fields[2] = str(int(event["ball"]))
+                fields[3] = str(int(event["other"]))
+                output.write(",".join(fields) + "\n")
@@ -0,0 +1,343 @@
+
+import Table_Class
+import Shot_Geometry
+import Pool_Ball_Class
+import multiprocessing
+import itertools
+import argparse
+import random
+import math
+import time
+
+"""This module plays whole games of 9-ball, shot after shot, so that breaks can be judged by who ends up winning the game
+rather than by the balls sunk on the break alone. A game starts with the given break, and from then on each player's shots
+come from a policy (see below). The rules are the basic 9-ball rules: the cue ball has to hit the lowest numbered ball on
+the table first; a legal shot that sinks any ball keeps the shooter at the table, and one that sinks the 9 (on the break
+too, or in a combination) wins; a foul (hitting the wrong ball first, or no ball, or sinking the cue ball) gives the other
+player ball in hand, and a 9 sunk on a foul is spotted as close to the foot spot as it fits. Three fouls in a row lose the
+game. The push out and the rule that a ball has to reach a cushion after contact are left out. A game still going after
+max_shots counts as a draw (winner None).
+Rollouts are meant to be run in large numbers, so nothing is kept from one shot to the next apart from the balls' resting
+states (see Table_Class.start_new_shot; keep_history is off, too), the events of the last shot are all the rules are judged
+from (see Event_Log_Class.py), and every game re-racks the same table rather than building a new one.
+
+A policy is any function (or object with a __call__ method) taking (state, rng) and returning a shot [velocity, angle], or,
+when the player has ball in hand, [velocity, angle, cue x, cue y]. Angles are in degrees, counter-clockwise from the +x
+axis (see Table_Class.shoot). rng is the game's random.Random, so rollouts can be repeated exactly. state is a dictionary:
+    player: the player shooting (0 broke, 1 didn't).
+    target: index (in list_all_balls) of the ball that has to be hit first. numbers gives each index's 9-ball number.
+    ball_in_hand: True if the cue ball can be placed anywhere first.
+    positions: {index: [x, y]} of every ball on the table, the cue ball included if it hasn't just been scratched.
+    cue_index, numbers, geometry (the table's Table_Geometry), ball_diameter, and shot_number.
+To run policies in worker processes, add them to POLICIES and pass their names.
+
+Last measured (9 ft, ghost ball policy against itself, 80 games after a 24 m/s break): a game takes about 23 shots and
+0.3 s at BALANCED (0.2 s at FAST), so a core plays over ten thousand rollouts an hour. Almost all of it is the solver.
+Multi-rate stepping (see Table_Class.PRECISION_PRESETS) only saves a few percent more, even though few balls move in most
+shots."""
+
+
+# the 9-ball number of each object ball, by its index in the rack (see Table_Class.nine_ball_setup): the 1 at the front, the
+# 9 in the middle.
+NINE_BALL_NUMBERS = [1, 2, 3, 4, 9, 5, 6, 7, 8]
+NINE_BALL = 4 # index of the 9
+
+
+"""A policy that picks the easiest pot it can see for the lowest ball, aiming the cue ball at the ghost ball (where the cue
+ball has to be when it touches the object ball to send it straight at the pocket). A pot is only considered if neither
+ball's path is blocked and the cut is less than max_cut degrees; the one with the smallest cut, then the shortest total
+distance, is taken. The speed is enough for the object ball to roll a little past the pocket. With ball in hand, the cue
+ball is placed straight behind the ghost ball. If nothing can be potted, it just hits the target ball full on, softly.
+Skill comes in as gaussian noise on the angle (degrees) and the speed (a fraction of it)."""
+class Ghost_Ball_Policy():
+
+    def __init__(self, angle_noise = .5, speed_noise = .1, max_cut = 70, in_hand_distance = .3):
+        self.angle_noise = angle_noise
+        self.speed_noise = speed_noise
+        self.max_cut = max_cut
+        self.in_hand_distance = in_hand_distance # meters between the placed cue ball and the ghost ball.
+
+    """Returns True if a ball rolling from start to finish would miss every ball on the table apart from the ones in skip."""
+    def path_clear(self, state, start, finish, skip):
+        return Shot_Geometry.path_clear(state["positions"], start, finish, skip, state["ball_diameter"])
+
+    """Returns the speed a ball needs to roll the given distance, slowed only by rolling friction (the default physics)."""
+    def rolling_speed(self, distance):
+        return math.sqrt(2 * Pool_Ball_Class.Pool_Balls.mu_rolling * Pool_Ball_Class.Pool_Balls.g * distance)
+
+    """Returns [cut angle, total distance, velocity, angle, cue x, cue y] for every pot of the target ball that looks
+    possible."""
+    def find_pots(self, state):
+        diameter = state["ball_diameter"]
+        target = state["target"]
+        cue_index = state["cue_index"]
+        target_x, target_y = state["positions"][target]
+        pots = []
+        for pocket_x, pocket_y in state["geometry"].pocket_points:
+            object_distance = math.sqrt((pocket_x - target_x)**2 + (pocket_y - target_y)**2)
+            ghost, direction = Shot_Geometry.ghost_ball([target_x, target_y], [pocket_x, pocket_y], diameter)
+            direction_x, direction_y = direction
+            if not self.path_clear(state, [target_x, target_y], [pocket_x, pocket_y], [target, cue_index]):
+                continue
+            if state["ball_in_hand"]:
+                cue = [ghost[0] - direction_x * self.in_hand_distance, ghost[1] - direction_y * self.in_hand_distance]
+                if not state["geometry"].fits(cue[0], cue[1], diameter / 2):
+                    continue
+                if not self.path_clear(state, cue, [cue[0], cue[1]], [cue_index]):
+                    continue # overlaps a ball
+            else:
+                cue = state["positions"][cue_index]
+            cue_distance = math.sqrt((ghost[0] - cue[0])**2 + (ghost[1] - cue[1])**2)
+            if cue_distance == 0:
+                continue
+            cosine = ((ghost[0] - cue[0]) * direction_x + (ghost[1] - cue[1]) * direction_y) / cue_distance
+            cut = math.degrees(math.acos(max(-1, min(1, cosine))))
+            if cut > self.max_cut:
+                continue
+            if not self.path_clear(state, cue, ghost, [target, cue_index]):
+                continue
+            # the object ball leaves at about the cue ball's speed times the cosine of the cut.
+            object_speed = self.rolling_speed(object_distance + .3)
+            cue_speed = object_speed / max(cosine, .2)
+            velocity = math.sqrt(cue_speed**2 + self.rolling_speed(cue_distance)**2)
+            angle = math.degrees(math.atan2(ghost[1] - cue[1], ghost[0] - cue[0]))
+            pots.append([cut, object_distance + cue_distance, min(velocity, 8), angle, cue[0], cue[1]])
+        return pots
+
+    def __call__(self, state, rng):
+        pots = sorted(self.find_pots(state))
+        if pots:
+            cut, distance, velocity, angle, cue_x, cue_y = pots[0]
+        else:
+            target_x, target_y = state["positions"][state["target"]]
+            if state["ball_in_hand"]:
+                # from straight below, a little way off.
+                cue_x = target_x
+                cue_y = target_y - self.in_hand_distance
+            else:
+                cue_x, cue_y = state["positions"][state["cue_index"]]
+            velocity = 2
+            angle = math.degrees(math.atan2(target_y - cue_y, target_x - cue_x))
+        velocity *= max(1 + rng.gauss(0, self.speed_noise), .1)
+        angle += rng.gauss(0, self.angle_noise)
+        if state["ball_in_hand"]:
+            return [velocity, angle, cue_x, cue_y]
+        return [velocity, angle]
+
+
+"""A policy that shoots in a random direction at a random speed, with the cue ball placed on the head spot when in hand.
+The weakest possible opponent, as a baseline."""
+def random_policy(state, rng):
+    shot = [rng.uniform(1, 6), rng.uniform(0, 360)]
+    if state["ball_in_hand"]:
+        shot += [0, state["geometry"].head_string]
+    return shot
+
+
+# the policies that can be picked by name, for running rollouts in worker processes.
+POLICIES = {"GHOST_BALL": Ghost_Ball_Policy(), "GHOST_BALL_ACCURATE": Ghost_Ball_Policy(.1, .03), "RANDOM": random_policy}
+
+
+"""This class plays games of 9-ball on one table, which is re-racked for every game. policies is a list of two policies
+(see the module description), the first for the player who breaks. Every game is played with the class' random.Random,
+seeded with seed."""
+class Nine_Ball_Rollout():
+
+    def __init__(self, policies, table_size = "9_FT", precision = "BALANCED", max_shots = 150, seed = 0):
+        self.policies = policies
+        self.max_shots = max_shots
+        self.random = random.Random(seed)
+        self.table = Table_Class.Pool_Table("9_BALL", table_size, precision)
+        self.table.keep_history = False
+        self.cue_index = self.table.cue_ball_index()
+
+    """Returns the index of the lowest numbered object ball still on the table."""
+    def target(self):
+        balls = [index for index in self.table.list_active_balls.indices if index != self.cue_index]
+        return min(balls, key = lambda index: NINE_BALL_NUMBERS[index])
+
+    """Returns the game state handed to the policies (see the module description)."""
+    def state(self, player, ball_in_hand, shot_number):
+        positions = {}
+        for index in self.table.list_active_balls.indices:
+            ball = self.table.list_all_balls[index]
+            end = len(ball.time_record) - 1
+            positions[index] = [ball.position_x_record[end], ball.position_y_record[end]]
+        return {"player": player, "target": self.target(), "ball_in_hand": ball_in_hand, "positions": positions,
+                "cue_index": self.cue_index, "numbers": NINE_BALL_NUMBERS, "geometry": self.table.geometry,
+                "ball_diameter": self.table.list_all_balls[self.cue_index].ball_diameter, "shot_number": shot_number}
+
+    """Places a ball at x, y, or if it doesn't fit there (off the table, or on top of another ball), at the nearest spot
+    that it fits, searching outwards in rings a ball diameter apart. Returns False if it fits nowhere."""
+    def place_near(self, index, x, y):
+        if self.table.place_ball(index, x, y):
+            return True
+        diameter = self.table.list_all_balls[index].ball_diameter
+        for ring in range(1, 60):
+            points = 6 * ring
+            for counter in range(points):
+                angle = 2 * math.pi * counter / points
+                if self.table.place_ball(index, x + ring * diameter * math.cos(angle), y + ring * diameter * math.sin(angle)):
+                    return True
+        return False
+
+    """Works out what the last shot did from its events: returns [foul, sunk], where sunk is the indices of the object
+    balls sunk. target is the ball that had to be hit first."""
+    def judge_shot(self, target):
+        sunk = [ball for ball, pocket, sink_time in self.table.crash.event_log.sinks()]
+        first_contact = self.table.first_contact()
+        foul = self.cue_index in sunk or first_contact == None or target not in first_contact
+        return [foul, [ball for ball in sunk if ball != self.cue_index]]
+
+    """Plays one game, starting with the given break ([velocity, angle] or [velocity, angle, x position], see
+    Table_Class.take_shot), and returns a dictionary describing it: winner (0 for the player who broke, 1 for the other,
+    None for a draw), shots, break_sunk (indices of the object balls sunk on the break), break_foul, fouls (per player),
+    balls_left (object balls on the table at the end), and run_time."""
+    def play_game(self, break_shot):
+        start_time = time.time()
+        self.table.rerack()
+        x_position = None
+        if len(break_shot) > 2:
+            x_position = break_shot[2]
+        self.table.take_shot(break_shot[0], break_shot[1], x_position)
+        foul, sunk = self.judge_shot(self.target())
+        result = {"winner": None, "shots": 1, "break_sunk": sorted(sunk), "break_foul": foul, "fouls": [0, 0]}
+        player = 0
+        fouls_in_a_row = [0, 0]
+        while True:
+            if NINE_BALL in sunk:
+                if not foul:
+                    result["winner"] = player
+                    break
+                self.table.start_new_shot()
+                self.place_near(NINE_BALL, 0, self.table.geometry.foot_spot)
+            if foul:
+                result["fouls"][player] += 1
+                fouls_in_a_row[player] += 1
+                if fouls_in_a_row[player] == 3:
+                    result["winner"] = 1 - player
+                    break
+                player = 1 - player
+            else:
+                fouls_in_a_row[player] = 0
+                if not sunk:
+                    player = 1 - player
+            if result["shots"] == self.max_shots:
+                break
+            # the next shot.
+            self.table.start_new_shot()
+            ball_in_hand = foul
+            if not self.table.list_active_balls.contains(self.cue_index):
+                ball_in_hand = True # only after a foul, but in case the rules above ever change.
+            target = self.target()
+            shot = self.policies[player](self.state(player, ball_in_hand, result["shots"]), self.random)
+            if ball_in_hand:
+                self.place_near(self.cue_index, shot[2], shot[3])
+            self.table.shoot(shot[0], shot[1])
+            result["shots"] += 1
+            foul, sunk = self.judge_shot(target)
+        result["balls_left"] = len(self.table.list_active_balls) - self.table.list_active_balls.contains(self.cue_index)
+        result["run_time"] = time.time() - start_time
+        return result
+
+
+# the rollout a worker process keeps between tasks, with the settings it was made for, so the table is only built once.
+worker_rollout = [None, None]
+
+"""Plays a batch of games with the same break. The task is a list of [break index, break shot, games, seed, policy names
+(two), table_size, precision], and a list of result dictionaries (see play_game, with break_index added) is returned. A
+plain module level function so that it can be handed to worker processes."""
+def play_games(task):
+    break_index, break_shot, games, seed, policy_names, table_size, precision = task
+    settings = [list(policy_names), table_size, precision]
+    if worker_rollout[1] != settings:
+        worker_rollout[0] = Nine_Ball_Rollout([POLICIES[name] for name in policy_names], table_size, precision)
+        worker_rollout[1] = settings
+    rollout = worker_rollout[0]
+    rollout.random.seed(seed)
+    results = []
+    for counter in range(games):
+        result = rollout.play_game(break_shot)
+        result["break_index"] = break_index
+        results.append(result)
+    return results
+
+
+"""This generator plays games for each of the breaks given ([velocity, angle] or [velocity, angle, x position]) and yields
+every game's result dictionary (see Nine_Ball_Rollout.play_game, with break_index added) as batches of batch_size games
+finish. With more than one process, the batches run in parallel and come back in the order they finish. The policies are
+picked by name from POLICIES. Each batch is seeded from seed and its position in the list of batches, so the same call
+always plays the same games."""
+def stream_rollouts(break_shots, games_per_break, policy_names = ["GHOST_BALL", "GHOST_BALL"], table_size = "9_FT",
+                    precision = "BALANCED", processes = 1, batch_size = 10, seed = 0):
+    tasks = []
+    for break_index in range(len(break_shots)):
+        for start in range(0, games_per_break, batch_size):
+            tasks.append([break_index, break_shots[break_index], min(batch_size, games_per_break - start),
+                          seed * 1000003 + len(tasks), policy_names, table_size, precision])
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        batches = pool.imap_unordered(play_games, tasks)
+    else:
+        batches = itertools.imap(play_games, tasks)
+    try:
+        for batch in batches:
+            for result in batch:
+                yield result
+    finally:
+        if pool != None:
+            pool.terminate()
+
+
+"""Sums up game results by break: returns a dictionary of break index: {games, win_rate (for the player who broke, draws
+counting half), draws, break_sunk (mean object balls sunk on the break), break_fouls (fraction of breaks that fouled),
+shots (mean per game)}."""
+def summarize(results):
+    summary = {}
+    for result in results:
+        entry = summary.setdefault(result["break_index"], {"games": 0, "wins": 0., "draws": 0, "break_sunk": 0., "break_fouls": 0.,
+                                                             "shots": 0.})
+        entry["games"] += 1
+        if result["winner"] == None:
+            entry["draws"] += 1
+            entry["wins"] += .5
+        elif result["winner"] == 0:
+            entry["wins"] += 1
+        entry["break_sunk"] += len(result["break_sunk"])
+        entry["break_fouls"] += result["break_foul"]
+        entry["shots"] += result["shots"]
+    for entry in summary.values():
+        entry["win_rate"] = entry.pop("wins") / entry["games"]
+        for name in ["break_sunk", "break_fouls", "shots"]:
+            entry[name] /= entry["games"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare 9-ball breaks by the games they lead to.")
+    parser.add_argument("--breaks", nargs = "+", default = ["24,87", "18,90", "10,90"],
+                        help = "breaks as velocity,angle[,x position]")
+    parser.add_argument("--games", type = int, default = 20, help = "games per break")
+    parser.add_argument("--policies", nargs = 2, default = ["GHOST_BALL", "GHOST_BALL"], choices = sorted(POLICIES.keys()))
+    parser.add_argument("--precision", default = "BALANCED", choices = sorted(Table_Class.PRECISION_PRESETS.keys()))
+    parser.add_argument("--processes", type = int, default = multiprocessing.cpu_count())
+    parser.add_argument("--seed", type = int, default = 0)
+    arguments = parser.parse_args()
+    break_shots = [[float(value) for value in shot.split(",")] for shot in arguments.breaks]
+    start_time = time.time()
+    results = list(stream_rollouts(break_shots, arguments.games, arguments.policies, "9_FT", arguments.precision,
+                                   arguments.processes, seed = arguments.seed))
+    elapsed = time.time() - start_time
+    summary = summarize(results)
+    for break_index in sorted(summary.keys()):
+        entry = summary[break_index]
+        print "Break %s: breaker wins %.0f%% of %d games (%d drawn), %.2f balls sunk on the break, %.0f%% break fouls, %.1f shots per game" % (
+            arguments.breaks[break_index], 100 * entry["win_rate"], entry["games"], entry["draws"], entry["break_sunk"],
+            100 * entry["break_fouls"], entry["shots"])
+    shots = sum([result["shots"] for result in results])
+    print "%d games, %d shots in %.1f s (%.2f games/s, %.1f shots/s)" % (len(results), shots, elapsed, len(results) / elapsed,
+                                                                       shots / elapsed)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import Table_Class
+import Sweep_Runner
 import matplotlib.pyplot as plt # for plotting final results. Not needed in current iteration- plots made in MATLAB.
 
 
@@ -31,25 +31,19 @@ def main():
     print "sweep angles: " + str(sweep_angles)
     print "sweep velocities: " + str(sweep_velocities)
     
+    # results come back one cell at a time (in the order they finish when running in parallel), so the grid is filled
+    # in by index as they arrive. set processes to the number of cores available to run the sweep in parallel.
+    # every result is also saved to the checkpoint file as it finishes. if the sweep is stopped, running this again picks up
+    # where it left off. delete the file (or pick a new name) to start over; a checkpoint for a different grid or different
+    # physics is refused rather than mixed in.
     num_balls_sunk = []
-    inner_balls_sunk = []
-    percentage_counter = 0 # for providing the user with percentage updates about progress.
     for angle in sweep_angles:
-        #print "Angle: " + str(angle)
-        percentage = (percentage_counter / float(len(sweep_angles))) * 100
-        percentage_counter += 1
-        print "Percentage Complete: " + str(percentage)
-        for velocity in sweep_velocities:
-            # take a shot, figure out how many balls were sunk for the given angle, velocity.
-            #print "Velocity: " + str(velocity)
-            my_table = Table_Class.Pool_Table("9_BALL")
-            initial_ball_count = my_table.num_balls_remaining()
-            my_table.take_shot(velocity, angle)
-            #my_table.draw("ADVANCED")
-            final_ball_count = my_table.num_balls_remaining()
-            inner_balls_sunk.append(initial_ball_count - final_ball_count)
-        num_balls_sunk.append(inner_balls_sunk)
-        inner_balls_sunk = []
+        num_balls_sunk.append([None] * len(sweep_velocities))
+    progress = Sweep_Runner.Sweep_Progress(len(sweep_angles) * len(sweep_velocities))
+    for result in Sweep_Runner.stream_sweep(sweep_angles, sweep_velocities, processes = 1, progress = progress,
+                                            checkpoint = "heatmap_sweep.checkpoint"):
+        num_balls_sunk[result["angle_index"]][result["velocity_index"]] = result["balls_sunk"]
+        print progress.report()
     
     # main graphics created using MATLAB, output not easily readable!
     print("Number of balls sunk for each angle,velocity combo:")
@@ -1,5 +1,8 @@
 
 import math
+import Broad_Phase_Class
+import Table_Geometry_Class
+import Event_Log_Class
 
 """This class provides all the functionality for detecting a collision between two balls and solving the collision to create an updated
 state vector. The most interesting part is that it keeps track of 'acceptable' distances between each pair of balls (starts as the diameter of a ball),
@@ -12,18 +15,36 @@ it is unlikely for a specific pair of balls to hit each other many times on a si
 class Impact_Solver():
     # constants
     max_overlap = .000005715 # should be very small. smaller == more computation time, but more accurate collisions and less calculation drift.
+    cluster_gap = .0005715 # balls closer than this to a ball that is being hit are treated as touching it at the same instant.
+    # large enough to cover the gaps in a tightly racked set of balls, so the whole rack is solved together.
+    max_cluster_iterations = 100 # upper limit on the passes over a cluster's contacts when solving the impulses.
+    mirror_map = None # set by the table if it (and its rack) are mirror symmetric. the ball identity map, see Symmetry.py.
     ball_restitution = .95
     wall_restitution = .6
     #ball_restitution = 1 # for an interesting senario where the balls appear to 'stick' once hitting walls. fairly impractical.
     #wall_restitution = .0001
     
     """Set up the lists of 'acceptable' distances between each pair of balls (and each ball to each wall). they are initialized as
-    the ball's diameter (or radius for the acceptable distance to a wall), since if the balls are closer than this they are considered touching."""
-    def __init__(self, balls, walls, pockets):
-        self.ball_list = balls
-        self.wall_list = walls
-        self.pocket_list = pockets
+    the ball's diameter (or radius for the acceptable distance to a wall), since if the balls are closer than this they are considered touching.
+    The walls and pockets come from the table's geometry object, which has the cushion segments and their normals precomputed.
+    Which pairs are worth checking at all is decided by a Broad_Phase object (see Broad_Phase_Class.py). The balls come in
+    as an Active_Set shared with the table: the distance tables cover every ball by its stable index, but only the balls
+    still in the active set are looped over, so pocketed balls cost nothing."""
+    def __init__(self, active_set, geometry):
+        self.active_set = active_set
+        self.ball_list = active_set.all_balls
+        self.geometry = geometry
+        self.wall_list = geometry.wall_points
+        self.segment_list = geometry.segments
+        self.pocket_list = geometry.pockets
+        self.broad_phase = Broad_Phase_Class.Broad_Phase(active_set, geometry, self.cluster_gap)
+        self.event_log = Event_Log_Class.Event_Log() # every impact and sink solved, see Event_Log_Class.py.
         
+        self.build_contact_tables()
+
+    """Sets every 'acceptable' distance back to touching: a ball's diameter between balls, and its radius between a ball and
+    a wall."""
+    def build_contact_tables(self):
         # preloading all the minimum distances between balls before impact is detected.
         self.impact_distances = []
         templist = []
@@ -46,7 +67,31 @@ class Impact_Solver():
         # debugging.
         #print "initial impact distances" + str(self.impact_distances)
         #print "initial wall impact distances" + str(self.impact_wall_distances)
-        pass
+
+    """Gets the acceptable distances ready for a new shot on the same table (see Table_Class.shoot). Solving an
+    impact shrinks them for the pair (see check_for_large_contact), which would otherwise carry over into the next shot, so
+    they are built again from scratch. Balls left resting against each other or a cushion by the last shot are treated the
+    same way as after an impact: the acceptable distance is set slightly below the current one."""
+    def reset_contacts(self):
+        self.build_contact_tables()
+        positions = {}
+        for index in self.active_set.indices:
+            ball = self.ball_list[index]
+            end = len(ball.position_x_record) - 1
+            if ball.position_x_record[end] != None:
+                positions[index] = [ball.position_x_record[end], ball.position_y_record[end]]
+        for ball1 in positions:
+            X1, Y1 = positions[ball1]
+            for ball2 in positions:
+                if ball1 < ball2:
+                    distance = math.sqrt((X1 - positions[ball2][0])**2 + (Y1 - positions[ball2][1])**2)
+                    if distance <= self.impact_distances[ball1][ball2 - ball1 - 1]:
+                        self.impact_distances[ball1][ball2 - ball1 - 1] = distance * .999
+            for wall in range(len(self.segment_list)):
+                wall1X, wall1Y, px, py, inverse_length_sqr, normal_x, normal_y = self.segment_list[wall]
+                distance = Table_Geometry_Class.point_segment_distance(X1, Y1, wall1X, wall1Y, wall1X + px, wall1Y + py)
+                if distance <= self.impact_wall_distances[ball1][wall]:
+                    self.impact_wall_distances[ball1][wall] = distance * .999
         
     """This method checks for unacceptably large contact between the balls and the walls, indicative of a situation where
     the timesteps need refinement. returns an integer- 1 means there is too much overlap and timestep needs refinement. 2 means
@@ -55,154 +100,141 @@ class Impact_Solver():
         
         # setting up local variables
         list_balls_touching = []
+        list_balls_near = []
         list_balls_walls_touching = []
+        list_balls_sunk = []
         balls_touching = False
         balls_touching_too_much = False
         balls_touching_wall = False
         ball_sunk = False
         
-        # first, check for ball to ball impact
-        for iterator in range(0,len(self.ball_list)):
-            for iterator2 in range(0,len(self.ball_list)):
-                if iterator < iterator2: # we only need to check the impact in one direction
-                    ball1 = self.ball_list[iterator]
-                    ball2 = self.ball_list[iterator2]
-                    end = len(ball1.position_x_record) - 1 # the end should be the same for x and y,
-                    # but may be different for different balls if one has stopped moving/ had more/less impacts.
-                    X1 = ball1.position_x_record[end]
-                    Y1 = ball1.position_y_record[end]
-                    end = len(ball2.position_x_record) - 1
-                    X2 = ball2.position_x_record[end]
-                    Y2 = ball2.position_y_record[end]
-                    
-                    # check that both balls are still in use
-                    if X1 == None or Y1 == None or X2 == None or Y2 == None:
-                        # one of the balls has left the table, so obviously there is no interaction
-                        pass
-                    else:
-                        deltaX = math.fabs(X1 - X2)
-                        deltaY = math.fabs(Y1 - Y2)
-                        distance = math.sqrt(deltaX**2 + deltaY**2)
-                        
-                        max_impact_distance = self.impact_distances[iterator][(iterator2) - iterator - 1] # more than this and time needs to be backed up.
-                        min_impact_distance = max_impact_distance - self.max_overlap # less than this and the balls aren't touching
-                        # check if the two balls are too close together, or too far apart
-                        if distance > max_impact_distance:
-                            # balls are not touching, no action needed
-                            pass
-                        elif distance > min_impact_distance:
-                            # balls are touching perfectly
-                            balls_touching = True
-                            list_balls_touching.append([iterator, iterator2, distance])
-                        else:
-                            # balls are overlapping by far too much
-                            balls_touching_too_much = True
-                            
-        # now, check wall to ball contact
-        for iterator in range(0,len(self.ball_list)):
-            for iterator2 in range(0,len(self.wall_list)):
-                ball = self.ball_list[iterator]
-                end = len(ball.position_x_record) - 1 # the end should be the same for x and y,
-                # but may be different for differen balls if one no longer exists
-                X1 = ball.position_x_record[end]
-                Y1 = ball.position_y_record[end]
-                wall1 = self.wall_list[iterator2]
-                if iterator2 < len(self.wall_list) - 1:
-                    wall2 = self.wall_list[iterator2+1]
-                else:
-                    wall2 = self.wall_list[0]
-                wall1X = wall1[0]
-                wall1Y = wall1[1]
-                wall2X = wall2[0]
-                wall2Y = wall2[1]     
-                
-                
-                # check that the ball is still in use
-                if X1 == None or Y1 == None:
+        # first, check pockets. Only balls inside a pocket's capture region are tested, and a ball is sunk as soon as its
+        # center crosses the pocket mouth. The exact moment a ball drops doesn't matter, so this is treated as a crossing
+        # event and never causes the timestep to be refined. Pockets are checked first so that a sunk ball is not also
+        # tested against the walls of the pocket.
+        for iterator in self.active_set.indices:
+            ball = self.ball_list[iterator]
+            end = len(ball.position_x_record) - 1
+            X1 = ball.position_x_record[end]
+            Y1 = ball.position_y_record[end]
+            # check that the ball is still in use
+            if X1 == None or Y1 == None:
                 # the ball has left the table, so obviously there is no interaction
+                continue
+            for iterator2 in self.geometry.pockets_near(X1, Y1):
+                jaw1X, jaw1Y, mx, my, inverse_length_sqr, out_x, out_y = self.geometry.pocket_mouths[iterator2]
+                u = ((X1 - jaw1X) * mx + (Y1 - jaw1Y) * my) * inverse_length_sqr
+                depth = (X1 - jaw1X) * out_x + (Y1 - jaw1Y) * out_y
+                if u >= 0 and u <= 1 and depth > 0:
+                    # ball sunk in pocket
+                    new_position_x = None
+                    new_position_y = None
+                    new_velocity_x = 0
+                    new_velocity_y = 0
+                    time = ball.time_record[end]
+                    ball.add_state_point(time, new_position_x, new_position_y, new_velocity_x, new_velocity_y)
+                    
+                    # debugging
+                    #print "BALL SUNK!! CONGRATS!!"
+                    ball_sunk = True
+                    list_balls_sunk.append([iterator, iterator2, X1, Y1])
+                    self.broad_phase.invalidate(iterator)
+                    break
+
+        # next, check for ball to ball impact. only the pairs that the broad phase says could be touching are checked.
+        for iterator, iterator2 in self.broad_phase.candidate_pairs():
+            ball1 = self.ball_list[iterator]
+            ball2 = self.ball_list[iterator2]
+            end = len(ball1.position_x_record) - 1 # the end should be the same for x and y,
+            # but may be different for different balls if one has stopped moving/ had more/less impacts.
+            X1 = ball1.position_x_record[end]
+            Y1 = ball1.position_y_record[end]
+            end = len(ball2.position_x_record) - 1
+            X2 = ball2.position_x_record[end]
+            Y2 = ball2.position_y_record[end]
+
+            # check that both balls are still in use
+            if X1 == None or Y1 == None or X2 == None or Y2 == None:
+                # one of the balls has left the table, so obviously there is no interaction
+                pass
+            else:
+                deltaX = math.fabs(X1 - X2)
+                deltaY = math.fabs(Y1 - Y2)
+                distance = math.sqrt(deltaX**2 + deltaY**2)
+
+                max_impact_distance = self.impact_distances[iterator][(iterator2) - iterator - 1] # more than this and time needs to be backed up.
+                min_impact_distance = max_impact_distance - self.max_overlap # less than this and the balls aren't touching
+                # check if the two balls are too close together, or too far apart
+                if distance > max_impact_distance + self.cluster_gap:
+                    # balls are not touching, no action needed
                     pass
+                elif distance > max_impact_distance:
+                    # balls are not touching, but close enough to be part of a cluster if one of them is hit
+                    list_balls_near.append([iterator, iterator2, distance])
+                elif distance > min_impact_distance:
+                    # balls are touching perfectly
+                    balls_touching = True
+                    list_balls_touching.append([iterator, iterator2, distance])
                 else:
-                    px = wall2X-wall1X
-                    py = wall2Y-wall1Y
-                    temp_dist_sqr = px*px + py*py
-                    u =  ((X1 - wall1X) * px + (Y1 - wall1Y) * py) / float(temp_dist_sqr)
-                    if u > 1:
-                        u = 1
-                    elif u < 0:
-                        u = 0
-                    x = wall1X + u * px
-                    y = wall1Y + u * py
-                    dx = x - X1
-                    dy = y - Y1                
-                    # Note: If the actual distance does not matter,
-                    # if you only want to compare what this function
-                    # returns to other results of this function, you
-                    # can just return the squared distance instead
-                    # (i.e. remove the sqrt) to gain a little performance
-                    distance = math.sqrt(dx*dx + dy*dy)
-                    max_impact_distance = self.impact_wall_distances[iterator][iterator2]
-                    min_impact_distance = max_impact_distance - self.max_overlap
-                    # check if the ball and wall are too close together, or too far apart
-                    if distance > max_impact_distance:
-                        # ball is not touching wall, no action needed
-                        pass
-                    elif distance > min_impact_distance:
-                        # ball is touching wall perfectly
-                        balls_touching_wall = True
-                        list_balls_walls_touching.append([iterator, iterator2, distance])
-                    else:
-                        # ball is overlapping wall by too much
-                        balls_touching_too_much = True     
-              
-        # now, check pockets
-        for iterator in range(0,len(self.ball_list)):
-            for iterator2 in range(0,len(self.pocket_list)):
-                ball = self.ball_list[iterator]
-                end = len(ball.position_x_record) - 1
-                X1 = ball.position_x_record[end]
-                Y1 = ball.position_y_record[end]
-                pocket = self.pocket_list[iterator2]
-                X2 = pocket[0]
-                Y2 = pocket[1]
-                # this is a very simple model, but since the diameter of the balls and the diameter of the pockets
-                # is pretty fixed, this shouldn't matter too much.
-                                 
-                # check that the ball is still in use
-                if X1 == None or Y1 == None:
+                    # balls are overlapping by far too much
+                    balls_touching_too_much = True
+
+        # now, check wall to ball contact
+        for iterator in self.active_set.indices:
+            ball = self.ball_list[iterator]
+            end = len(ball.position_x_record) - 1 # the end should be the same for x and y,
+            # but may be different for differen balls if one no longer exists
+            X1 = ball.position_x_record[end]
+            Y1 = ball.position_y_record[end]
+            # check that the ball is still in use
+            if X1 == None or Y1 == None:
                 # the ball has left the table, so obviously there is no interaction
+                continue
+            for iterator2 in self.broad_phase.candidate_walls(iterator):
+                # segment data is precomputed by the table geometry: start point, direction, 1/length^2, normal.
+                wall1X, wall1Y, px, py, inverse_length_sqr, normal_x, normal_y = self.segment_list[iterator2]
+                u =  ((X1 - wall1X) * px + (Y1 - wall1Y) * py) * inverse_length_sqr
+                if u > 1:
+                    u = 1
+                elif u < 0:
+                    u = 0
+                x = wall1X + u * px
+                y = wall1Y + u * py
+                dx = x - X1
+                dy = y - Y1                
+                # Note: If the actual distance does not matter,
+                # if you only want to compare what this function
+                # returns to other results of this function, you
+                # can just return the squared distance instead
+                # (i.e. remove the sqrt) to gain a little performance
+                distance = math.sqrt(dx*dx + dy*dy)
+                max_impact_distance = self.impact_wall_distances[iterator][iterator2]
+                min_impact_distance = max_impact_distance - self.max_overlap
+                # check if the ball and wall are too close together, or too far apart
+                if distance > max_impact_distance:
+                    # ball is not touching wall, no action needed
                     pass
+                elif distance > min_impact_distance:
+                    # ball is touching wall perfectly
+                    balls_touching_wall = True
+                    list_balls_walls_touching.append([iterator, iterator2, distance])
                 else:
-                    deltaX = math.fabs(X1 - X2)
-                    deltaY = math.fabs(Y1 - Y2)
-                    distance = math.sqrt(deltaX**2 + deltaY**2)
-
-                    # check if the ball hit the pocket
-                    max_impact_distance = ball.ball_diameter/2 + .5 # where the actual number is the size of the pocket.
-                    min_impact_distance = max_impact_distance - self.max_overlap
-                    if distance > max_impact_distance:
-                        # ball has not hit pocket, no action needed
-                        pass
-                    elif distance > min_impact_distance:
-                        # ball sunk in pocket
-                        new_position_x = None
-                        new_position_y = None
-                        new_velocity_x = 0
-                        new_velocity_y = 0
-                        time = ball.time_record[end]
-                        ball.add_state_point(time, new_position_x, new_position_y, new_velocity_x, new_velocity_y)
-                        
-                        # debugging
-                        #print "BALL SUNK!! CONGRATS!!"
-                        ball_sunk = True
-                    else:
-                        balls_touching_too_much = True
-                        
-          
-        if ball_sunk == True: # do not solve collisions, do not pass go, do not collect $200. deal with this immediately.     
-            return 2 # acceptable amount of overlap.
-        elif balls_touching_too_much:
+                    # ball is overlapping wall by too much
+                    balls_touching_too_much = True     
+              
+        if balls_touching_too_much:
+            # a sink never needs refinement on its own, but if something else does, take the sink back out. the ball will
+            # be sunk again when the refined steps carry it across the mouth.
+            for iterator, iterator2, X1, Y1 in list_balls_sunk:
+                self.ball_list[iterator].remove_last_state_point()
             return 1 # too much overlap
-        elif balls_touching or balls_touching_wall:
+        # the sinks are final now, since nothing is being backed up.
+        for iterator, iterator2, X1, Y1 in list_balls_sunk:
+            ball = self.ball_list[iterator]
+            end = len(ball.time_record) - 2 # the state before the sink
+            self.event_log.record(ball.time_record[end], Event_Log_Class.SINK, iterator, iterator2, X1, Y1,
+                                  [ball.velocity_x_record[end], ball.velocity_y_record[end]], [0, 0])
+        if balls_touching or balls_touching_wall:
             while list_balls_walls_touching:
                 # time to solve the impact.
                 
@@ -210,78 +242,91 @@ class Impact_Solver():
                 # print "Wall impact. Time step sufficiently refined."
                 #print "Current list of touching walls (Ball,Wall,distance):" + str(list_balls_walls_touching)
                 x,y,distance = list_balls_walls_touching.pop()
-                wall1 = self.wall_list[y]
-                if y < len(self.wall_list) - 1:
-                    wall2 = self.wall_list[y+1]
-                else:
-                    wall2 = self.wall_list[0]
-                wall1X = wall1[0]
-                wall1Y = wall1[1]
-                wall2X = wall2[0]
-                wall2Y = wall2[1]
-                if wall2X-wall1X == 0: # wall is vertical, intersection line is horizontal
-                    horz_or_vert = 1
-                elif wall2Y-wall1Y == 0: # wall is horizontal, intersection line is vertical
-                    horz_or_vert = 0
-                elif wall2Y > wall1Y and wall2X > wall1X or wall1Y > wall2Y and wall1X > wall2X: # wall is not horizontal or vertical, but
-                    # rather 45 degree angle.
-                    horz_or_vert = -1
-                else: # wall is 45 degrees in the other direction
-                    horz_or_vert = -2
-                wall_x_vector = wall2X - wall1X
-                wall_y_vector = wall2Y - wall1Y
-                
-                self.find_vel_after_impact_walls(self.ball_list[x], horz_or_vert)
+                ball = self.ball_list[x]
+                before = [ball.velocity_x_record[len(ball.velocity_x_record) - 1], ball.velocity_y_record[len(ball.velocity_y_record) - 1]]
+                self.find_vel_after_impact_walls(ball, y)
+                end = len(ball.time_record) - 1
+                self.event_log.record(ball.time_record[end], Event_Log_Class.BALL_WALL, x, y, ball.position_x_record[end],
+                                      ball.position_y_record[end], before, [ball.velocity_x_record[end], ball.velocity_y_record[end]])
+                self.broad_phase.invalidate(x)
                 self.impact_wall_distances[x][y] = distance * .999 # this makes them slightly too far apart so they are 
                 # immediately considered not touching.
                 
-            while list_balls_touching:
-                # debugging
-                #print "ball-to-ball impact. Time step sufficiently refined."
-                #print "Remaining List of touching balls (BallA,BallB,distance):" + str(list_balls_touching)
-                x,y,distance = list_balls_touching.pop()
-                Ball1 = self.ball_list[x]
-                Ball2 = self.ball_list[y]
-                self.find_vel_after_impact_with_2d_support(Ball1, Ball2)
+            # balls that are touching (or nearly touching) each other at the same instant are solved together, one
+            # cluster at a time, rather than pair by pair.
+            for cluster in self.find_contact_clusters(list_balls_touching, list_balls_near):
+                self.solve_contact_cluster(cluster)
+            for x,y,distance in list_balls_touching:
                 self.impact_distances[x][y-x-1] = distance * .999 # this makes them slightly too far apart so they are 
                 # immediately considered not touching.
+            # the new velocities are final, so the swept bounds of the balls that changed can be worked out again.
+            self.broad_phase.update()
             return 2 # means that impact level was perfect, and impact was solved.
+        elif ball_sunk:
+            self.broad_phase.update()
+            return 2
         else: # nothing is touching
             return 3
 
+    """For multi-rate stepping (see ODE_Solver.advance_multi_rate), where a ball may not have been moved up to the current
+    time yet. Returns, for every ball (by stable index), the latest time it can be left behind at: until then, it can't be
+    touching or nearly touching (within cluster_gap) another ball, touching a cushion, or crossing a pocket mouth, even if
+    every ball moves straight at it as fast as it is moving now (friction only ever slows a ball down). Pairs and walls the
+    broad phase has ruled out can't come into contact before the next impact at all, so only the candidates are checked.
+    The times are good until the next impact changes someone's velocity. Balls that can't be in contact with anything get
+    infinity."""
+    def synchronization_times(self):
+        times = [float("inf")] * len(self.ball_list)
+        states = {} # index: [x, y, time, speed] of every active ball's last state point
+        for index in self.active_set.indices:
+            ball = self.ball_list[index]
+            end = len(ball.position_x_record) - 1
+            if ball.position_x_record[end] != None:
+                states[index] = [ball.position_x_record[end], ball.position_y_record[end], ball.time_record[end],
+                                 ball.current_speed()]
+        margin = self.broad_phase.margin
+        for index, index2 in self.broad_phase.candidate_pairs():
+            if index not in states or index2 not in states:
+                continue
+            X1, Y1, time1, speed1 = states[index]
+            X2, Y2, time2, speed2 = states[index2]
+            clearance = (math.sqrt((X1 - X2)**2 + (Y1 - Y2)**2) - self.impact_distances[index][index2 - index - 1] -
+                         self.cluster_gap - margin)
+            if clearance <= 0:
+                # already close enough to end up in the same contact cluster, even if neither is moving (a rack).
+                time = float("-inf")
+            elif speed1 + speed2 == 0:
+                continue
+            else:
+                # the time at which the two of them, each moving from its own last state point, could have covered the gap.
+                time = (clearance + speed1 * time1 + speed2 * time2) / (speed1 + speed2)
+            times[index] = min(times[index], time)
+            times[index2] = min(times[index2], time)
+        for index in states:
+            X1, Y1, time1, speed1 = states[index]
+            if speed1 == 0:
+                continue
+            clearance = min([self.geometry.distance_to_pocket(pocket, X1, Y1) for pocket in range(len(self.geometry.pockets))])
+            for wall in self.broad_phase.candidate_walls(index):
+                start = self.wall_list[wall]
+                finish = self.wall_list[(wall + 1) % len(self.wall_list)]
+                distance = Table_Geometry_Class.point_segment_distance(X1, Y1, start[0], start[1], finish[0], finish[1])
+                clearance = min(clearance, distance - self.impact_wall_distances[index][wall])
+            times[index] = min(times[index], time1 + (clearance - margin) / speed1)
+        return times
+
     """This method takes a ball and a wall that are touching, and updates the state vector of the ball based on the physics of a 
-    collision. """
+    collision. The velocity is reflected about the wall using the segment's precomputed unit normal (v - 2(v.n)n), which
+    works for cushions at any angle, then scaled by the wall restitution."""
     def find_vel_after_impact_walls(self, ballA, wall):
         end = len(ballA.velocity_x_record)-1
-        # if the wall is horizontal, wall = 0, and the y direction is opposite its initial, while the x direction stays the same
-        if wall == 0:
-            velocity_1_final_x = ballA.velocity_x_record[end]
-            velocity_1_final_y = -ballA.velocity_y_record[end]
-            # if the wall is vertical, wall = 1, and the x direction is opposite its inital, while the y direction stays the same
-        elif wall == 1:
-            velocity_1_final_x = (-ballA.velocity_x_record[end])
-            velocity_1_final_y = ballA.velocity_y_record[end]
-        elif wall == -1: # walls are at 45
-            # wall goes from lower left to upper right
-            #print "Wall goes from lower left to upper right"
-            Vx = ballA.velocity_x_record[end]
-            Vy = ballA.velocity_y_record[end]
-            theta = self.calc_theta(Vx, Vy)
-            if theta > math.pi/4 and theta < 5 * (math.pi/4):
-                # print "ball hit it from above"
-                velocity_1_final_x = ballA.velocity_y_record[end]
-                velocity_1_final_y = ballA.velocity_x_record[end]
-            else:
-                # print "ball hit it from below. I don't think a separate solution is needed"
-                velocity_1_final_x = ballA.velocity_y_record[end]
-                velocity_1_final_y = ballA.velocity_x_record[end]
-        else:
-            # wall goes from lower right to upper left
-            # print "Wall goes from lower right to upper left"
-            velocity_1_final_x = - ballA.velocity_y_record[end]
-            velocity_1_final_y = - ballA.velocity_x_record[end]
-        velocity_1_final_x *= self.wall_restitution
-        velocity_1_final_y *= self.wall_restitution
+        normal_x = self.segment_list[wall][5]
+        normal_y = self.segment_list[wall][6]
+        Vx = ballA.velocity_x_record[end]
+        Vy = ballA.velocity_y_record[end]
+        normal_velocity = Vx * normal_x + Vy * normal_y
+        velocity_1_final_x = (Vx - 2 * normal_velocity * normal_x) * self.wall_restitution
+        velocity_1_final_y = (Vy - 2 * normal_velocity * normal_y) * self.wall_restitution
         
         position_1_final_x = ballA.position_x_record[end]
         position_1_final_y = ballA.position_y_record[end]
@@ -289,80 +334,117 @@ class Impact_Solver():
         time_final = ballA.time_record[end]
         ballA.add_state_point(time_final, position_1_final_x, position_1_final_y, velocity_1_final_x, velocity_1_final_y)
 
-    """This method takes two balls that are touching and updates both of their state vectors based on the physics of a collision. """
-    def find_vel_after_impact_with_2d_support(self, BallA, BallB):
-        endA = len(BallA.velocity_x_record)-1
-        endB = len(BallB.velocity_x_record)-1
-        # gets the mass of the first ball from the Ball Class
-        mass1 = BallA.ball_mass
-        # gets the velocity in the x and y direction of the ball
-        U1x = BallA.velocity_x_record[endA]
-        U1y = BallA.velocity_y_record[endA]
-        U1 = math.sqrt(U1x**2+U1y**2)
-       
-        # does the same for ball2
-        mass2 = BallB.ball_mass
-        U2x = BallB.velocity_x_record[endB]
-        U2y = BallB.velocity_y_record[endB]
-        U2 = math.sqrt(U2x**2+U2y**2)
-        
-        theta1 = self.calc_theta(U1x, U1y)
-        theta2 = self.calc_theta(U2x, U2y)
-        
-        # calculates phi, the angle between the x axis and the vector through the center of the two balls
-        # this is the angle that is used to rotate the coordinate axes.
-        # this vector is ball_position_2 - ball_position_1
-        P1x = BallA.position_x_record[endA]
-        P1y = BallA.position_y_record[endA]
-        P2x = BallB.position_x_record[endB]
-        P2y = BallB.position_y_record[endB]
-        position_vector_x = P2x - P1x
-        position_vector_y = P2y - P1y
-        phi = self.calc_theta(position_vector_x, position_vector_y)
-        
-        
-        # computes the velocities of both balls in their x and y directions after the impact
-        velocity_1_final_x = (U1*math.cos(theta1-phi)*(mass1-mass2)+2*mass2*U2*math.cos(theta2-phi)*math.cos(phi))/(mass1+mass2) + U1*math.sin(theta1-phi)*math.cos(phi+math.pi/2)
-        velocity_1_final_y = (U1*math.cos(theta1-phi)*(mass1-mass2)+2*mass2*U2*math.cos(theta2-phi)*math.sin(phi))/(mass1+mass2) + U1*math.sin(theta1-phi)*math.sin(phi+math.pi/2)
-        velocity_2_final_x = (U2*math.cos(theta2-phi)*(mass2-mass1)+2*mass1*U1*math.cos(theta1-phi)*math.cos(phi))/(mass1+mass2) + U2*math.sin(theta2-phi)*math.cos(phi+math.pi/2)
-        velocity_2_final_y = (U2*math.cos(theta2-phi)*(mass2-mass1)+2*mass1*U1*math.cos(theta1-phi)*math.sin(phi))/(mass1+mass2) + U2*math.sin(theta2-phi)*math.sin(phi+math.pi/2)
-        
-        position_1_final_x = BallA.position_x_record[endA]
-        position_1_final_y = BallA.position_y_record[endA]
-        position_2_final_x = BallB.position_x_record[endB]
-        position_2_final_y = BallB.position_y_record[endB]
-        time_final = BallA.time_record[endA]
-        
-        velocity_1_final_x *= self.ball_restitution
-        velocity_1_final_y *= self.ball_restitution
-        velocity_2_final_x *= self.ball_restitution
-        velocity_2_final_y *= self.ball_restitution
-        
-        BallA.add_state_point(time_final, position_1_final_x, position_1_final_y, velocity_1_final_x, velocity_1_final_y)
-        BallB.add_state_point(time_final, position_2_final_x, position_2_final_y, velocity_2_final_x, velocity_2_final_y)
+    """This method groups ball to ball contacts into clusters. The balls are the nodes of a graph, and every touching pair
+    is an edge. Nearly touching pairs (within cluster_gap) are also edges, but only matter if they connect to a ball that is
+    actually being hit. Returns a list of clusters, each a list of [ball index, ball index] contacts."""
+    def find_contact_clusters(self, touching, near):
+        neighbours = {}
+        for x,y,distance in touching + near:
+            neighbours.setdefault(x, []).append(y)
+            neighbours.setdefault(y, []).append(x)
+        cluster_of = {}
+        clusters = []
+        for x,y,distance in touching:
+            if x in cluster_of:
+                continue
+            # breadth first search from this contact, labelling every ball that can be reached.
+            cluster_number = len(clusters)
+            clusters.append([])
+            cluster_of[x] = cluster_number
+            to_visit = [x]
+            while to_visit:
+                ball = to_visit.pop()
+                for other in neighbours[ball]:
+                    if other not in cluster_of:
+                        cluster_of[other] = cluster_number
+                        to_visit.append(other)
+        for x,y,distance in touching + near:
+            if x in cluster_of:
+                clusters[cluster_of[x]].append([x, y])
+        return clusters
 
+    """This method takes a cluster of contacts and solves all of them at once, as a single impulse problem. Each contact
+    gets an impulse along the line between the two ball centers, and the contacts are swept over repeatedly (each sweep
+    using the velocities left by the previous contacts) until no pair in the cluster is moving towards each other. For an
+    isolated pair this is exactly the 2d elastic collision between the two balls.
+    The answer depends on the order the contacts are swept in, which comes from the ball numbering. If the table is mirror
+    symmetric, the cluster is solved twice, once in ball order and once in the mirrored ball order, and the two answers are
+    averaged, so that mirror image shots give exactly mirror image results. The average still conserves momentum, can't
+    gain energy, and leaves no pair moving towards each other.
+    Every ball that was pushed then loses energy based on the ball restitution, once, and gets a new state point."""
+    def solve_contact_cluster(self, contacts):
+        velocities = {}
+        normals = {}
+        for x,y in contacts:
+            for index in [x, y]:
+                if index not in velocities:
+                    ball = self.ball_list[index]
+                    end = len(ball.velocity_x_record) - 1
+                    velocities[index] = [ball.velocity_x_record[end], ball.velocity_y_record[end]]
+            ballA = self.ball_list[x]
+            ballB = self.ball_list[y]
+            position_vector_x = ballB.position_x_record[len(ballB.position_x_record) - 1] - ballA.position_x_record[len(ballA.position_x_record) - 1]
+            position_vector_y = ballB.position_y_record[len(ballB.position_y_record) - 1] - ballA.position_y_record[len(ballA.position_y_record) - 1]
+            length = math.sqrt(position_vector_x**2 + position_vector_y**2)
+            normals[(x, y)] = [position_vector_x / length, position_vector_y / length, 1. / ballA.ball_mass, 1. / ballB.ball_mass]
 
-    """Given the x and y components of a vector, this function calculates and returns the angle between this vector and the x-axis, 
-    using the standard unit circle orientation."""
-    def calc_theta(self, Vx, Vy):
+        start_velocities = velocities
+        if self.mirror_map == None:
+            velocities, pushed, hit = self.sweep_impulses(contacts, normals, velocities)
+        else:
+            mirrored_order = sorted(contacts, key = lambda contact: sorted([self.mirror_map[contact[0]], self.mirror_map[contact[1]]]))
+            velocities1, pushed, hit = self.sweep_impulses(sorted(contacts), normals, velocities)
+            velocities2, pushed2, hit2 = self.sweep_impulses(mirrored_order, normals, velocities)
+            pushed.update(pushed2)
+            hit.update(hit2)
+            velocities = {}
+            for index in velocities1:
+                velocities[index] = [(velocities1[index][0] + velocities2[index][0]) * .5,
+                                     (velocities1[index][1] + velocities2[index][1]) * .5]
 
-        if Vx == 0 and Vy == 0: # singularity, not good.
-            theta = 1 # arbitrary. Hopefully it doesn't play into equations
-            # debugging
-            #print "singularity occurred. hopefully theta doesn't matter!"
-        elif Vx > 0:
-            theta = math.atan(Vy/Vx)
-            if theta < 0:
-                theta = theta + 2 * math.pi
-        elif Vx < 0:
-            theta = math.atan(Vy/Vx) + math.pi
-        else: # Vx == 0
-            if Vy > 0:
-                theta = (math.pi)/2 # 90 degrees
-            else: # Vy < 0
-                theta = (math.pi/2) + math.pi # 270 degrees
-        # debugging
-        #print("theta: " + str(theta))
-        return theta
+        for index in pushed:
+            self.broad_phase.invalidate(index)
+            ball = self.ball_list[index]
+            end = len(ball.velocity_x_record) - 1
+            ball.add_state_point(ball.time_record[end], ball.position_x_record[end], ball.position_y_record[end],
+                                 velocities[index][0] * self.ball_restitution, velocities[index][1] * self.ball_restitution)
+        for x,y in sorted(hit.keys()):
+            ballA = self.ball_list[x]
+            ballB = self.ball_list[y]
+            end = len(ballA.time_record) - 1
+            endB = len(ballB.time_record) - 1
+            self.event_log.record(ballA.time_record[end], Event_Log_Class.BALL_BALL, x, y, ballA.position_x_record[end],
+                                  ballA.position_y_record[end], start_velocities[x],
+                                  [ballA.velocity_x_record[end], ballA.velocity_y_record[end]], start_velocities[y],
+                                  [ballB.velocity_x_record[endB], ballB.velocity_y_record[endB]])
 
-                        
\ No newline at end of file
+    """This method sweeps over the contacts in the given order, applying impulses, until no pair is moving towards each other
+    (see solve_contact_cluster). The starting velocities are left alone. Returns the new velocities, the balls pushed and the
+    contacts that pushed (dictionaries keyed by ball index and by (ball index, ball index))."""
+    def sweep_impulses(self, contacts, normals, start_velocities):
+        velocities = {}
+        for index in start_velocities:
+            velocities[index] = list(start_velocities[index])
+        pushed = {}
+        hit = {}
+        for iteration in range(self.max_cluster_iterations):
+            approaching = False
+            for x,y in contacts:
+                normal_x, normal_y, inverse_mass1, inverse_mass2 = normals[(x, y)]
+                velocity1 = velocities[x]
+                velocity2 = velocities[y]
+                closing_speed = (velocity1[0] - velocity2[0]) * normal_x + (velocity1[1] - velocity2[1]) * normal_y
+                if closing_speed > 1e-12:
+                    # perfectly elastic impulse along the normal. energy loss is handled afterwards.
+                    approaching = True
+                    impulse = 2 * closing_speed / (inverse_mass1 + inverse_mass2)
+                    velocity1[0] -= impulse * inverse_mass1 * normal_x
+                    velocity1[1] -= impulse * inverse_mass1 * normal_y
+                    velocity2[0] += impulse * inverse_mass2 * normal_x
+                    velocity2[1] += impulse * inverse_mass2 * normal_y
+                    pushed[x] = True
+                    pushed[y] = True
+                    hit[(x, y)] = True
+            if not approaching:
+                break
+        return [velocities, pushed, hit]
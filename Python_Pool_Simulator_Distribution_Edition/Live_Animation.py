@@ -0,0 +1,103 @@
+
+import Table_Class
+import multiprocessing
+import bisect
+
+"""This module plays a shot while it is still being simulated, rather than waiting for take_shot to finish before the
+animation is built. The simulation runs in a background process. After every round of the solver it turns everything
+simulated so far into animation frames (a snapshot of every ball's position at each playback frame time), pushes them into
+a bounded queue, and then throws away the history it no longer needs. The animation (Complex_Animation.draw_live) takes
+frames off the other end of the queue as they are needed. If the animation falls behind, the queue fills up and the
+simulation waits for it, so memory stays bounded however long the break is; if the simulation falls behind, the animation
+holds the last frame until the next one arrives."""
+
+
+"""This class turns the state of a table into animation frames between rounds of the solver. It is used as the
+round_callback of take_shot (see Table_Class.py)."""
+class Frame_Streamer():
+
+    def __init__(self, frame_queue, frame_period):
+        self.frame_queue = frame_queue
+        self.frame_period = frame_period # seconds of simulated time between frames.
+        self.next_frame = 0 # number of the next frame to emit.
+
+    """Emits every frame up to the simulated time every ball has reached, then trims each ball's history down to the state
+    in effect at the last frame emitted (plus anything after it)."""
+    def __call__(self, table):
+        balls = table.list_all_balls
+        current_time = 0
+        for ball in balls:
+            end = len(ball.time_record) - 1
+            if ball.time_record[end] > current_time:
+                current_time = ball.time_record[end]
+        self.emit_until(balls, current_time)
+        last_frame_time = (self.next_frame - 1) * self.frame_period
+        for ball in balls:
+            # keep the last state at or before the last frame, it is the one in effect until the next state point.
+            first_needed = max(bisect.bisect_right(ball.time_record, last_frame_time) - 1, 0)
+            if first_needed > 0:
+                del ball.position_x_record[:first_needed]
+                del ball.position_y_record[:first_needed]
+                del ball.velocity_x_record[:first_needed]
+                del ball.velocity_y_record[:first_needed]
+                del ball.time_record[:first_needed]
+
+    """Emits the frames for every frame time up to (and including) the given simulated time."""
+    def emit_until(self, balls, simulated_time):
+        while self.next_frame * self.frame_period <= simulated_time:
+            self.frame_queue.put(self.snapshot(balls, self.next_frame * self.frame_period))
+            self.next_frame += 1
+
+    """Returns the position of every ball at the given time, as [x, y], or None if the ball has been sunk. Each ball is shown at
+    its last state point at or before the frame time (the last one, if several share that time, so impacts and sinks show up
+    straight away)."""
+    def snapshot(self, balls, frame_time):
+        frame = []
+        for ball in balls:
+            index = max(bisect.bisect_right(ball.time_record, frame_time) - 1, 0)
+            x = ball.position_x_record[index]
+            y = ball.position_y_record[index]
+            if x == None or y == None:
+                frame.append(None)
+            else:
+                frame.append([x, y])
+        return frame
+
+    """Emits the frames for the rest of the shot, and the None that marks the end of it."""
+    def finish(self, balls):
+        end_time = 0
+        for ball in balls:
+            end = len(ball.time_record) - 1
+            if ball.time_record[end] > end_time:
+                end_time = ball.time_record[end]
+        self.emit_until(balls, end_time)
+        # one last frame, so the balls are shown where they came to rest.
+        self.frame_queue.put(self.snapshot(balls, end_time))
+        self.frame_queue.put(None)
+
+
+"""Runs a shot and streams its frames into the queue. A plain module level function, since it is run in its own process."""
+def simulate_into_queue(game_type, table_size, precision, velocity, angle, x_position, frame_queue, frame_period):
+    my_table = Table_Class.Pool_Table(game_type, table_size, precision)
+    streamer = Frame_Streamer(frame_queue, frame_period)
+    my_table.take_shot(velocity, angle, x_position, round_callback = streamer)
+    streamer.finish(my_table.list_all_balls)
+
+
+"""Simulates a shot in a background process and animates it as it goes. speed works as in Complex_Animation.draw (2 plays the
+shot twice as fast), and buffer_frames is the most frames the simulation can get ahead of the animation."""
+def play_live(velocity, angle, x_position = None, game_type = "9_BALL", table_size = "9_FT", precision = "BALANCED", speed = 1,
+              buffer_frames = 300):
+    # a local table, only used for the cushions and the number of balls. the shot itself is simulated in the worker.
+    my_table = Table_Class.Pool_Table(game_type, table_size, precision)
+    frame_queue = multiprocessing.Queue(buffer_frames)
+    frame_period = speed / float(my_table.complex_pen.frame_rate)
+    worker = multiprocessing.Process(target = simulate_into_queue, args = (game_type, table_size, precision, velocity, angle,
+                                                                          x_position, frame_queue, frame_period))
+    worker.daemon = True
+    worker.start()
+    try:
+        my_table.complex_pen.draw_live(frame_queue, my_table.list_all_balls, my_table.list_walls)
+    finally:
+        # the window may be closed before the shot is finished, in which case the worker is stuck waiting on a full queue.
+        worker.terminate()
@@ -0,0 +1,149 @@
+
+import Table_Class
+import argparse
+import resource
+import types
+import sys
+try:
+    import tracemalloc
+except ImportError:
+    # not part of the python 2.7 standard library (pytracemalloc provides it for a patched 2.7). without it, the peak comes
+    # from the process's high water mark instead.
+    tracemalloc = None
+
+"""This module reports how much memory a break takes, so sweep workers can be sized from numbers rather than guesses. It
+measures the table before and after take_shot, and breaks the memory the table holds down into:
+    trajectory history: every ball's state records (positions, velocities and times), which grow with every step,
+        refinement and impact. This is almost all of it, unless the table only keeps key states (Table_Class.keep_history,
+        which cuts it by around 50x for a 9-ball break).
+    impact tables: the impact solver's distance tables, the broad phase's bounds and candidate lists, and the event log.
+        These are sized by the number of balls (and walls) rather than by the length of the shot, apart from the event log,
+        which is only about a hundred bytes per impact.
+    visualization: the pens and whatever they are holding on to. The matplotlib objects themselves are only counted
+        shallowly, since they belong to pyplot's figure and live as long as it does.
+Sizes come from walking the table's objects with sys.getsizeof, counting every object once. The peak during the shot comes
+from tracemalloc snapshots if tracemalloc is available. Otherwise it comes from how far the shot raised the process's
+resident set high water mark, which only moves once the shot goes past the biggest thing the process has already done (a
+fresh worker's first shot is exactly what matters for sizing workers)."""
+
+
+"""Returns the size in bytes of an object and everything it holds, skipping anything whose id is in seen (which is updated).
+Lists, tuples, dictionaries, sets and instances of this project's (old style) classes are followed; anything else, such as
+matplotlib objects, counts only its own size."""
+def deep_size(obj, seen):
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (types.ModuleType, types.FunctionType, types.MethodType, type,
+                                                 types.ClassType)):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+        elif isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, types.InstanceType):
+            stack.append(item.__dict__)
+    return size
+
+
+"""Returns the bytes held by each part of the table, as a dictionary with trajectory_history, impact_tables, visualization
+and the number of state_points recorded. The balls and the geometry are shared between the parts; they are counted under
+the trajectory history and the impact tables respectively, and only once."""
+def breakdown(table):
+    seen = set()
+    trajectory = 0
+    state_points = 0
+    for ball in table.list_all_balls:
+        for record in [ball.position_x_record, ball.position_y_record, ball.velocity_x_record, ball.velocity_y_record,
+                       ball.time_record]:
+            trajectory += deep_size(record, seen)
+        state_points += len(ball.time_record)
+    # the rest of each ball (mass, flags) isn't history, but it is tiny and goes with the balls.
+    trajectory += deep_size(table.list_all_balls, seen)
+    impact_tables = deep_size(table.crash, seen)
+    visualization = deep_size(table.simple_pen, seen) + deep_size(table.complex_pen, seen)
+    return {"trajectory_history": trajectory, "impact_tables": impact_tables, "visualization": visualization,
+            "state_points": state_points}
+
+
+"""Returns the process's resident set high water mark in bytes (ru_maxrss is in kilobytes on linux, bytes on mac)."""
+def max_resident_bytes():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return usage
+    return usage * 1024
+
+
+"""Takes a shot on the table (arguments as for take_shot) and returns a memory report dictionary: the breakdown entries
+after the shot (see breakdown), retained_bytes (what the shot added and is still held), peak_bytes (the most the shot
+needed at once, over what was in use before it) and where the peak came from, the simulated time, and
+bytes_per_simulated_second and bytes_per_state_point for the retained bytes."""
+def measure_shot(table, velocity, angle, x_position = None, stop_when_decided = False):
+    started_tracing = False
+    if tracemalloc != None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    before = breakdown(table)
+    resident_before = max_resident_bytes()
+
+    status = table.take_shot(velocity, angle, x_position, stop_when_decided)
+
+    report = breakdown(table)
+    if tracemalloc != None:
+        traced_after, traced_peak = tracemalloc.get_traced_memory()
+        report["retained_bytes"] = traced_after - traced_before
+        report["peak_bytes"] = traced_peak - traced_before
+        report["peak_source"] = "tracemalloc"
+        if started_tracing:
+            tracemalloc.stop()
+    else:
+        report["retained_bytes"] = (report["trajectory_history"] + report["impact_tables"] + report["visualization"] -
+                                    before["trajectory_history"] - before["impact_tables"] - before["visualization"])
+        # the retained bytes were all in use at once at the end of the shot, so the peak is at least that.
+        report["peak_bytes"] = max(max_resident_bytes() - resident_before, report["retained_bytes"])
+        report["peak_source"] = "ru_maxrss"
+    report["status"] = status
+    simulated_time = 0
+    for ball in table.list_all_balls:
+        simulated_time = max(simulated_time, ball.time_record[len(ball.time_record) - 1])
+    report["simulated_time"] = simulated_time
+    report["bytes_per_simulated_second"] = report["retained_bytes"] / max(simulated_time, .000001)
+    report["bytes_per_state_point"] = report["retained_bytes"] / float(max(report["state_points"] - before["state_points"], 1))
+    return report
+
+
+"""Prints a memory report (see measure_shot) in readable form."""
+def print_report(report):
+    megabyte = 1024. * 1024
+    print "Peak %.2f MB (%s), retained %.2f MB over %.2f s simulated (%.2f MB per simulated second, %d bytes per state point)." % (
+        report["peak_bytes"] / megabyte, report["peak_source"], report["retained_bytes"] / megabyte, report["simulated_time"],
+        report["bytes_per_simulated_second"] / megabyte, report["bytes_per_state_point"])
+    print "    trajectory history %.2f MB (%d state points), impact tables %.2f MB, visualization %.2f MB" % (
+        report["trajectory_history"] / megabyte, report["state_points"], report["impact_tables"] / megabyte,
+        report["visualization"] / megabyte)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Report how much memory one break takes.")
+    parser.add_argument("velocity", type = float, nargs = "?", default = 24)
+    parser.add_argument("angle", type = float, nargs = "?", default = 87)
+    parser.add_argument("--game-type", default = "9_BALL")
+    parser.add_argument("--table-size", default = "9_FT")
+    parser.add_argument("--precision", default = "BALANCED")
+    parser.add_argument("--stop-when-decided", action = "store_true", help = "stop as a sweep would, once the outcome is known")
+    parser.add_argument("--events-only", action = "store_true", help = "keep only the key states, as sweeps do")
+    arguments = parser.parse_args()
+    my_table = Table_Class.Pool_Table(arguments.game_type, arguments.table_size, arguments.precision)
+    my_table.keep_history = not arguments.events_only
+    print_report(my_table.memory_report(arguments.velocity, arguments.angle, stop_when_decided = arguments.stop_when_decided))
+
+if __name__ == "__main__":
+    main()
@@ -11,8 +11,14 @@ class ODE_Solver():
     # no ball can have this number of steps and not hit something or stop. Realistically, this is the number of steps before
     # the size of the timestep is re-evaluated, assuming no impact. too large and the timestep may not be optimized, too
     # small and computation time will be wasted re-evaluating an acceptable timestep.
+    steps_per_diameter = 4 # the fastest ball moves 1/steps_per_diameter of its diameter per step, before any refinement.
+    max_depth = 20 # the deepest the timestep is allowed to be refined (halved) around a single impact.
+    multi_rate = False # if True, every ball steps at its own rate rather than the fastest ball's. see advance_multi_rate.
+    # these are the defaults (the 'BALANCED' precision preset, see Table_Class.PRECISION_PRESETS). A table can override
+    # them on its own solver.
     def __init__(self):
-        pass
+        self.step_counter = 0 # number of steps taken (including refinement steps) since the counter was last reset.
+        # used for reporting solver throughput.
         
     """This method continues to update the positions of balls until an impact is found. then it recursively refines the timestep
     at this point, and solves the impact. It then returns so that the situation can be re-analyzed (did any balls hit a pocket?
@@ -23,7 +29,7 @@ class ODE_Solver():
         
         # calculate timestep. The requirements for an ideal timestep are based off of 
         # collisions, since larger timesteps and you could miss a collision, smaller 
-        # and you waste time. I decided to calculate a timestep every 1/4 of the ball diameter
+        # and you waste time. I decided to calculate a timestep every 1/4 of the ball diameter (steps_per_diameter)
         # note that an override can be supplied by the function (used primarily for recursion)
         
         # time step should be in seconds
@@ -37,7 +43,7 @@ class ODE_Solver():
             if fastest_ball.current_speed() == 0:
                 # the fact that this is detected here, and not during the iteration loop, means that a ball (the last one moving!) was probably just sunk.
                 return "ALL_BALLS_STATIONARY"
-            time_step = fastest_ball.ball_diameter/(4 * fastest_ball.current_speed())
+            time_step = fastest_ball.ball_diameter/(self.steps_per_diameter * fastest_ball.current_speed())
             # debugging
             #print "" # just to give an extra blank line before each round of ODE.
             #print "time step used for this round of ODE: " + str(time_step) + " seconds"
@@ -49,12 +55,24 @@ class ODE_Solver():
 
         not_done = True
         infinite_loop_counter = 0 # to stop an infinite loop. also for determining when it is time to re-assess timestep size.
+        if self.multi_rate:
+            # the time every ball has to be brought up to at the end of the current step, if it needs to be.
+            clock = self.latest_time(ball_list)
+            if current_depth == 0:
+                # refinements start from the same states as the round they refine, so they keep its times.
+                self.start_multi_rate(crash, clock, time_step)
         
         # continue to move balls until an end condition is met        
         while not_done:
             # move balls
-            for ball in ball_list:
-                ball.advance_position(time_step)            
+            if self.multi_rate:
+                clock += time_step
+                moved_balls = self.advance_multi_rate(crash, clock, time_step)
+            else:
+                for ball in ball_list:
+                    ball.advance_position(time_step)
+                moved_balls = ball_list
+            self.step_counter += 1
             
             # check if done
             # if every ball has stopped moving, we are done.
@@ -76,9 +94,9 @@ class ODE_Solver():
                 pass
             if impact_return == 1:
                 # impact was too great. back up. recursively refine timestep.
-                for ball in ball_list:
+                for ball in moved_balls:
                     ball.remove_last_state_point()
-                if current_depth > 20:
+                if current_depth > self.max_depth:
                     # great for catching an infinite recursion. precision less than (1/2^20) should never be required
                     print "NOT GOOD!! infinite recursion detected!?!" 
                     return "ALL_BALLS_STATIONARY"
@@ -122,6 +140,51 @@ class ODE_Solver():
         else: # unidentified error
             return "UNIDENTIFIED_ERROR"            
     
+    """Gets a round of multi-rate stepping ready, starting at the given clock time: works out how long each ball can be left
+    behind (see Impact_Solver.synchronization_times) and its own step, from its speed now. A ball that has to be up to date
+    for the first step is brought up to the clock straight away. It can't be in contact with anything yet, since the last
+    round kept it up to date for as long as it could have been."""
+    def start_multi_rate(self, crash, clock, time_step):
+        self.sync_times = crash.synchronization_times()
+        self.own_steps = [float("inf")] * len(crash.ball_list)
+        for index in crash.active_set.indices:
+            ball = crash.ball_list[index]
+            speed = ball.current_speed()
+            if speed > 0:
+                # friction only slows the ball down from here, so this step only gets more cautious as it goes.
+                self.own_steps[index] = ball.ball_diameter / (self.steps_per_diameter * speed)
+            end = len(ball.time_record) - 1
+            if ball.position_x_record[end] != None and ball.time_record[end] < clock and clock + time_step > self.sync_times[index]:
+                ball.advance_position(clock - ball.time_record[end], True)
+
+    """Multi-rate stepping: moves the balls for one step of the fastest ball, which ends at the given clock time, but only
+    the balls that need it. Each ball has its own step, the time it takes to move 1/steps_per_diameter of its diameter at its
+    own speed, so a ball moving at a tenth of the speed of the cue ball steps a tenth as often, and a ball at rest doesn't
+    step at all. A ball is moved up to the clock once its next step would come after the step after this one. A ball that
+    could be in contact with something by the end of the next step is moved up to the clock on every step, so every contact
+    is still checked with both balls at the same time, and with the fastest ball's step. Returns the balls that were moved,
+    the ones to back up if the step needs refining."""
+    def advance_multi_rate(self, crash, clock, time_step):
+        moved_balls = []
+        for index in crash.active_set.indices:
+            ball = crash.ball_list[index]
+            end = len(ball.time_record) - 1
+            behind = clock - ball.time_record[end]
+            if clock + time_step <= self.sync_times[index] and behind + time_step <= self.own_steps[index]:
+                continue
+            ball.advance_position(behind, True)
+            moved_balls.append(ball)
+        return moved_balls
+
+    """Returns the latest time any of the balls has been moved up to."""
+    def latest_time(self, ball_list):
+        latest = 0
+        for ball in ball_list:
+            end = len(ball.time_record) - 1
+            if ball.time_record[end] > latest:
+                latest = ball.time_record[end]
+        return latest
+
     """This method returns the fastest ball from a list of balls. This is helpful in calculating the appropriate timestep."""
     def max_ball_velocity(self, ball_list):
         # maybe a faster method, but this next line isn't working correctly
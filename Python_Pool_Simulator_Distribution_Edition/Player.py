@@ -1,6 +1,7 @@
 
 
 import Table_Class
+import Live_Animation
 
 """This function runs one simulation of a break at a given angle and velocity, then displays a visualization of the break. """
 def main():
@@ -9,6 +10,12 @@ def main():
     #my_table = Table_Class.Pool_Table("UNIT_TEST_3_BALLS")
     my_table = Table_Class.Pool_Table("9_BALL")
     #my_table = Table_Class.Pool_Table("asdf") # equivalent to playing 9-ball, except that a 'game doesn't exist' error will be thrown
+    # other racks are generated (see Rack_Generator.py): "8_BALL", "10_BALL", "TRIANGLE_<rows>", "DIAMOND_<widest row>", or
+    # "SCATTER_<count>" for that many balls placed at random.
+    #my_table = Table_Class.Pool_Table("8_BALL")
+    # the table size can be picked as a second argument: "9_FT" (default), "8_FT", "7_FT", or a custom description dictionary.
+    # see Table_Geometry_Class.py for the format.
+    #my_table = Table_Class.Pool_Table("9_BALL", "7_FT")
         
     # make a break. choose an angle in degrees and an initial velocity in meters per second. format: my_table.take_shot(velocity, angle)
     # reasonable values for break speed are: 2-25
@@ -18,13 +25,18 @@ def main():
     # angles outside of this range may result in the cue ball not starting on the table, since starting position is calculated based on angle
     # (operating under the assumption that the best break involves a direct hit on the center ball.) see Table_Class method 'take_shot' for 
     # options to set ball position manually.
-    # (22.5, 84.5) is one example of a break angle that sinks 3 balls. Note that even a slight change in either angle or velocity will eliminate this result.
-    my_table.take_shot(22.5, 84.5)
+    # (24, 87) is one example of a break angle that sinks 2 balls. Note that even a slight change in either angle or velocity will eliminate this result.
+    my_table.take_shot(24, 87)
     
     # display this break for the user. options are simple and advanced.
-    # simple may throw a runtime warning. It has to do with the matplotlib package not liking the number of points. it may be ignored.
+    # simple draws each path as a line with a marker at every impact. use my_table.draw("SIMPLE", show_refinement = True) to also
+    # see every point the solver calculated.
     my_table.draw("SIMPLE")
     my_table.draw("ADVANCED")
+    
+    # alternatively, the shot can be animated while it is still being simulated, so playback starts straight away even for
+    # long, fast breaks. see Live_Animation.py.
+    #Live_Animation.play_live(24, 87)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
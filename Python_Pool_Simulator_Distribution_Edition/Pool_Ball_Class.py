@@ -11,6 +11,8 @@ class Pool_Balls():
     mu_rolling = .03 # much smaller, because rolling == low friction. Numbers estimated using online sources.
     mu_ball_to_ball = .05 # not used in current model- collisions are handled as instant events using restitution.
     g = 9.8 # meters per second per second
+    sliding_speed = 2 # meters per second. for high speeds, the ball will slide rather than roll. Number selected
+    # based on an average of multiple online sources.
     ball_diameter = .05715 # meters
     
     """Initializes a ball with no previous record of motion and no current velocity."""
@@ -43,6 +45,39 @@ class Pool_Balls():
         end = len(self.velocity_x_record) - 1
         return math.sqrt(self.velocity_x_record[end]**2 + self.velocity_y_record[end]**2)
     
+    """This method returns the furthest the ball could possibly travel before stopping, if nothing else hits it: v^2/(2*mu*g),
+    split into the sliding part (down to sliding_speed) and the rolling part. A small margin (step_fraction of a diameter,
+    the most any ball moves in one solver step) is added to cover the overshoot of the first order solver's last steps.
+    Bouncing off a cushion only shortens the path, so the ball is guaranteed to stay within this distance of where it is now."""
+    def max_travel_distance(self, speed = None, step_fraction = .25):
+        if speed == None:
+            speed = self.current_speed()
+        if speed == 0:
+            return 0
+        distance = 0
+        if speed > self.sliding_speed:
+            distance += (speed**2 - self.sliding_speed**2) / (2 * self.mu_sliding * self.g)
+            speed = self.sliding_speed
+        distance += speed**2 / (2 * self.mu_rolling * self.g)
+        return distance + self.ball_diameter * step_fraction
+    
+    """This method returns the speed the ball will have left after rolling the given distance with nothing in its way
+    (0 if it stops first), starting from the given speed (its current speed if None). The solver's first order steps lose
+    speed at least this fast, so this is an upper bound."""
+    def speed_after_travel(self, distance, speed = None):
+        if speed == None:
+            speed = self.current_speed()
+        if speed > self.sliding_speed:
+            sliding_distance = (speed**2 - self.sliding_speed**2) / (2 * self.mu_sliding * self.g)
+            if distance < sliding_distance:
+                return math.sqrt(speed**2 - 2 * self.mu_sliding * self.g * distance)
+            distance -= sliding_distance
+            speed = self.sliding_speed
+        remaining = speed**2 - 2 * self.mu_rolling * self.g * distance
+        if remaining <= 0:
+            return 0
+        return math.sqrt(remaining)
+    
     """Updates the status of the ball by appending a new position and velocity to the end of the state vectors."""
     def add_state_point(self, time, positionx, positiony, velocityx, velocityy):
         self.position_x_record.append(positionx)
@@ -70,8 +105,11 @@ class Pool_Balls():
         self.time_record = []        
  
     """This method uses the differential equations of motion (very simple for this model) to estimate the position of the ball after 
-    a given timestep. it then appends this new location to the end of the state vectors. """   
-    def advance_position(self, timestep):
+    a given timestep. it then appends this new location to the end of the state vectors. If average_velocity is True, the
+    position is moved by the average of the velocities at the start and end of the step rather than the one at the start,
+    which is exact while the friction doesn't change, so the error doesn't grow with the timestep (see multi-rate stepping
+    in My_ODE_Solver)."""   
+    def advance_position(self, timestep, average_velocity = False):
         # calculate the differentials using the last known state vector
         differentials = self.differential_equations()
         
@@ -101,6 +139,9 @@ class Pool_Balls():
             new_v_x = 0
         if self.same_sign(new_v_y, last_v_y) == False:
             new_v_y = 0
+        if average_velocity:
+            new_p_x = last_p_x + (last_v_x + new_v_x) / 2 * timestep
+            new_p_y = last_p_y + (last_v_y + new_v_y) / 2 * timestep
         
         # update states
         self.add_state_point(new_time, new_p_x, new_p_y, new_v_x, new_v_y)
@@ -114,8 +155,7 @@ class Pool_Balls():
         velocityy = self.velocity_y_record[end]
         
         # determine the correct mu to use
-        if self.current_speed() > 2: # for high speeds, the ball will slide rather than roll. Number selected
-            # based on an average of multiple online sources.
+        if self.current_speed() > self.sliding_speed: # for high speeds, the ball will slide rather than roll.
             friction = self.mu_sliding
         else:
             friction = self.mu_rolling
@@ -0,0 +1,114 @@
+
+import Table_Class
+import itertools
+import argparse
+import math
+import time
+
+"""This module measures what the solver's precision settings cost and what they buy. It runs a fixed set of reference
+breaks with a very tight setting (the reference), then runs the same breaks with every combination of the settings being
+studied, and reports for each combination its runtime (and speedup over BALANCED) against how far its outcomes drift from
+the reference: how often a different set of balls is sunk, the average difference in the number of balls sunk, and how far
+apart the balls that stay on the table finish. Breaks are chaotic, so even tiny changes in the settings move the later
+balls around; the number and identity of the balls sunk are the outcomes that matter for sweeps.
+
+The results are what the PRECISION_PRESETS in Table_Class.py are based on. Run it again after changing the physics."""
+
+
+# much tighter than anything in PRECISION_PRESETS, and much slower.
+REFERENCE_PRECISION = {"max_overlap": .00000005715, "steps_per_diameter": 16, "max_loops": 150, "max_depth": 40}
+
+# the settings studied by default, every combination is run.
+DEFAULT_SETTINGS = {"max_overlap": [.00005715, .000005715, .0000005715], "steps_per_diameter": [2, 4, 8],
+                    "max_loops": [150], "max_depth": [20], "multi_rate": [False, True]}
+
+# [velocity, angle] for each reference break. a spread of speeds and angles, all of which hit the rack.
+REFERENCE_SHOTS = [[14, 86], [16, 88], [18, 90], [20, 87], [22, 89], [22.5, 88], [24, 91], [26, 85]]
+
+
+"""Runs one break at the given precision and returns [sorted indices of the balls sunk, final positions, runtime]. The
+final positions are [x, y] for every ball, or None if it was sunk."""
+def run_shot(shot, precision, game_type = "9_BALL", table_size = "9_FT"):
+    start_time = time.time()
+    my_table = Table_Class.Pool_Table(game_type, table_size, precision)
+    my_table.take_shot(shot[0], shot[1])
+    run_time = time.time() - start_time
+    sunk = []
+    positions = []
+    for counter in range(len(my_table.list_all_balls)):
+        ball = my_table.list_all_balls[counter]
+        end = len(ball.position_x_record) - 1
+        if ball.position_x_record[end] == None:
+            sunk.append(counter)
+            positions.append(None)
+        else:
+            positions.append([ball.position_x_record[end], ball.position_y_record[end]])
+    return [sunk, positions, run_time]
+
+
+"""Compares a set of outcomes with the reference outcomes for the same shots. Returns a dictionary with the fraction of shots
+where a different set of balls was sunk, the average absolute difference in the number of balls sunk, and the average
+distance (meters) between the final positions of balls that stayed on the table in both."""
+def divergence(outcomes, reference_outcomes):
+    different_sets = 0
+    count_difference = 0
+    distances = []
+    for outcome, reference in zip(outcomes, reference_outcomes):
+        if outcome[0] != reference[0]:
+            different_sets += 1
+        count_difference += abs(len(outcome[0]) - len(reference[0]))
+        for position, reference_position in zip(outcome[1], reference[1]):
+            if position != None and reference_position != None:
+                distances.append(math.sqrt((position[0] - reference_position[0])**2 + (position[1] - reference_position[1])**2))
+    average_distance = 0
+    if distances:
+        average_distance = sum(distances) / len(distances)
+    return {"different_sunk_sets": different_sets / float(len(outcomes)),
+            "balls_sunk_error": count_difference / float(len(outcomes)),
+            "position_error": average_distance}
+
+
+"""Returns a precision dictionary for every combination of the settings, given as {setting name: [values to try]}."""
+def combinations(settings):
+    names = sorted(settings.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[settings[name] for name in names])]
+
+
+"""Runs the whole study and returns one result dictionary per precision dictionary studied (the settings themselves, runtime,
+speedup over BALANCED, and the divergence entries). Prints a line for each as it goes."""
+def run_study(precisions, shots = REFERENCE_SHOTS, game_type = "9_BALL", table_size = "9_FT"):
+    print "Running " + str(len(shots)) + " reference shots at reference precision..."
+    reference_outcomes = [run_shot(shot, REFERENCE_PRECISION, game_type, table_size) for shot in shots]
+    balanced_outcomes = [run_shot(shot, "BALANCED", game_type, table_size) for shot in shots]
+    balanced_time = sum([outcome[2] for outcome in balanced_outcomes])
+    print "Reference took %.2f s, BALANCED takes %.2f s." % (sum([outcome[2] for outcome in reference_outcomes]), balanced_time)
+
+    results = []
+    for precision in precisions:
+        outcomes = [run_shot(shot, precision, game_type, table_size) for shot in shots]
+        result = dict(precision)
+        result["run_time"] = sum([outcome[2] for outcome in outcomes])
+        result["speedup"] = balanced_time / result["run_time"]
+        result.update(divergence(outcomes, reference_outcomes))
+        results.append(result)
+        print ("max_overlap %.2e, steps_per_diameter %2d, max_loops %3d, max_depth %2d, multi_rate %-5s: %6.2f s (%.2fx BALANCED), "
+               "different sunk sets %.2f, balls sunk error %.2f, position error %.3f m") % (result["max_overlap"],
+               result["steps_per_diameter"], result["max_loops"], result["max_depth"], result.get("multi_rate", False),
+               result["run_time"], result["speedup"], result["different_sunk_sets"], result["balls_sunk_error"],
+               result["position_error"])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measure solver runtime against divergence from a tight reference.")
+    parser.add_argument("--table-size", default = "9_FT")
+    parser.add_argument("--presets-only", action = "store_true", help = "only study the named PRECISION_PRESETS")
+    arguments = parser.parse_args()
+    if arguments.presets_only:
+        precisions = [Table_Class.PRECISION_PRESETS[name] for name in ["FAST", "BALANCED", "PRECISE"]]
+    else:
+        precisions = combinations(DEFAULT_SETTINGS)
+    run_study(precisions, table_size = arguments.table_size)
+
+if __name__ == "__main__":
+    main()
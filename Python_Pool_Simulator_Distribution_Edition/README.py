@@ -30,4 +30,32 @@ for a single break is fully implemented and easy to visualize."""
 
 """Player.py creates a table, takes a shot, and displays this shot for the user. It is the best script for getting a 
 visual representation of what this project does.
-Heatmap_Iterator.py is the other option, and will cycle through many breaks with no visual representation. """
\ No newline at end of file
+Heatmap_Iterator.py is the other option, and will cycle through many breaks with no visual representation. It is built on
+Sweep_Runner.py, which streams the result of each break as soon as it finishes, along with throughput and time remaining.
+Sweep_Coordinator.py splits a sweep into work units and hands them out to workers on any number of machines over TCP.
+Either can write a checkpoint file as it goes, so an interrupted sweep picks up where it left off.
+Break_Optimizer.py searches for the break that sinks the most object balls on average (scratches count against it), using a
+few hundred simulations rather than a full grid.
+Precision_Study.py measures how much time and accuracy the solver precision presets (FAST, BALANCED, PRECISE) trade.
+Live_Animation.py animates a shot while it is still being simulated in a background process.
+Symmetry.py lets sweeps simulate only one half of a mirror symmetric table and reconstruct the other half.
+Rack_Generator.py builds racks of any size (8-ball, 10-ball, triangles, diamonds) and random scatters of balls, and
+Scaling_Benchmark.py measures how the solver copes as the number of balls grows.
+Memory_Report.py reports the memory a break takes (peak, retained, and what holds it), for sizing sweep workers.
+Shot_Service.py keeps warm worker processes running and answers shot requests over local HTTP, for quick what-if shots.
+Sweep_Spec.py runs sweeps described in JSON over any shot arguments and physics constants, on a grid, a Latin hypercube or
+a Sobol sequence.
+Every shot also keeps a compact log of its impacts and sinks (Event_Log_Class.py), which can be saved as .npy or .csv
+(my_table.crash.event_log.save("break.csv")), and sweep results say which ball the cue ball hit first.
+my_table.state_at(t) and my_table.states_at(times) give every ball's position and velocity at any time of the last shot,
+worked out exactly from the states at impacts (Trajectory_Class.py). Set my_table.keep_history = False to keep only those
+states, which takes a small fraction of the memory.
+Shared_Results.py runs batches of shots in worker processes that write final states and sampled trajectories straight into
+shared numpy arrays, instead of sending the balls back pickled.
+Game_Rollout.py plays whole games of 9-ball from a given break (ball in hand after fouls, pluggable shot policies), to
+compare breaks by how often the breaker goes on to win.
+Shot_Geometry.py sorts shots into HOPELESS, TRIVIAL and SIMULATE from straight line geometry alone, so sweeps ("prune" in a
+spec) and Break_Optimizer can skip simulating shots whose outcome is already known.
+Batch_Runner.py is the way to run long lists of shots from other tools: it reads them from a .csv or .npy file a chunk at a
+time, optionally over several processes, and writes every outcome to a .csv or .jsonl file as it goes
+(python Batch_Runner.py shots.csv outcomes.csv --processes 4). """
\ No newline at end of file
@@ -0,0 +1,144 @@
+
+import Table_Geometry_Class
+import random
+import math
+
+"""This module works out where the object balls go for racks of any size, rather than typing every position in by hand.
+Racks are built on a triangular lattice: neighbouring balls are rack_spacing apart center to center (a ball diameter plus
+the small gap a real rack leaves, the same spacing as the hand-typed 9-ball rack in Table_Class), rows are rack_spacing *
+sqrt(3)/2 apart, and the front ball sits on the foot spot, pointing at the cue ball. Every rack is symmetric about the
+center line, so Symmetry.py still applies to it. Random scatters place any number of balls anywhere on the foot half of the
+table without overlaps, for finding out how the solver copes with large numbers of balls (see Scaling_Benchmark.py).
+
+Each function returns a list of [x, y] positions. The table uses them through game types (see Table_Class.setup_table):
+"8_BALL" and "10_BALL" are the standard triangle racks, "TRIANGLE_<rows>" and "DIAMOND_<widest row>" are racks of any size,
+and "SCATTER_<count>" (or "SCATTER_<count>_<seed>") is a random scatter. The same game type always gives the same balls, so
+sweep workers on other machines rack the same table."""
+
+
+rack_spacing = .057658 # meters, center to center. a ball diameter plus a gap of .000508.
+scatter_gap = .005 # meters. the least space left between scattered balls, and between a scattered ball and a cushion.
+
+
+"""Returns the positions for a rack made of the given row lengths, front row first. Each row is centered on the center line,
+and the front row is on the foot spot."""
+def rows_rack(row_lengths, foot_spot):
+    positions = []
+    row_spacing = rack_spacing * math.sqrt(3) / 2
+    for row in range(len(row_lengths)):
+        for place in range(row_lengths[row]):
+            positions.append([(place - (row_lengths[row] - 1) / 2.) * rack_spacing, foot_spot + row * row_spacing])
+    return positions
+
+
+"""Returns the positions for a triangle rack with the given number of rows (5 rows is the 15 ball 8-ball rack, 4 rows the
+10-ball rack)."""
+def triangle_rack(rows, foot_spot):
+    return rows_rack(range(1, rows + 1), foot_spot)
+
+
+"""Returns the positions for a diamond rack whose widest row holds the given number of balls (3 is the 9-ball rack)."""
+def diamond_rack(widest_row, foot_spot):
+    return rows_rack(range(1, widest_row + 1) + range(widest_row - 1, 0, -1), foot_spot)
+
+
+"""Returns True if the point x,y is inside the cushion polygon (ray casting)."""
+def inside_polygon(x, y, points):
+    inside = False
+    for counter in range(len(points)):
+        x1, y1 = points[counter - 1]
+        x2, y2 = points[counter]
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+"""Returns True if a ball of the given radius at x,y is on the table, clear of every cushion by at least the given gap."""
+def fits_on_table(x, y, radius, geometry, gap = 0):
+    if not inside_polygon(x, y, geometry.wall_points):
+        return False
+    points = geometry.wall_points
+    for counter in range(len(points)):
+        start = points[counter - 1]
+        end = points[counter]
+        if Table_Geometry_Class.point_segment_distance(x, y, start[0], start[1], end[0], end[1]) < radius + gap:
+            return False
+    return True
+
+
+"""Returns the positions for count balls scattered at random over the foot half of the table (beyond the head string plus
+a couple of diameters, so the cue ball always has room), with at least scatter_gap between any two balls and between a
+ball and a cushion. Candidate spots are checked only against the balls already placed in neighbouring grid cells, so
+placing hundreds of balls stays quick. If the table is too crowded to place them all, prints an error and returns as many
+as fit."""
+def random_scatter(count, geometry, ball_diameter, seed = 0):
+    generator = random.Random(seed)
+    radius = ball_diameter / 2.
+    clearance = ball_diameter + scatter_gap # least center to center distance
+    left = min([point[0] for point in geometry.wall_points])
+    right = max([point[0] for point in geometry.wall_points])
+    bottom = geometry.head_string + 2 * ball_diameter
+    top = max([point[1] for point in geometry.wall_points])
+    cells = {} # (column, row) -> positions in that cell. cells are clearance wide, so only neighbours can be too close.
+    positions = []
+    attempts = 0
+    max_attempts = 200 * count + 1000
+    while len(positions) < count and attempts < max_attempts:
+        attempts += 1
+        x = generator.uniform(left, right)
+        y = generator.uniform(bottom, top)
+        column = int(math.floor(x / clearance))
+        row = int(math.floor(y / clearance))
+        too_close = False
+        for other_column in range(column - 1, column + 2):
+            for other_row in range(row - 1, row + 2):
+                for other in cells.get((other_column, other_row), []):
+                    if (other[0] - x)**2 + (other[1] - y)**2 < clearance**2:
+                        too_close = True
+        if too_close or not fits_on_table(x, y, radius, geometry, scatter_gap):
+            continue
+        positions.append([x, y])
+        cells.setdefault((column, row), []).append([x, y])
+    if len(positions) < count:
+        print "Only " + str(len(positions)) + " of " + str(count) + " balls fit on the table. Error Code: 7702194385"
+    return positions
+
+
+"""Returns the object ball positions for a game type, or None if it isn't one of the generated racks. A rack that doesn't
+fit on the table is slid back towards the head string until it does; if it can't fit at all, an error is printed and None
+is returned."""
+def positions_for(game_type, geometry, ball_diameter):
+    parts = game_type.split("_")
+    try:
+        if game_type == "8_BALL":
+            positions = triangle_rack(5, geometry.foot_spot)
+        elif game_type == "10_BALL":
+            positions = triangle_rack(4, geometry.foot_spot)
+        elif parts[0] == "TRIANGLE" and len(parts) == 2:
+            positions = triangle_rack(int(parts[1]), geometry.foot_spot)
+        elif parts[0] == "DIAMOND" and len(parts) == 2:
+            positions = diamond_rack(int(parts[1]), geometry.foot_spot)
+        elif parts[0] == "SCATTER" and len(parts) in [2, 3]:
+            seed = 0
+            if len(parts) == 3:
+                seed = int(parts[2])
+            return random_scatter(int(parts[1]), geometry, ball_diameter, seed)
+        else:
+            return None
+    except ValueError:
+        return None
+    # racks too deep for the foot spot are moved down the table, as long as they stay clear of the cue ball.
+    lowest_front = geometry.head_string + 4 * ball_diameter
+    offset = 0
+    while True:
+        fits = True
+        for position in positions:
+            if not fits_on_table(position[0], position[1] - offset, ball_diameter / 2., geometry):
+                fits = False
+                break
+        if fits:
+            return [[position[0], position[1] - offset] for position in positions]
+        offset += rack_spacing / 2
+        if positions[0][1] - offset < lowest_front:
+            print "Rack " + game_type + " does not fit on this table. Error Code: 1938475620"
+            return None
@@ -0,0 +1,136 @@
+
+import Table_Class
+import Broad_Phase_Class
+import argparse
+import time
+
+"""This module measures how the solver's cost grows with the number of balls on the table. It breaks into racks and random
+scatters of increasing size (see Rack_Generator.py) and reports, for each, the wall clock time per second of simulated
+time, and the time per ball per solver step. If the cost of a step only grew with the number of balls, the last column
+would stay flat; wherever it starts climbing is where something quadratic has taken over.
+
+To show what the broad phase (Broad_Phase_Class.py) is worth, each case can also be run with it replaced by one that hands
+every pair of balls and every ball/wall pair to the impact solver, which is what the solver did before the broad phase
+existed. The outcome must be the same either way, since the broad phase only ever drops pairs that can't touch.
+
+Big scatters can take a long time to come to rest, so every case is cut off after a fixed amount of simulated time.
+
+Last measured (1 s simulated, 20 m/s break): the time per ball per step stays flat at around 15 us all the way up to 400
+balls, so the broad phase has taken the quadratic pair checks out of each step. What still grows is the number of steps:
+every impact ends a round and the timestep is refined around it, and more balls means more impacts, so the time per
+simulated second grows roughly with the square of the number of balls (0.7 s at 50 balls, 19 s at 200, 73 s at 400). The
+broad phase is 2-3x faster than all pairs for a 9 or 15 ball rack, and 6x at 50 balls. Multi-rate stepping (--multi-rate)
+makes no difference for a 9 or 15 ball rack, and is 1.2-1.4x faster for the scatters of 50 to 200 balls, where most balls
+are slow or at rest while a few are still fast."""
+
+
+DEFAULT_GAME_TYPES = ["9_BALL", "8_BALL", "TRIANGLE_8", "SCATTER_50", "SCATTER_100", "SCATTER_200", "SCATTER_400"]
+
+
+"""A broad phase that rules nothing out: every pair of active balls and every wall is a candidate on every step. Only
+used as the baseline for the benchmark."""
+class All_Pairs_Phase(Broad_Phase_Class.Broad_Phase):
+
+    def update(self):
+        self.dirty = []
+        indices = self.active_set.indices
+        self.pairs = []
+        for counter in range(len(indices)):
+            for other_index in indices[counter + 1:]:
+                self.pairs.append([indices[counter], other_index])
+        all_walls = range(len(self.geometry.wall_points))
+        self.ball_walls = [all_walls for ball in self.ball_list]
+
+
+"""Raised by the time limit callback to stop a shot that has run for long enough."""
+class Simulated_Time_Reached(Exception):
+    pass
+
+
+"""Returns the latest time any ball on the table has been simulated up to."""
+def simulated_time(table):
+    latest = 0
+    for ball in table.list_all_balls:
+        end = len(ball.time_record) - 1
+        if ball.time_record[end] > latest:
+            latest = ball.time_record[end]
+    return latest
+
+
+"""Runs one break on a freshly racked table and returns a dictionary with the number of balls, the wall clock time, the
+simulated time, the solver steps, the derived rates, and the indices of the balls sunk. If all_pairs is True, the broad
+phase is replaced by All_Pairs_Phase. The shot is stopped after time_limit seconds of simulated time. If multi_rate is
+True, the balls step at their own rates (see ODE_Solver.advance_multi_rate)."""
+def run_case(game_type, velocity = 20, angle = 90, table_size = "9_FT", precision = "BALANCED", all_pairs = False,
+             time_limit = 2, multi_rate = False):
+    my_table = Table_Class.Pool_Table(game_type, table_size, precision)
+    my_table.smart_guy.multi_rate = multi_rate
+    if all_pairs:
+        my_table.crash.broad_phase = All_Pairs_Phase(my_table.list_active_balls, my_table.geometry,
+                                                     my_table.crash.cluster_gap)
+    def stop_at_limit(table):
+        if simulated_time(table) >= time_limit:
+            raise Simulated_Time_Reached()
+    start_time = time.time()
+    try:
+        my_table.take_shot(velocity, angle, round_callback = stop_at_limit)
+    except Simulated_Time_Reached:
+        pass
+    run_time = time.time() - start_time
+    balls = len(my_table.list_all_balls)
+    steps = my_table.smart_guy.step_counter
+    simulated = simulated_time(my_table)
+    sunk = [index for index in range(balls) if not my_table.list_active_balls.contains(index)]
+    result = {"game_type": game_type, "balls": balls, "run_time": run_time, "simulated_time": simulated,
+              "solver_steps": steps, "sunk_balls": sunk, "all_pairs": all_pairs,
+              "multi_rate": multi_rate}
+    result["time_per_simulated_second"] = run_time / max(simulated, .000001)
+    result["time_per_ball_step"] = run_time / max(steps * balls, 1)
+    return result
+
+
+"""Runs every case (and, for cases with no more than all_pairs_limit balls, the all pairs baseline as well), printing a line
+for each as it goes. If multi_rate is True, each case is also run with multi-rate stepping. Returns the list of result
+dictionaries."""
+def run_benchmark(game_types = DEFAULT_GAME_TYPES, velocity = 20, angle = 90, table_size = "9_FT", precision = "BALANCED",
+                  time_limit = 2, all_pairs_limit = 150, multi_rate = False):
+    results = []
+    for game_type in game_types:
+        result = run_case(game_type, velocity, angle, table_size, precision, False, time_limit)
+        results.append(result)
+        line = ("%-14s %4d balls: %7.2f s for %.2f s simulated, %7.2f s per simulated second, %6.1f us per ball step"
+                % (game_type, result["balls"], result["run_time"], result["simulated_time"],
+                   result["time_per_simulated_second"], result["time_per_ball_step"] * 1000000))
+        if result["balls"] <= all_pairs_limit:
+            baseline = run_case(game_type, velocity, angle, table_size, precision, True, time_limit)
+            results.append(baseline)
+            line += ", broad phase %.1fx faster than all pairs" % (baseline["run_time"] / result["run_time"])
+            if baseline["sunk_balls"] != result["sunk_balls"]:
+                line += " (OUTCOMES DIFFER!)"
+        if multi_rate:
+            multi_rate_result = run_case(game_type, velocity, angle, table_size, precision, False, time_limit, True)
+            results.append(multi_rate_result)
+            # not expected to match: the balls take different steps, so the outcome drifts like any precision change.
+            line += ", multi-rate %.1fx faster" % (result["run_time"] / multi_rate_result["run_time"])
+        print line
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measure how solver time grows with the number of balls.")
+    parser.add_argument("game_types", nargs = "*", default = DEFAULT_GAME_TYPES,
+                        help = "racks to break, see Rack_Generator.py (e.g. TRIANGLE_10, SCATTER_300)")
+    parser.add_argument("--velocity", type = float, default = 20)
+    parser.add_argument("--angle", type = float, default = 90)
+    parser.add_argument("--table-size", default = "9_FT")
+    parser.add_argument("--precision", default = "BALANCED")
+    parser.add_argument("--time-limit", type = float, default = 2, help = "seconds of simulated time per case")
+    parser.add_argument("--all-pairs-limit", type = int, default = 150,
+                        help = "largest number of balls to also run without the broad phase")
+    parser.add_argument("--multi-rate", action = "store_true", help = "also run every case with multi-rate stepping")
+    arguments = parser.parse_args()
+    run_benchmark(arguments.game_types, arguments.velocity, arguments.angle, arguments.table_size, arguments.precision,
+                  arguments.time_limit, arguments.all_pairs_limit, arguments.multi_rate)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+
+import Table_Class
+import multiprocessing
+from multiprocessing import sharedctypes
+import argparse
+import cPickle
+import numpy
+import time
+
+"""This module runs a batch of breaks in worker processes and collects every ball's final state, and optionally its whole
+trajectory, without sending any of it back through the pool. Returning balls from a worker means pickling every ball
+object along with its five state lists, and unpickling them again in the parent, which for short shots costs about as
+much as simulating them. Instead, the parent allocates the result arrays in shared memory before the workers start
+(multiprocessing.sharedctypes, handed to every worker once, when it starts), and each worker writes its shot's rows
+straight into them through a numpy view. All that crosses between the processes is the shot going out ([shot index,
+velocity, angle, x position]) and a small summary coming back.
+The arrays (see run_shots) are:
+    final_states: shots x balls x [x, y, velocity x, velocity y] at the end of each shot. nan positions for sunk balls.
+    trajectories: shots x balls x times x [x, y, velocity x, velocity y], every ball's state at each of the given times
+        (see Pool_Table.states_at), if any times are given. Like final_states, nan positions once a ball is sunk.
+Python 2.7 has no multiprocessing.shared_memory, so the arrays are sharedctypes.RawArrays, which have to be handed to the
+workers as they start rather than by name; that is what the pool initializer is for.
+
+Last measured (9-ball, BALANCED, 200 breaks, 4 workers sharing a single core): sending the balls back pickled took 23.2 s
+(297 KB per break), writing into shared memory 19.1 s, and 21.2 s with 100 sampled states per ball (31 KB per break).
+Part of the difference is that the workers here don't keep the full state history (see Table_Class.keep_history)."""
+
+
+# the worker's numpy views of the shared arrays, by name. set up by attach_worker, only used inside the worker processes.
+worker_arrays = {}
+# the worker's batch settings: game_type, table_size, precision and sample_times.
+worker_settings = {}
+
+
+"""Allocates a shared array of doubles with the given shape, filled with nan. Returns [raw array, shape]; the raw array is
+what gets handed to the workers, see as_numpy."""
+def shared_array(shape):
+    raw = sharedctypes.RawArray("d", int(numpy.prod(shape)))
+    as_numpy([raw, shape])[...] = numpy.nan
+    return [raw, shape]
+
+
+"""Returns a numpy view of a shared array ([raw array, shape], see shared_array). Writing to the view writes to the shared
+memory itself, so the other processes see it."""
+def as_numpy(block):
+    raw, shape = block
+    return numpy.frombuffer(raw, dtype = numpy.float64).reshape(shape)
+
+
+"""Runs once in every worker process as it starts: keeps numpy views of the shared arrays (a dictionary of name: [raw array,
+shape]) and the batch settings for the shots to come."""
+def attach_worker(blocks, settings):
+    worker_arrays.clear()
+    for name in blocks:
+        worker_arrays[name] = as_numpy(blocks[name])
+    worker_settings.clear()
+    worker_settings.update(settings)
+
+
+"""Takes one shot (a list of [shot index, velocity, angle, x position]) on a fresh table, writes its rows of the shared
+arrays, and returns a small summary dictionary: shot_index, status, sunk_balls, solver_steps and run_time. A plain module
+level function, since it runs in the worker processes."""
+def run_shot(shot):
+    shot_index, velocity, angle, x_position = shot
+    start_time = time.time()
+    my_table = Table_Class.Pool_Table(worker_settings["game_type"], worker_settings["table_size"],
+                                      worker_settings["precision"])
+    my_table.keep_history = False # the key states are enough for states_at.
+    status = my_table.take_shot(velocity, angle, x_position)
+    final_states = worker_arrays["final_states"][shot_index]
+    sunk_balls = []
+    for counter in range(len(my_table.list_all_balls)):
+        ball = my_table.list_all_balls[counter]
+        end = len(ball.time_record) - 1
+        if ball.position_x_record[end] == None:
+            sunk_balls.append(counter)
+            final_states[counter] = [numpy.nan, numpy.nan, 0, 0]
+        else:
+            final_states[counter] = [ball.position_x_record[end], ball.position_y_record[end], ball.velocity_x_record[end],
+                                     ball.velocity_y_record[end]]
+    if "trajectories" in worker_arrays:
+        states = my_table.states_at(worker_settings["sample_times"])
+        trajectories = worker_arrays["trajectories"][shot_index]
+        trajectories[:, :, 0] = states["x"]
+        trajectories[:, :, 1] = states["y"]
+        trajectories[:, :, 2] = states["velocity_x"]
+        trajectories[:, :, 3] = states["velocity_y"]
+    return {"shot_index": shot_index, "status": status, "sunk_balls": sunk_balls,
+            "solver_steps": my_table.smart_guy.step_counter, "run_time": time.time() - start_time}
+
+
+"""Runs a list of shots ([velocity, angle] or [velocity, angle, x position]) over the given number of worker processes (one
+per core if None, none at all if 1) and returns a dictionary with final_states and trajectories (numpy arrays in shared
+memory, see the module description; trajectories is None if no sample_times were given), sample_times, and results (the
+summary dictionary of every shot, in the same order as the shots)."""
+def run_shots(shots, game_type = "9_BALL", table_size = "9_FT", precision = "BALANCED", processes = None, sample_times = None):
+    balls = len(Table_Class.Pool_Table(game_type, table_size, precision).list_all_balls)
+    blocks = {"final_states": shared_array([len(shots), balls, 4])}
+    if sample_times is not None:
+        sample_times = numpy.asarray(sample_times, dtype = float)
+        blocks["trajectories"] = shared_array([len(shots), balls, len(sample_times), 4])
+    settings = {"game_type": game_type, "table_size": table_size, "precision": precision, "sample_times": sample_times}
+    tasks = []
+    for counter in range(len(shots)):
+        x_position = None
+        if len(shots[counter]) > 2:
+            x_position = shots[counter][2]
+        tasks.append([counter, shots[counter][0], shots[counter][1], x_position])
+
+    if processes == None:
+        processes = multiprocessing.cpu_count()
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, attach_worker, (blocks, settings))
+        try:
+            results = pool.map(run_shot, tasks)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        attach_worker(blocks, settings)
+        results = map(run_shot, tasks)
+
+    output = {"final_states": as_numpy(blocks["final_states"]), "trajectories": None, "sample_times": sample_times,
+              "results": results}
+    if sample_times is not None:
+        output["trajectories"] = as_numpy(blocks["trajectories"])
+    return output
+
+
+"""For comparison only: takes a shot in a worker (a list as for run_shot) and sends every ball back through the pool,
+pickled, the way results used to be returned. Returns [shot index, pickled balls]."""
+def run_shot_pickled(shot):
+    shot_index, velocity, angle, x_position = shot
+    my_table = Table_Class.Pool_Table(worker_settings["game_type"], worker_settings["table_size"], worker_settings["precision"])
+    my_table.take_shot(velocity, angle, x_position)
+    return [shot_index, cPickle.dumps(my_table.list_all_balls, cPickle.HIGHEST_PROTOCOL)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare collecting break results through shared memory against pickling.")
+    parser.add_argument("--shots", type = int, default = 200)
+    parser.add_argument("--processes", type = int, default = None)
+    parser.add_argument("--samples", type = int, default = 100, help = "states sampled per ball, over the first 10 s")
+    arguments = parser.parse_args()
+    shots = [[12 + 14 * (counter % 20) / 19., 85 + (counter // 20) % 10] for counter in range(arguments.shots)]
+    settings = {"game_type": "9_BALL", "table_size": "9_FT", "precision": "BALANCED", "sample_times": None}
+    tasks = [[counter, shots[counter][0], shots[counter][1], None] for counter in range(len(shots))]
+    processes = arguments.processes or multiprocessing.cpu_count()
+
+    start_time = time.time()
+    pool = multiprocessing.Pool(processes, attach_worker, ({}, settings))
+    received = 0
+    for shot_index, pickled in pool.imap_unordered(run_shot_pickled, tasks):
+        received += len(pickled)
+        cPickle.loads(pickled)
+    pool.close()
+    pool.join()
+    pickled_time = time.time() - start_time
+    print "Pickled balls:  %.2f s for %d shots (%.0f KB per shot)" % (pickled_time, len(shots), received / 1024. / len(shots))
+
+    start_time = time.time()
+    output = run_shots(shots, processes = processes)
+    print "Shared memory:  %.2f s for %d shots" % (time.time() - start_time, len(shots))
+
+    start_time = time.time()
+    output = run_shots(shots, processes = processes, sample_times = numpy.linspace(0, 10, arguments.samples))
+    print "Shared memory with %d states per ball: %.2f s for %d shots (%.0f KB per shot)" % (arguments.samples,
+        time.time() - start_time, len(shots), output["trajectories"][0].nbytes / 1024.)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+
+import Table_Class
+import BaseHTTPServer
+import SocketServer
+import multiprocessing
+import collections
+import threading
+import argparse
+import urllib2
+import json
+import math
+import time
+
+"""This module runs a long lived local service that takes shots on request, so quick what-if questions don't pay for
+starting python, importing matplotlib and racking a table every time. It keeps a pool of worker processes that have
+already imported everything and racked a table for each of the common setups, and answers over HTTP with JSON:
+    POST /shot    one shot, e.g. {"velocity": 24, "angle": 87}. Returns the outcome.
+    POST /shots   {"shots": [shot, shot, ...]}. The shots are run in parallel across the workers, and the outcomes are
+                  returned in the same order.
+    GET /status   the number of workers, requests, simulations, and how many requests were answered by another one.
+A shot may also give x_position, game_type, table_size, precision, stop_when_decided (stop once the outcome is known,
+which is a lot quicker, see Table_Class.take_shot) and trajectories (also return every ball's recorded states).
+The outcome is a dictionary with status, balls_sunk, sunk_balls, final_positions ([x, y], or None once sunk), solver_steps
+and run_time (seconds spent simulating, in the worker).
+
+The physics is deterministic, so identical shots have identical outcomes. A request for a shot that is already being
+simulated waits for that simulation instead of starting another one, and recent outcomes are kept, so asking again (or
+asking for the same shot in a batch) costs nothing.
+
+Usage:
+    python Shot_Service.py serve --port 8000
+    python Shot_Service.py shot 24 87 --port 8000
+"""
+
+
+DEFAULT_SHOT = {"x_position": None, "game_type": "9_BALL", "table_size": "9_FT", "precision": "BALANCED",
+                "stop_when_decided": False, "trajectories": False}
+
+
+# each worker's racked tables, by [game_type, table_size, precision]. only used inside the worker processes.
+worker_tables = {}
+
+
+"""Returns a table for the given setup, racked and ready for a shot. The table is taken out of the worker's store, so it
+has to be handed back with return_table once the shot is done."""
+def get_table(game_type, table_size, precision):
+    key = (game_type, json.dumps(table_size, sort_keys = True), json.dumps(precision, sort_keys = True))
+    if key in worker_tables:
+        return worker_tables.pop(key)
+    return Table_Class.Pool_Table(game_type, table_size, precision)
+
+
+"""Re-racks a table and puts it back in the worker's store for the next shot with the same setup."""
+def return_table(table, game_type, table_size, precision):
+    table.setup_table(game_type)
+    key = (game_type, json.dumps(table_size, sort_keys = True), json.dumps(precision, sort_keys = True))
+    worker_tables[key] = table
+
+
+"""Runs once in every worker process as it starts: racks a table for each of the given setups ([game_type, table_size,
+precision]), so that the first shots don't wait for it."""
+def warm_worker(setups):
+    for game_type, table_size, precision in setups:
+        return_table(Table_Class.Pool_Table(game_type, table_size, precision), game_type, table_size, precision)
+
+
+"""Takes one shot (a complete shot dictionary, see normalize_shot) on a warm table and returns its outcome dictionary. A plain
+module level function, since it runs in the worker processes."""
+def evaluate_shot(shot):
+    start_time = time.time()
+    my_table = get_table(shot["game_type"], shot["table_size"], shot["precision"])
+    status = my_table.take_shot(shot["velocity"], shot["angle"], shot["x_position"], shot["stop_when_decided"])
+    run_time = time.time() - start_time
+    sunk_balls = []
+    final_positions = []
+    trajectories = []
+    for counter in range(len(my_table.list_all_balls)):
+        ball = my_table.list_all_balls[counter]
+        end = len(ball.position_x_record) - 1
+        if not my_table.list_active_balls.contains(counter):
+            sunk_balls.append(counter)
+            final_positions.append(None)
+        else:
+            final_positions.append([ball.position_x_record[end], ball.position_y_record[end]])
+        if shot["trajectories"]:
+            trajectories.append({"time": ball.time_record, "x": ball.position_x_record, "y": ball.position_y_record,
+                                 "velocity_x": ball.velocity_x_record, "velocity_y": ball.velocity_y_record})
+    outcome = {"status": status, "balls_sunk": len(sunk_balls), "sunk_balls": sunk_balls, "final_positions": final_positions,
+               "solver_steps": my_table.smart_guy.step_counter, "run_time": run_time}
+    if shot["trajectories"]:
+        outcome["trajectories"] = trajectories
+    # re-racking after the answer is worked out, rather than before the next shot, still costs this request a few
+    # milliseconds, but saves the next one from it.
+    return_table(my_table, shot["game_type"], shot["table_size"], shot["precision"])
+    return outcome
+
+
+"""Returns a complete shot dictionary from a request: the defaults filled in, and velocity and angle checked. Raises
+ValueError if the request isn't a usable shot, including a velocity, angle or x_position that isn't a finite number (JSON
+allows NaN and Infinity), and a shot along the head string (angle 0 or 180) without an x_position, which take_shot can't
+aim at the rack."""
+def normalize_shot(request):
+    if not isinstance(request, dict):
+        raise ValueError("a shot must be a JSON object")
+    shot = dict(DEFAULT_SHOT)
+    for name in request:
+        if name not in DEFAULT_SHOT and name not in ["velocity", "angle"]:
+            raise ValueError("unknown shot entry: " + str(name))
+    shot.update(request)
+    for name in ["velocity", "angle"]:
+        if not isinstance(shot.get(name), (int, float)) or isinstance(shot.get(name), bool):
+            raise ValueError("a shot needs a number for " + name)
+    shot["velocity"] = float(shot["velocity"])
+    shot["angle"] = float(shot["angle"])
+    if shot["x_position"] != None:
+        shot["x_position"] = float(shot["x_position"])
+    for name in ["velocity", "angle", "x_position"]:
+        if shot[name] != None and (math.isnan(shot[name]) or math.isinf(shot[name])):
+            raise ValueError("a shot needs a finite number for " + name)
+    if shot["x_position"] == None and shot["angle"] % 180 == 0:
+        raise ValueError("a shot at angle " + str(shot["angle"]) + " needs an x_position")
+    return shot
+
+
+"""Handles one HTTP request. See the module description for the requests understood."""
+class Shot_Request_Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == "/status":
+            self.send_reply(200, self.server.service.status())
+        else:
+            self.send_reply(404, {"error": "unknown path " + self.path})
+
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.getheader("content-length", 0))))
+            if self.path == "/shot":
+                shots = [normalize_shot(request)]
+            elif self.path == "/shots":
+                if not isinstance(request, dict) or not isinstance(request.get("shots"), list):
+                    raise ValueError("expected {\"shots\": [...]}")
+                shots = [normalize_shot(shot) for shot in request["shots"]]
+            else:
+                self.send_reply(404, {"error": "unknown path " + self.path})
+                return
+        except ValueError, error:
+            self.send_reply(400, {"error": str(error)})
+            return
+        try:
+            outcomes = self.server.service.evaluate(shots)
+        except Exception, error:
+            self.send_reply(500, {"error": repr(error)})
+            return
+        if self.path == "/shot":
+            self.send_reply(200, outcomes[0])
+        else:
+            self.send_reply(200, {"outcomes": outcomes})
+
+    def send_reply(self, code, reply):
+        body = json.dumps(reply)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    """Keeping quiet, rather than printing a line for every request."""
+    def log_message(self, format, *arguments):
+        pass
+
+
+class Shot_Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+"""This class owns the worker pool and the outcomes of recent shots. Every HTTP request runs in its own thread and calls
+evaluate; the pool does the simulating."""
+class Shot_Service():
+
+    cache_size = 10000 # finished outcomes kept for repeat requests. a few KB each (far more with trajectories).
+    request_timeout = 600 # seconds a request waits for its shots before giving up.
+    poll_interval = .005 # seconds between checks on a shot that is still running.
+
+    def __init__(self, processes = None, warm_setups = [["9_BALL", "9_FT", "BALANCED"]]):
+        if processes == None:
+            processes = multiprocessing.cpu_count()
+        self.processes = processes
+        self.pool = multiprocessing.Pool(processes, warm_worker, (warm_setups,))
+        self.lock = threading.Lock()
+        self.outcomes = collections.OrderedDict() # shot key: AsyncResult, oldest first. includes the ones still running.
+        self.requests = 0
+        self.simulations = 0
+        self.coalesced = 0
+
+    """Returns the AsyncResult for a shot, starting a simulation only if the same shot isn't already running or done."""
+    def submit(self, shot):
+        key = json.dumps(shot, sort_keys = True)
+        with self.lock:
+            self.requests += 1
+            if key in self.outcomes:
+                self.coalesced += 1
+                return self.outcomes[key]
+            self.simulations += 1
+            result = self.pool.apply_async(evaluate_shot, (shot,))
+            self.outcomes[key] = result
+            # forget the oldest finished outcomes. running ones are kept, other requests may be waiting on them.
+            if len(self.outcomes) > self.cache_size:
+                for old_key in self.outcomes.keys():
+                    if len(self.outcomes) <= self.cache_size:
+                        break
+                    if self.outcomes[old_key].ready():
+                        del self.outcomes[old_key]
+            return result
+
+    """Runs a list of complete shot dictionaries (see normalize_shot) across the workers, and returns their outcomes in the
+    same order. A shot that fails is forgotten, so asking again runs it again, and the error is raised."""
+    def evaluate(self, shots):
+        results = [self.submit(shot) for shot in shots]
+        outcomes = []
+        for shot, result in zip(shots, results):
+            deadline = time.time() + self.request_timeout
+            while not result.ready() and time.time() < deadline:
+                # an AsyncResult only wakes one of the threads waiting on it, and a coalesced shot has several, so each
+                # one checks back every so often rather than waiting on it outright.
+                result.wait(self.poll_interval)
+            try:
+                outcomes.append(result.get(0))
+            except Exception:
+                with self.lock:
+                    key = json.dumps(shot, sort_keys = True)
+                    if self.outcomes.get(key) is result:
+                        del self.outcomes[key]
+                raise
+        return outcomes
+
+    """Returns a dictionary describing the service: workers, requests, simulations run, and requests coalesced (answered by
+    a simulation that was already running or done)."""
+    def status(self):
+        with self.lock:
+            return {"workers": self.processes, "requests": self.requests, "simulations": self.simulations,
+                    "coalesced": self.coalesced, "outcomes_kept": len(self.outcomes)}
+
+    """Starts answering HTTP requests in a background thread. Returns the port actually used (useful when port 0 is
+    given)."""
+    def start(self, host = "localhost", port = 0):
+        self.server = Shot_Server((host, port), Shot_Request_Handler)
+        self.server.service = self
+        thread = threading.Thread(target = self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.server.server_address[1]
+
+    """Stops the server and the workers."""
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.pool.terminate()
+        self.pool.join()
+
+
+"""Asks a running service for the outcomes of a list of shots (dictionaries, see the module description), and returns them
+in the same order. For tooling, so that it doesn't need to know the HTTP details."""
+def request_shots(shots, host = "localhost", port = 8000):
+    reply = urllib2.urlopen("http://" + host + ":" + str(port) + "/shots", json.dumps({"shots": shots}),
+                            Shot_Service.request_timeout)
+    return json.loads(reply.read())["outcomes"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Serve shots from a pool of warm workers, or ask a running service.")
+    parser.add_argument("role", choices = ["serve", "shot"])
+    parser.add_argument("velocity", type = float, nargs = "?", default = 24)
+    parser.add_argument("angle", type = float, nargs = "?", default = 87)
+    parser.add_argument("--host", default = "localhost")
+    parser.add_argument("--port", type = int, default = 8000)
+    parser.add_argument("--processes", type = int, default = None, help = "worker processes (default: one per core)")
+    parser.add_argument("--stop-when-decided", action = "store_true")
+    arguments = parser.parse_args()
+
+    if arguments.role == "serve":
+        service = Shot_Service(arguments.processes)
+        service.start(arguments.host, arguments.port)
+        print "Serving shots on port " + str(arguments.port) + " with " + str(service.processes) + " workers."
+        try:
+            # waiting in short slices so that Ctrl-C still works.
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            service.close()
+    else:
+        start_time = time.time()
+        outcome = request_shots([{"velocity": arguments.velocity, "angle": arguments.angle,
+                                  "stop_when_decided": arguments.stop_when_decided}], arguments.host, arguments.port)[0]
+        print "Sunk balls " + str(outcome["sunk_balls"]) + " (" + outcome["status"] + "), answered in %.3f s." % (
+            time.time() - start_time)
+
+if __name__ == "__main__":
+    main()
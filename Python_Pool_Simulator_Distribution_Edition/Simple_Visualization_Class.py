@@ -3,18 +3,78 @@
 import matplotlib.pyplot as plt # for plotting.
 import math
 
-"""This class contains the tools for making a fixed plot that helps visualize a pool break by plotting each timestep for each
-ball as a separate point. great for debugging because you can easily identify where the ODE solver felt more/less points were necessary,
-but can be very confusing to interpret for large numbers of balls."""
+"""This function decimates one piece of a trajectory with the Ramer-Douglas-Peucker algorithm: the end points are kept, and
+the point furthest from the line between them is kept (splitting the piece in two) only if it is further than the tolerance.
+Between impacts a ball travels in a straight line, so almost every point can be dropped. Returns the indices kept, in order.
+Uses a stack rather than recursion, since a single piece can be thousands of points long."""
+def decimate(x_list, y_list, first, last, tolerance):
+    keep = [first, last]
+    stack = [[first, last]]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        x1 = x_list[start]
+        y1 = y_list[start]
+        dx = x_list[end] - x1
+        dy = y_list[end] - y1
+        length = math.sqrt(dx*dx + dy*dy)
+        furthest = 0
+        furthest_index = start
+        for index in range(start + 1, end):
+            if length == 0:
+                distance = math.sqrt((x_list[index] - x1)**2 + (y_list[index] - y1)**2)
+            else:
+                distance = math.fabs((x_list[index] - x1) * dy - (y_list[index] - y1) * dx) / length
+            if distance > furthest:
+                furthest = distance
+                furthest_index = index
+        if furthest > tolerance:
+            keep.append(furthest_index)
+            stack.append([start, furthest_index])
+            stack.append([furthest_index, end])
+    keep.sort()
+    return keep
+
+
+"""This function reduces a ball's recorded trajectory to the points that can be told apart on screen. Impact points (state
+points added at the same time as the one before them, see Impact_Solver) are always kept, and the trajectory is decimated
+piece by piece between them. A sunk ball's trajectory ends at its last point on the table. Returns [x list, y list, impact
+x list, impact y list]."""
+def decimate_trajectory(ball, tolerance):
+    x_list = ball.position_x_record
+    y_list = ball.position_y_record
+    last = len(x_list) - 1
+    while last > 0 and (x_list[last] == None or y_list[last] == None):
+        last -= 1
+    impacts = []
+    for index in range(1, last + 1):
+        if ball.time_record[index] == ball.time_record[index - 1]:
+            impacts.append(index)
+    boundaries = [0] + impacts + [last]
+    kept = [0]
+    for counter in range(1, len(boundaries)):
+        if boundaries[counter] > boundaries[counter - 1]:
+            kept.extend(decimate(x_list, y_list, boundaries[counter - 1], boundaries[counter], tolerance)[1:])
+    return [[x_list[index] for index in kept], [y_list[index] for index in kept],
+            [x_list[index] for index in impacts], [y_list[index] for index in impacts]]
+
+
+"""This class contains the tools for making a fixed plot that helps visualize a pool break. Each ball's path is drawn as a
+line, decimated down to what can be seen on screen, with a marker at every impact. For debugging, every timestep can also be
+plotted as a separate point, so you can easily identify where the ODE solver felt more/less points were necessary (this is
+how the plot was originally drawn, and can be very confusing to interpret for large numbers of balls)."""
 class Plot_Drawing():
     
+    tolerance_fraction = .0005 # fraction of the table size below which detail in a path is dropped. well under a pixel.
+    
     def __init__(self):
         pass
     
     """This method takes an input of balls and walls and plots them. as the only method, with no class level variables, this could very well
     just be a function. It was implemented as a method of a class to give future functionality, when all of the different visualization methods
-    may become part of the same class. """
-    def draw(self, ball_list, wall_list):
+    may become part of the same class. Set show_refinement to also plot every point the solver calculated. """
+    def draw(self, ball_list, wall_list, show_refinement = False):
         plt.figure()
         
         # calculating the appropriate max/ min display.
@@ -63,16 +123,20 @@ class Plot_Drawing():
         plt.plot(x,y, 'b', linewidth=5)
         
         # now make the plot!
-        # plot the ball positions
+        # plot the ball paths, with a marker at each impact
+        tolerance = max(right - left, top - bottom) * self.tolerance_fraction
         symbol_type = ['x','o']
         color_type = ['b', 'r', 'g']
         for ball_counter in range(len(ball_list)):
             symbol = ball_counter % len(symbol_type)
             color = ball_counter / len(symbol_type)
             color = color % len(color_type)
-            setup_string = color_type[color] + symbol_type[symbol]
             ball = ball_list[ball_counter]
-            plt.plot(ball.position_x_record, ball.position_y_record, setup_string)
+            x_list, y_list, impact_x_list, impact_y_list = decimate_trajectory(ball, tolerance)
+            plt.plot(x_list, y_list, color_type[color] + '-')
+            plt.plot(impact_x_list, impact_y_list, color_type[color] + symbol_type[symbol])
+            if show_refinement:
+                plt.plot(ball.position_x_record, ball.position_y_record, color_type[color] + '.', markersize = 2)
         
         plt.show()
 
@@ -0,0 +1,294 @@
+
+import Sweep_Runner
+import Symmetry
+import SocketServer
+import threading
+import argparse
+import socket
+import json
+import time
+
+"""This module spreads a sweep across any number of machines. A coordinator splits the angle/velocity grid into work units
+and hands them out over a plain TCP socket; workers (on the same machine or any other) ask for a unit, run every cell in it
+with Sweep_Runner.run_cell, and send the results back. Each message is a single line of JSON, and every request is its own
+short connection, so a worker that dies simply stops asking. Units are leased rather than given away: if a unit's results
+don't come back before its lease expires, it goes back in the queue for another worker. Results are accepted only once per
+unit, so a late answer from a worker that was presumed dead is ignored, and every cell of the grid is filled exactly once.
+Cells that are mirror images of each other are only handed out once, and the mirrored results are filled in by the
+coordinator (see Symmetry.py). With a checkpoint file, the coordinator saves every result as it is accepted, and a restarted
+coordinator only hands out the cells that are still missing.
+
+Usage, for example with the coordinator on host 'alpha':
+    python Sweep_Coordinator.py serve --port 5000
+    python Sweep_Coordinator.py work --host alpha --port 5000       (on as many machines as are available)
+"""
+
+
+"""Handles a single connection: reads one JSON message, passes it to the coordinator, and writes back the reply."""
+class Work_Request_Handler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            message = json.loads(line)
+        except ValueError:
+            print "Message from worker is not JSON. Error Code: 3318472065"
+            message = None
+        reply = self.server.coordinator.handle_message(message)
+        self.wfile.write(json.dumps(reply) + "\n")
+
+
+class Work_Server(SocketServer.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+"""This class owns the work queue and the merged results for one sweep. See the module description for the protocol."""
+class Sweep_Coordinator():
+
+    lease_time = 300 # seconds a worker has to return a unit before it is handed to someone else.
+    poll_interval = 1 # seconds a worker is told to wait when every remaining unit is leased out.
+
+    def __init__(self, sweep_angles, sweep_velocities, game_type = "9_BALL", table_size = "9_FT", cells_per_unit = 4,
+                 precision = "BALANCED", use_symmetry = True, checkpoint = None):
+        self.sweep_angles = sweep_angles
+        self.sweep_velocities = sweep_velocities
+        self.lock = threading.Lock()
+
+        # splitting the grid into work units
+        cells = []
+        for angle_index in range(len(sweep_angles)):
+            for velocity_index in range(len(sweep_velocities)):
+                cells.append([angle_index, velocity_index, sweep_angles[angle_index], sweep_velocities[velocity_index],
+                              game_type, table_size, precision])
+        # cells already in the checkpoint (from an earlier run of the same sweep) are not handed out again.
+        self.results = {} # [angle index, velocity index]: result dictionary
+        self.checkpoint = None
+        if checkpoint != None:
+            self.checkpoint = Sweep_Runner.Sweep_Checkpoint(checkpoint, Sweep_Runner.sweep_header(sweep_angles, sweep_velocities,
+                                                                                                   game_type, table_size, precision))
+            self.results.update(self.checkpoint.results)
+            cells = [cell for cell in cells if (cell[0], cell[1]) not in self.results]
+        # only one cell of each mirror image pair is handed out.
+        self.ball_map = None
+        if use_symmetry:
+            self.ball_map = Symmetry.mirror_map_for(game_type, table_size)
+        groups = Symmetry.group_cells(cells, self.ball_map)
+        self.members = {} # [angle index, velocity index] of a simulated cell: every grid cell it stands for
+        for canonical_cell, group in groups:
+            self.members[(canonical_cell[0], canonical_cell[1])] = group
+        cells = [group[0] for group in groups]
+        self.units = []
+        for counter in range(0, len(cells), cells_per_unit):
+            self.units.append(cells[counter:counter + cells_per_unit])
+
+        self.pending_units = range(len(self.units))
+        self.pending_units.reverse() # units are popped from the end, so this hands them out in grid order.
+        self.leases = {} # unit id: [lease deadline, worker name]
+        self.attempts = [0] * len(self.units)
+        self.completed_units = set()
+        self.duplicate_results = 0 # results that arrived for a unit that was already complete, and were ignored.
+        self.finished = threading.Event()
+        if not self.units:
+            self.finished.set()
+        self.server = None
+
+    """Answers one message from a worker. 'GET_WORK' returns a unit (or tells the worker to wait or stop), and 'RESULT'
+    hands back the results for a unit. Anything else, including a RESULT for a unit that doesn't exist or results that
+    aren't shaped like run_cell's, gets an error reply ({"error": ...}) rather than being left to throw in the handler."""
+    def handle_message(self, message):
+        if not isinstance(message, dict) or "request" not in message:
+            print "Badly formed message from worker. Error Code: 5604918273"
+            return {"error": "BAD_MESSAGE"}
+        with self.lock:
+            if message["request"] == "GET_WORK":
+                return self.lease_unit(message.get("worker"))
+            elif message["request"] == "RESULT":
+                unit_id = message.get("unit_id")
+                if not isinstance(unit_id, int) or unit_id < 0 or unit_id >= len(self.units):
+                    print "Results for unknown unit " + str(unit_id) + ". Ignoring them. Error Code: 2487160935"
+                    return {"error": "UNKNOWN_UNIT"}
+                try:
+                    return {"accepted": self.accept_results(unit_id, message["results"])}
+                except (KeyError, TypeError):
+                    print "Badly formed results for unit " + str(unit_id) + ". Ignoring them. Error Code: 8861204753"
+                    return {"error": "BAD_MESSAGE"}
+            else:
+                print "Unknown request from worker: " + str(message["request"]) + ". Error Code: 7730146382"
+                return {"error": "UNKNOWN_REQUEST"}
+
+    """Hands out the next unit. Any lease that has expired first goes back in the queue, since its worker is assumed dead.
+    Must be called with the lock held."""
+    def lease_unit(self, worker):
+        now = time.time()
+        for unit_id in self.leases.keys():
+            if self.leases[unit_id][0] < now:
+                print "Lease expired for unit " + str(unit_id) + " (worker " + str(self.leases[unit_id][1]) + "). Retrying."
+                del self.leases[unit_id]
+                self.pending_units.append(unit_id)
+        if self.pending_units:
+            unit_id = self.pending_units.pop()
+            self.leases[unit_id] = [now + self.lease_time, worker]
+            self.attempts[unit_id] += 1
+            return {"unit_id": unit_id, "cells": self.units[unit_id]}
+        elif len(self.completed_units) == len(self.units):
+            return {"done": True}
+        else:
+            return {"wait": self.poll_interval}
+
+    """Merges the results for a unit into the grid. Returns False (and changes nothing) if the unit is already complete,
+    or if the results don't cover exactly the cells of the unit. Must be called with the lock held."""
+    def accept_results(self, unit_id, results):
+        if unit_id in self.completed_units:
+            self.duplicate_results += 1
+            return False
+        expected = sorted([[cell[0], cell[1]] for cell in self.units[unit_id]])
+        received = sorted([[result["angle_index"], result["velocity_index"]] for result in results])
+        if expected != received:
+            print "Results for unit " + str(unit_id) + " do not match its cells. Ignoring them. Error Code: 1190457328"
+            return False
+        for result in results:
+            for member_result in Symmetry.expand_result(result, self.members[(result["angle_index"], result["velocity_index"])],
+                                                        self.ball_map):
+                self.results[(member_result["angle_index"], member_result["velocity_index"])] = member_result
+                if self.checkpoint != None:
+                    self.checkpoint.record(member_result)
+        self.completed_units.add(unit_id)
+        if unit_id in self.leases:
+            del self.leases[unit_id]
+        if unit_id in self.pending_units:
+            # the lease had expired and the unit was queued again, but the original worker got there first.
+            self.pending_units.remove(unit_id)
+        print "Unit " + str(unit_id) + " complete (" + str(len(self.completed_units)) + "/" + str(len(self.units)) + ")."
+        if len(self.completed_units) == len(self.units):
+            self.finished.set()
+        return True
+
+    """Starts serving work units in a background thread. Returns the port actually used (useful when port 0 is given)."""
+    def start(self, host = "", port = 0):
+        self.server = Work_Server((host, port), Work_Request_Handler)
+        self.server.coordinator = self
+        thread = threading.Thread(target = self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.server.server_address[1]
+
+    """Waits for every unit to complete, stops the server, and returns the merged grid of balls sunk, in the same
+    [angle][velocity] layout as Heatmap_Iterator."""
+    def wait(self):
+        # waiting in short slices so that Ctrl-C still works.
+        while not self.finished.wait(1):
+            pass
+        # keep answering 'done' for a moment, so the workers still polling hear that the sweep is over.
+        time.sleep(self.poll_interval * 2)
+        self.server.shutdown()
+        self.server.server_close()
+        if self.checkpoint != None:
+            self.checkpoint.close()
+        return self.grid()
+
+    """Returns the merged grid of balls sunk. Cells that have not come back yet are None."""
+    def grid(self):
+        num_balls_sunk = []
+        for angle_index in range(len(self.sweep_angles)):
+            row = []
+            for velocity_index in range(len(self.sweep_velocities)):
+                result = self.results.get((angle_index, velocity_index))
+                if result == None:
+                    row.append(None)
+                else:
+                    row.append(result["balls_sunk"])
+            num_balls_sunk.append(row)
+        return num_balls_sunk
+
+
+"""Sends one message to the coordinator and returns its reply. A connection closed without a reply, or a reply that isn't
+JSON, raises socket.error like any other connection problem, so that callers retry it the same way."""
+def send_message(host, port, message):
+    connection = socket.create_connection((host, port), timeout = 60)
+    try:
+        connection.sendall(json.dumps(message) + "\n")
+        reply = connection.makefile("r").readline()
+    finally:
+        connection.close()
+    if not reply:
+        raise socket.error("the coordinator closed the connection without replying")
+    try:
+        return json.loads(reply)
+    except ValueError:
+        raise socket.error("the coordinator's reply is not JSON")
+
+
+"""Runs a worker: keeps asking the coordinator for work units and returning their results until the coordinator says the
+sweep is done. If the coordinator can't be reached (or doesn't answer properly), for work or to return results, the worker
+retries a few times before giving up."""
+def run_worker(host, port, worker_name = None, max_connection_failures = 10):
+    if worker_name == None:
+        worker_name = socket.gethostname() + ":" + str(time.time())
+    connection_failures = 0
+    while True:
+        try:
+            reply = send_message(host, port, {"request": "GET_WORK", "worker": worker_name})
+            if "error" in reply:
+                raise socket.error("the coordinator answered " + str(reply["error"]))
+        except socket.error:
+            connection_failures += 1
+            if connection_failures > max_connection_failures:
+                print "Could not reach the coordinator. Worker stopping."
+                return
+            time.sleep(1)
+            continue
+        connection_failures = 0
+        if reply.get("done"):
+            return
+        elif "wait" in reply:
+            time.sleep(reply["wait"])
+        else:
+            results = [Sweep_Runner.run_cell(cell) for cell in reply["cells"]]
+            # the results are retried the same way, rather than lost until the unit's lease runs out.
+            while True:
+                try:
+                    answer = send_message(host, port, {"request": "RESULT", "unit_id": reply["unit_id"], "results": results})
+                    if "error" in answer:
+                        # sending the same results again won't change the answer.
+                        print "The coordinator refused the results for unit " + str(reply["unit_id"]) + " (" + \
+                            str(answer["error"]) + "). Error Code: 6093357128"
+                    break
+                except socket.error:
+                    connection_failures += 1
+                    if connection_failures > max_connection_failures:
+                        print "Could not reach the coordinator to return unit " + str(reply["unit_id"]) + \
+                            ". Worker stopping."
+                        return
+                    time.sleep(1)
+            connection_failures = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Distribute a break sweep across machines.")
+    parser.add_argument("role", choices = ["serve", "work"])
+    parser.add_argument("--host", default = "localhost")
+    parser.add_argument("--port", type = int, default = 5000)
+    parser.add_argument("--cells-per-unit", type = int, default = 4)
+    parser.add_argument("--precision", default = "BALANCED", choices = ["FAST", "BALANCED", "PRECISE"])
+    parser.add_argument("--checkpoint", default = None, help = "file to save results to, and resume from if it exists")
+    arguments = parser.parse_args()
+
+    if arguments.role == "serve":
+        import Heatmap_Iterator
+        sweep_angles = Heatmap_Iterator.lin_fill(65,90.5, 51)
+        sweep_velocities = Heatmap_Iterator.lin_fill(12,26.5,29)
+        coordinator = Sweep_Coordinator(sweep_angles, sweep_velocities, cells_per_unit = arguments.cells_per_unit,
+                                        precision = arguments.precision, checkpoint = arguments.checkpoint)
+        coordinator.start("", arguments.port)
+        print "Serving " + str(len(coordinator.units)) + " work units on port " + str(arguments.port)
+        num_balls_sunk = coordinator.wait()
+        print "Duplicate results ignored: " + str(coordinator.duplicate_results)
+        print("Number of balls sunk for each angle,velocity combo:")
+        print str(num_balls_sunk)
+    else:
+        run_worker(arguments.host, arguments.port)
+
+if __name__ == "__main__":
+    main()
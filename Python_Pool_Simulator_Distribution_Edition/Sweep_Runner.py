@@ -0,0 +1,237 @@
+
+import Table_Class
+import Symmetry
+import multiprocessing
+import itertools
+import json
+import time
+import os
+
+"""This module runs sweeps of breaks and hands back each result as soon as it is finished, rather than holding everything
+until the end of the sweep. The sweep is a generator: the caller loops over it, and can write, plot, or stop early
+as the results come in. A Sweep_Progress object keeps track of throughput and estimated time remaining while the sweep runs.
+A Sweep_Checkpoint writes every result to a file as soon as it arrives, so a sweep that is stopped (or crashes) can be
+started again and pick up where it left off."""
+
+
+"""This function runs one cell of a sweep: racks a fresh table, takes a single break, and returns a dictionary describing
+the outcome, including the (sorted) indices of the balls sunk and the ball the cue ball hit first (see
+Table_Class.first_contact). Every shot runs until the balls stop (stopping once the outcome is decided saves no measurable
+time, see Table_Class.PRECISION_PRESETS). The cell is a list of [angle_index, velocity_index, angle, velocity, game_type,
+table_size, precision]. It is a plain module level function so that it can be handed to worker processes."""
+def run_cell(cell):
+    angle_index, velocity_index, angle, velocity, game_type, table_size, precision = cell
+    start_time = time.time()
+    my_table = Table_Class.Pool_Table(game_type, table_size, precision)
+    my_table.keep_history = False # only the outcome is needed, so there is no point holding on to every step.
+    initial_ball_count = my_table.num_balls_remaining()
+    my_table.take_shot(velocity, angle)
+    final_ball_count = my_table.num_balls_remaining()
+    sunk_balls = []
+    for counter in range(len(my_table.list_all_balls)):
+        if not my_table.list_active_balls.contains(counter):
+            sunk_balls.append(counter)
+    return {"angle_index": angle_index, "velocity_index": velocity_index, "angle": angle, "velocity": velocity,
+            "balls_sunk": initial_ball_count - final_ball_count, "sunk_balls": sunk_balls,
+            "first_contact": my_table.first_contact(), "solver_steps": my_table.smart_guy.step_counter,
+            "run_time": time.time() - start_time}
+
+
+"""This class keeps running totals for a sweep, so that throughput (simulations per second and solver steps per second) and
+an estimated time remaining can be reported while the sweep is still going."""
+class Sweep_Progress():
+    def __init__(self, total_cells):
+        self.total_cells = total_cells
+        self.completed_cells = 0
+        self.resumed_cells = 0 # cells loaded from a checkpoint. they count as complete, but not towards throughput.
+        self.solver_steps = 0
+        self.start_time = time.time()
+
+    """Adds a finished cell to the running totals."""
+    def update(self, result):
+        self.completed_cells += 1
+        if result.get("resumed"):
+            self.resumed_cells += 1
+        else:
+            self.solver_steps += result["solver_steps"]
+
+    """Returns the number of seconds since the sweep started."""
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    """Returns the number of finished simulations per second of wall clock time."""
+    def simulations_per_second(self):
+        elapsed = self.elapsed()
+        if elapsed == 0:
+            return 0
+        return (self.completed_cells - self.resumed_cells) / elapsed
+
+    """Returns the number of solver steps per second of wall clock time, summed over all workers."""
+    def steps_per_second(self):
+        elapsed = self.elapsed()
+        if elapsed == 0:
+            return 0
+        return self.solver_steps / elapsed
+
+    """Returns the estimated number of seconds until the sweep is finished, or None if nothing has finished yet."""
+    def eta(self):
+        if self.completed_cells == self.resumed_cells:
+            return None
+        return (self.total_cells - self.completed_cells) * self.elapsed() / (self.completed_cells - self.resumed_cells)
+
+    """Returns a one line summary of the progress, for printing."""
+    def report(self):
+        percentage = (self.completed_cells / float(self.total_cells)) * 100
+        eta = self.eta()
+        if eta == None:
+            eta_string = "unknown"
+        else:
+            eta_string = "%.1f s" % eta
+        return "Percentage Complete: %.1f (%d/%d), %.2f simulations/s, %.0f solver steps/s, ETA: %s" % (percentage,
+            self.completed_cells, self.total_cells, self.simulations_per_second(), self.steps_per_second(), eta_string)
+
+
+"""Returns the description of a sweep that is written at the top of its checkpoint: the grid, the game, and every setting
+the results depend on (the solver precision, the ball and cushion physics, and the cushion layout). A checkpoint is only
+resumed if this matches exactly, so results from different grids or physics are never mixed."""
+def sweep_header(sweep_angles, sweep_velocities, game_type = "9_BALL", table_size = "9_FT", precision = "BALANCED"):
+    my_table = Table_Class.Pool_Table(game_type, table_size, precision)
+    ball = my_table.list_all_balls[0]
+    physics = {"mu_sliding": ball.mu_sliding, "mu_rolling": ball.mu_rolling, "g": ball.g, "sliding_speed": ball.sliding_speed,
+               "ball_diameter": ball.ball_diameter, "ball_restitution": my_table.crash.ball_restitution,
+               "wall_restitution": my_table.crash.wall_restitution, "cluster_gap": my_table.crash.cluster_gap}
+    header = {"checkpoint_version": 1, "sweep_angles": sweep_angles, "sweep_velocities": sweep_velocities,
+              "game_type": game_type, "table_size": table_size, "precision": my_table.precision, "physics": physics,
+              "walls": my_table.geometry.wall_points}
+    # the same round trip the header takes through the file, so it can be compared with one that was read back.
+    return json.loads(json.dumps(header))
+
+
+"""This class keeps a sweep's results in a file, one line of JSON per finished cell, after a header line describing the
+sweep (see sweep_header). Every result is flushed to disk as soon as it is recorded, so at most the cells that were still
+running are lost if the sweep is stopped. If the file already exists, its results are loaded instead, as long as its header
+matches; if it doesn't, the file is left alone and an error is raised. A line cut off part way through (by a crash while
+writing) is dropped. Results are told apart by the entries named in key_names (for a declarative sweep, see Sweep_Spec.py,
+that is the sample index)."""
+class Sweep_Checkpoint():
+
+    def __init__(self, path, header, key_names = ["angle_index", "velocity_index"]):
+        self.path = path
+        self.header = header
+        self.key_names = key_names
+        self.results = {} # (angle index, velocity index), or whatever key_names picks out: result dictionary
+        if os.path.exists(path):
+            self.load()
+            self.checkpoint_file = open(path, "a")
+        else:
+            self.checkpoint_file = open(path, "w")
+            self.write_line(header)
+
+    """Reads the header and results from an existing checkpoint, and cuts off any partly written line at the end."""
+    def load(self):
+        checkpoint_file = open(self.path, "r+")
+        try:
+            line = checkpoint_file.readline()
+            try:
+                header = json.loads(line)
+            except ValueError:
+                header = None
+            if header != self.header:
+                print "Checkpoint " + self.path + " was written for a different sweep. Error Code: 8406613295"
+                if header != None:
+                    for key in sorted(set(header.keys() + self.header.keys())):
+                        if header.get(key) != self.header.get(key):
+                            print "  " + key + " does not match."
+                raise ValueError("checkpoint " + self.path + " does not match this sweep")
+            good_length = checkpoint_file.tell()
+            while True:
+                line = checkpoint_file.readline()
+                if not line:
+                    break
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    break # only the last line can be cut off.
+                if not line.endswith("\n"):
+                    break
+                self.results[self.result_key(result)] = result
+                good_length = checkpoint_file.tell()
+            checkpoint_file.truncate(good_length)
+        finally:
+            checkpoint_file.close()
+
+    """Writes one line of JSON, and makes sure it has reached the disk."""
+    def write_line(self, entry):
+        self.checkpoint_file.write(json.dumps(entry) + "\n")
+        self.checkpoint_file.flush()
+        os.fsync(self.checkpoint_file.fileno())
+
+    """Returns the key a result is stored under."""
+    def result_key(self, result):
+        return tuple([result[name] for name in self.key_names])
+
+    """Adds a finished cell's result to the checkpoint."""
+    def record(self, result):
+        self.results[self.result_key(result)] = result
+        self.write_line(result)
+
+    def close(self):
+        self.checkpoint_file.close()
+
+
+"""This generator runs a break for every angle/velocity combination, and yields each cell's result dictionary (see run_cell)
+as soon as it finishes. With more than one process, the cells run in parallel and are yielded in the order they finish, so
+use the angle_index and velocity_index entries to place them in the grid. If a Sweep_Progress object is given, it is updated
+before each result is yielded. Coarse sweeps can trade accuracy for speed with precision = "FAST" (see
+Table_Class.PRECISION_PRESETS).
+If the table and rack are mirror symmetric, cells that are mirror images of each other (angles theta and 180 - theta) are
+simulated once, and the mirrored cell's result is reconstructed from it (see Symmetry.py), so a sweep that straddles
+90 degrees does about half the work. Set use_symmetry to False to simulate every cell.
+If a checkpoint file name is given, every result is saved to it as it finishes, and if the file is already there (from an
+earlier run of the same sweep), the cells it holds are yielded first (marked "resumed") and not simulated again."""
+def stream_sweep(sweep_angles, sweep_velocities, game_type = "9_BALL", table_size = "9_FT", processes = 1, progress = None,
+                 precision = "BALANCED", use_symmetry = True, checkpoint = None):
+    cells = []
+    for angle_index in range(len(sweep_angles)):
+        for velocity_index in range(len(sweep_velocities)):
+            cells.append([angle_index, velocity_index, sweep_angles[angle_index], sweep_velocities[velocity_index],
+                          game_type, table_size, precision])
+    sweep_checkpoint = None
+    if checkpoint != None:
+        sweep_checkpoint = Sweep_Checkpoint(checkpoint, sweep_header(sweep_angles, sweep_velocities, game_type, table_size,
+                                                                     precision))
+        for key in sorted(sweep_checkpoint.results.keys()):
+            result = dict(sweep_checkpoint.results[key])
+            result["resumed"] = True
+            if progress != None:
+                progress.update(result)
+            yield result
+        cells = [cell for cell in cells if (cell[0], cell[1]) not in sweep_checkpoint.results]
+    ball_map = None
+    if use_symmetry:
+        ball_map = Symmetry.mirror_map_for(game_type, table_size)
+    groups = Symmetry.group_cells(cells, ball_map)
+    members = {}
+    for canonical_cell, group in groups:
+        members[(canonical_cell[0], canonical_cell[1])] = group
+
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(run_cell, [group[0] for group in groups])
+    else:
+        results = itertools.imap(run_cell, [group[0] for group in groups])
+    try:
+        for result in results:
+            for member_result in Symmetry.expand_result(result, members[(result["angle_index"], result["velocity_index"])], ball_map):
+                if sweep_checkpoint != None:
+                    sweep_checkpoint.record(member_result)
+                if progress != None:
+                    progress.update(member_result)
+                yield member_result
+    finally:
+        # also runs if the caller stops early, so no worker processes are left behind.
+        if pool != None:
+            pool.terminate()
+        if sweep_checkpoint != None:
+            sweep_checkpoint.close()
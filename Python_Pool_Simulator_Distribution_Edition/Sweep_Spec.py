@@ -0,0 +1,279 @@
+
+import Table_Class
+import Sweep_Runner
+import Heatmap_Iterator
+import Shot_Geometry
+import multiprocessing
+import itertools
+import argparse
+import random
+import json
+import sys
+import time
+
+"""This module runs sweeps described by a spec (a dictionary, usually read from a JSON file) rather than by code. A spec can
+sweep any combination of the take_shot arguments (velocity, angle, x_position) and the per table physics constants (see
+Table_Class.PHYSICS_CONSTANTS), and picks how the samples are placed:
+    GRID: every combination of each parameter's values. The number of samples is the product of the counts, so it grows
+        exponentially with the number of parameters; fine for two or three.
+    LATIN_HYPERCUBE: "samples" random points, placed so that each parameter's range is split into that many equal slices
+        and every slice is sampled exactly once.
+    SOBOL: the first "samples" points of a Sobol sequence, which cover the space far more evenly than random points do, and
+        keep doing so as more samples are added (powers of two are the most even). Up to 16 parameters.
+For the space filling designs, the number of samples is picked directly, whatever the number of parameters, which is what
+makes sensitivity studies over many constants affordable.
+
+A spec looks like this (EXAMPLE_SPEC):
+    {"game_type": "9_BALL", "table_size": "9_FT", "precision": "FAST", "sampling": "SOBOL", "samples": 64, "seed": 0,
+     "fixed": {"x_position": 0.1},
+     "parameters": [{"name": "velocity", "range": [12, 26]},
+                    {"name": "angle", "range": [80, 100]},
+                    {"name": "mu_sliding", "range": [0.15, 0.25]},
+                    {"name": "wall_restitution", "values": [0.5, 0.6, 0.7]}]}
+A parameter either gives a "range" [low, high), sampled like Heatmap_Iterator.lin_fill samples (the high end is left out),
+with a "count" for GRID sampling, or a list of "values" to pick from. Anything not swept is taken from "fixed", or else its
+default: x_position None (worked out from the angle), and the physics class constants. velocity and angle must be given
+one way or the other. seed only matters for LATIN_HYPERCUBE. Like the angle/velocity sweeps, every shot runs until the balls
+stop, unless "stop_when_decided" is true (see Table_Class.take_shot). With "prune": true, every shot is first classified by
+geometry (see Shot_Geometry.py), and the ones whose outcome that already tells (mostly cue balls that miss the rack) are
+recorded without being simulated, marked with the class they were pruned as.
+
+Each result is a dictionary with the sample_index, every swept and fixed value, balls_sunk, sunk_balls, solver_steps and
+run_time. Mirror symmetry isn't used here: a swept x_position or physics constant would have to be mirrored along with the
+angle, and space filling samples don't come in mirror image pairs anyway."""
+
+
+SHOT_PARAMETERS = ["velocity", "angle", "x_position"]
+SAMPLINGS = ["GRID", "LATIN_HYPERCUBE", "SOBOL"]
+
+EXAMPLE_SPEC = {"game_type": "9_BALL", "table_size": "9_FT", "precision": "FAST", "sampling": "SOBOL", "samples": 64, "seed": 0,
+                "fixed": {"x_position": 0.1},
+                "parameters": [{"name": "velocity", "range": [12, 26]},
+                               {"name": "angle", "range": [80, 100]},
+                               {"name": "mu_sliding", "range": [0.15, 0.25]},
+                               {"name": "wall_restitution", "values": [0.5, 0.6, 0.7]}]}
+
+# Sobol direction numbers for dimensions 2 to 16, from Joe and Kuo (new-joe-kuo-6.21201): [s, a, [m_1 ... m_s]].
+# dimension 1 is the van der Corput sequence and needs none.
+SOBOL_DIRECTIONS = [[1, 0, [1]], [2, 1, [1, 3]], [3, 1, [1, 3, 1]], [3, 2, [1, 1, 1]], [4, 1, [1, 1, 3, 3]],
+                    [4, 4, [1, 3, 5, 13]], [5, 2, [1, 1, 5, 5, 17]], [5, 4, [1, 1, 5, 5, 5]], [5, 7, [1, 1, 7, 11, 19]],
+                    [5, 11, [1, 1, 5, 1, 1]], [5, 13, [1, 1, 1, 3, 11]], [5, 14, [1, 3, 5, 5, 31]],
+                    [6, 1, [1, 3, 3, 9, 7, 49]], [6, 13, [1, 1, 1, 15, 21, 21]], [6, 16, [1, 3, 1, 13, 27, 49]]]
+sobol_bits = 32 # enough for 2^32 samples.
+
+
+"""Returns the first count points of the Sobol sequence in the given number of dimensions, each a list of coordinates in
+[0, 1). Uses the Gray code ordering, so each point is one exclusive or away from the one before."""
+def sobol_points(count, dimensions):
+    if dimensions > len(SOBOL_DIRECTIONS) + 1:
+        raise ValueError("Sobol sampling supports at most " + str(len(SOBOL_DIRECTIONS) + 1) + " parameters")
+    directions = [[1 << (sobol_bits - 1 - bit) for bit in range(sobol_bits)]]
+    for dimension in range(1, dimensions):
+        s, a, m = SOBOL_DIRECTIONS[dimension - 1]
+        v = [m[bit] << (sobol_bits - 1 - bit) for bit in range(s)]
+        for bit in range(s, sobol_bits):
+            value = v[bit - s] ^ (v[bit - s] >> s)
+            for k in range(1, s):
+                value ^= ((a >> (s - 1 - k)) & 1) * v[bit - k]
+            v.append(value)
+        directions.append(v)
+    points = []
+    x = [0] * dimensions
+    for index in range(count):
+        if index > 0:
+            # the lowest zero bit of index - 1 picks the direction number.
+            bit = 0
+            while (index - 1) >> bit & 1:
+                bit += 1
+            for dimension in range(dimensions):
+                x[dimension] ^= directions[dimension][bit]
+        points.append([value / float(1 << sobol_bits) for value in x])
+    return points
+
+
+"""Returns count Latin hypercube points in the given number of dimensions, each a list of coordinates in [0, 1)."""
+def latin_hypercube_points(count, dimensions, seed = 0):
+    generator = random.Random(seed)
+    columns = []
+    for dimension in range(dimensions):
+        slices = range(count)
+        generator.shuffle(slices)
+        columns.append([(slices[index] + generator.random()) / count for index in range(count)])
+    return [[column[index] for column in columns] for index in range(count)]
+
+
+"""Returns the value of a parameter (see the module description) at unit coordinate u in [0, 1)."""
+def parameter_value(parameter, u):
+    if "values" in parameter:
+        return parameter["values"][min(int(u * len(parameter["values"])), len(parameter["values"]) - 1)]
+    low, high = parameter["range"]
+    return low + u * (high - low)
+
+
+"""Prints the error and raises a ValueError for a spec that can't be run."""
+def spec_error(message):
+    print "Bad sweep spec: " + message + ". Error Code: 2750916483"
+    raise ValueError(message)
+
+
+"""Returns a copy of a spec with the defaults filled in, after checking that it can be run (see spec_error)."""
+def check_spec(spec):
+    full_spec = {"game_type": "9_BALL", "table_size": "9_FT", "precision": "BALANCED", "sampling": "GRID", "seed": 0,
+                 "fixed": {}, "parameters": [], "stop_when_decided": False}
+    full_spec.update(spec)
+    if full_spec["sampling"] not in SAMPLINGS:
+        spec_error("sampling must be one of " + ", ".join(SAMPLINGS))
+    names = [parameter.get("name") for parameter in full_spec["parameters"]]
+    for name in names + full_spec["fixed"].keys():
+        if name not in SHOT_PARAMETERS and name not in Table_Class.PHYSICS_CONSTANTS:
+            spec_error("unknown parameter " + str(name))
+    if len(set(names)) != len(names) or set(names) & set(full_spec["fixed"].keys()):
+        spec_error("each parameter can only be given once")
+    for name in ["velocity", "angle"]:
+        if name not in names and name not in full_spec["fixed"]:
+            spec_error(name + " must be swept or fixed")
+    for parameter in full_spec["parameters"]:
+        if "values" in parameter:
+            if not parameter["values"]:
+                spec_error(parameter["name"] + " has no values")
+        elif "range" not in parameter or len(parameter["range"]) != 2:
+            spec_error(parameter["name"] + " needs a range [low, high] or a list of values")
+        elif full_spec["sampling"] == "GRID" and parameter.get("count", 0) < 1:
+            spec_error(parameter["name"] + " needs a count for GRID sampling")
+    if full_spec["sampling"] != "GRID" and full_spec.get("samples", 0) < 1:
+        spec_error("samples must be given for " + full_spec["sampling"] + " sampling")
+    return full_spec
+
+
+"""Returns the list of cases (one dictionary per shot to take) that a spec describes, in sample order. Each case holds the
+sample_index, the values of every swept and fixed parameter, and the table setup."""
+def expand_spec(spec):
+    spec = check_spec(spec)
+    parameters = spec["parameters"]
+    if spec["sampling"] == "GRID":
+        axes = []
+        for parameter in parameters:
+            if "values" in parameter:
+                axes.append(parameter["values"])
+            else:
+                axes.append(Heatmap_Iterator.lin_fill(parameter["range"][0], parameter["range"][1], parameter["count"]))
+        samples = [list(values) for values in itertools.product(*axes)]
+    else:
+        if spec["sampling"] == "SOBOL":
+            points = sobol_points(spec["samples"], len(parameters))
+        else:
+            points = latin_hypercube_points(spec["samples"], len(parameters), spec["seed"])
+        samples = [[parameter_value(parameters[counter], point[counter]) for counter in range(len(parameters))]
+                   for point in points]
+    cases = []
+    for sample_index in range(len(samples)):
+        values = {"x_position": None}
+        values.update(spec["fixed"])
+        for counter in range(len(parameters)):
+            values[parameters[counter]["name"]] = samples[sample_index][counter]
+        cases.append({"sample_index": sample_index, "values": values, "game_type": spec["game_type"],
+                      "table_size": spec["table_size"], "precision": spec["precision"],
+                      "stop_when_decided": spec["stop_when_decided"], "prune": spec.get("prune", False)})
+    return cases
+
+
+"""Runs one case (see expand_spec) on a fresh table and returns its result dictionary. A plain module level function so
+that it can be handed to worker processes."""
+def run_case(case):
+    start_time = time.time()
+    values = case["values"]
+    physics = dict([[name, values[name]] for name in values if name in Table_Class.PHYSICS_CONSTANTS])
+    my_table = Table_Class.Pool_Table(case["game_type"], case["table_size"], case["precision"], physics)
+    my_table.keep_history = False # only the outcome is needed, so there is no point holding on to every step.
+    initial_ball_count = my_table.num_balls_remaining()
+    result = dict(values)
+    result["sample_index"] = case["sample_index"]
+    if case.get("prune"):
+        shot_class = Shot_Geometry.Shot_Geometry(my_table).classify_break(values["velocity"], values["angle"],
+                                                                          values["x_position"])
+        if shot_class["predicted_sunk"] != None:
+            first_contact = None
+            if shot_class["first_ball"] != None:
+                first_contact = sorted([shot_class["first_ball"], my_table.cue_ball_index()])
+            result.update({"balls_sunk": len(shot_class["predicted_sunk"]), "sunk_balls": shot_class["predicted_sunk"],
+                           "first_contact": first_contact, "solver_steps": 0, "pruned": shot_class["class"],
+                           "run_time": time.time() - start_time})
+            return result
+    my_table.take_shot(values["velocity"], values["angle"], values["x_position"], case["stop_when_decided"])
+    sunk_balls = []
+    for counter in range(len(my_table.list_all_balls)):
+        if not my_table.list_active_balls.contains(counter):
+            sunk_balls.append(counter)
+    result.update({"balls_sunk": initial_ball_count - my_table.num_balls_remaining(),
+                   "sunk_balls": sunk_balls, "first_contact": my_table.first_contact(),
+                   "solver_steps": my_table.smart_guy.step_counter,
+                   "run_time": time.time() - start_time})
+    return result
+
+
+"""Returns the checkpoint header for a spec: the spec itself (with defaults), and the default physics and cushions it runs
+against (see Sweep_Runner.sweep_header)."""
+def spec_header(spec):
+    spec = check_spec(spec)
+    header = Sweep_Runner.sweep_header([], [], spec["game_type"], spec["table_size"], spec["precision"])
+    del header["sweep_angles"]
+    del header["sweep_velocities"]
+    header["spec"] = spec
+    return json.loads(json.dumps(header))
+
+
+"""This generator runs every case of a spec and yields each result as soon as it finishes, in the same way as
+Sweep_Runner.stream_sweep: in parallel over processes (in the order they finish, so use sample_index), updating progress if
+given, and saving to (and resuming from) a checkpoint file if one is named."""
+def stream_spec(spec, processes = 1, progress = None, checkpoint = None):
+    cases = expand_spec(spec)
+    spec_checkpoint = None
+    if checkpoint != None:
+        spec_checkpoint = Sweep_Runner.Sweep_Checkpoint(checkpoint, spec_header(spec), ["sample_index"])
+        for key in sorted(spec_checkpoint.results.keys()):
+            result = dict(spec_checkpoint.results[key])
+            result["resumed"] = True
+            if progress != None:
+                progress.update(result)
+            yield result
+        cases = [case for case in cases if (case["sample_index"],) not in spec_checkpoint.results]
+
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(run_case, cases)
+    else:
+        results = itertools.imap(run_case, cases)
+    try:
+        for result in results:
+            if spec_checkpoint != None:
+                spec_checkpoint.record(result)
+            if progress != None:
+                progress.update(result)
+            yield result
+    finally:
+        # also runs if the caller stops early, so no worker processes are left behind.
+        if pool != None:
+            pool.terminate()
+        if spec_checkpoint != None:
+            spec_checkpoint.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run a sweep described by a JSON spec (see Sweep_Spec.py).")
+    parser.add_argument("spec", nargs = "?", default = None, help = "spec file. leave out to print an example spec")
+    parser.add_argument("--processes", type = int, default = 1)
+    parser.add_argument("--checkpoint", default = None, help = "file to save results to, and resume from if it exists")
+    arguments = parser.parse_args()
+    if arguments.spec == None:
+        print json.dumps(EXAMPLE_SPEC, indent = 4)
+        return
+    spec = json.load(open(arguments.spec))
+    progress = Sweep_Runner.Sweep_Progress(len(expand_spec(spec)))
+    for result in stream_spec(spec, arguments.processes, progress, arguments.checkpoint):
+        # results on standard output, one JSON line each, so they can be redirected to a file. progress goes to the terminal.
+        print json.dumps(result)
+        sys.stderr.write(progress.report() + "\n")
+
+if __name__ == "__main__":
+    main()
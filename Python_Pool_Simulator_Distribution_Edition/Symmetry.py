@@ -0,0 +1,126 @@
+
+import Table_Class
+import math
+
+"""This module takes advantage of the table's mirror symmetry about x = 0. A standard table and the 9-ball rack are both
+symmetric about the center line, so a shot at angle theta from cue position x is the mirror image of the shot at
+180 - theta from -x: every ball does exactly the mirrored thing, with the balls on either side of the center line swapping
+places. (take_shot works out the cue position from the angle when none is given, and that also mirrors.) So a sweep only
+has to simulate one half, the canonical half with angles of 90 degrees or less, and can reconstruct the other half's
+outcomes by swapping ball identities.
+
+The ball identity map is worked out from the rack itself, so it is only used if the table and the rack really are
+symmetric (a custom table description might not be)."""
+
+
+position_tolerance = .000000001 # meters. positions closer than this are considered mirror images.
+
+
+"""Returns True if the point (-x, y) is within the tolerance of one of the given points."""
+def has_mirror_point(x, y, points):
+    for point in points:
+        if math.fabs(point[0] + x) <= position_tolerance and math.fabs(point[1] - y) <= position_tolerance:
+            return True
+    return False
+
+
+"""Returns the ball identity map for a freshly racked table: a list where entry i is the index of the ball that is the mirror
+image of ball i (the cue ball, and balls on the center line, map to themselves). Returns None if the cushions or the rack are
+not mirror symmetric, in which case no shot can be mirrored."""
+def mirror_map(table):
+    for point in table.geometry.wall_points:
+        if not has_mirror_point(point[0], point[1], table.geometry.wall_points):
+            return None
+    balls = table.list_all_balls
+    ball_map = []
+    for counter in range(len(balls)):
+        ball = balls[counter]
+        if ball.is_cue_ball:
+            # the cue ball is placed when the shot is taken, mirrored along with the shot.
+            ball_map.append(counter)
+            continue
+        match = None
+        for counter2 in range(len(balls)):
+            other = balls[counter2]
+            if other.is_cue_ball or other.ball_mass != ball.ball_mass:
+                continue
+            if has_mirror_point(ball.position_x_record[0], ball.position_y_record[0],
+                                [[other.position_x_record[0], other.position_y_record[0]]]):
+                match = counter2
+                break
+        if match == None:
+            return None
+        ball_map.append(match)
+    return ball_map
+
+
+"""Returns the mirror map for a game type and table size, by racking a table to look at. Returns None if not symmetric."""
+def mirror_map_for(game_type = "9_BALL", table_size = "9_FT"):
+    return mirror_map(Table_Class.Pool_Table(game_type, table_size))
+
+
+"""Returns the canonical version of a shot as [angle, x_position, mirrored]. Shots at more than 90 degrees are mirrored into
+the canonical half (x_position None means the cue position is worked out from the angle, which mirrors by itself)."""
+def canonical_shot(angle, x_position = None):
+    if angle <= 90:
+        return [angle, x_position, False]
+    if x_position != None:
+        x_position = -x_position
+    return [180 - angle, x_position, True]
+
+
+"""Returns the key used to recognize shots that are mirror images of each other: the canonical angle, x position and
+velocity, rounded so that angles from a grid (such as one made with lin_fill) still match after mirroring."""
+def shot_key(velocity, angle, x_position = None):
+    angle, x_position, mirrored = canonical_shot(angle, x_position)
+    if x_position != None:
+        x_position = round(x_position, 9)
+    return (round(velocity, 9), round(angle, 9), x_position)
+
+
+"""Returns the indices of the balls sunk in the mirror image of a shot that sunk the given balls, in increasing order."""
+def mirror_sunk_balls(sunk_balls, ball_map):
+    return sorted([ball_map[index] for index in sunk_balls])
+
+
+"""Groups sweep cells (see Sweep_Runner.run_cell) so that mirror images share one simulation. Returns a list of
+[cell to simulate, member cells], where the cell to simulate is the first member moved into the canonical half. If
+ball_map is None (the table isn't symmetric), every cell is its own group."""
+def group_cells(cells, ball_map):
+    if ball_map == None:
+        return [[cell, [cell]] for cell in cells]
+    groups = []
+    group_of = {}
+    for cell in cells:
+        key = shot_key(cell[3], cell[2])
+        if key in group_of:
+            groups[group_of[key]][1].append(cell)
+        else:
+            group_of[key] = len(groups)
+            canonical_cell = list(cell)
+            canonical_cell[2] = canonical_shot(cell[2])[0]
+            groups.append([canonical_cell, [cell]])
+    return groups
+
+
+"""Turns the result of a group's simulation into a result for every member cell. Members in the other half get the mirrored
+outcome (same number of balls sunk, ball identities swapped in the balls sunk and the first contact), and are marked as mirrored with no solver time of their own."""
+def expand_result(result, members, ball_map):
+    results = []
+    for cell in members:
+        member_result = dict(result)
+        member_result["angle_index"] = cell[0]
+        member_result["velocity_index"] = cell[1]
+        member_result["angle"] = cell[2]
+        member_result["velocity"] = cell[3]
+        member_result["mirrored"] = ball_map != None and canonical_shot(cell[2])[2]
+        if member_result["mirrored"]:
+            member_result["sunk_balls"] = mirror_sunk_balls(result["sunk_balls"], ball_map)
+            if result.get("first_contact") != None:
+                member_result["first_contact"] = mirror_sunk_balls(result["first_contact"], ball_map)
+        if cell is not members[0]:
+            # only the first member pays for the simulation.
+            member_result["solver_steps"] = 0
+            member_result["run_time"] = 0
+        results.append(member_result)
+    return results
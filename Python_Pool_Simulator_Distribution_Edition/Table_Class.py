@@ -1,20 +1,63 @@
 
 # known issues: method take_shot does not handle case where cue ball does not exist or where one of the balls does
-# not have an empty state history. see take_shot for more information
+# not have an empty state history. see take_shot for more information, and shoot / start_new_shot for playing on after
+# the break.
 
 import Pool_Ball_Class
 import math
+import Table_Geometry_Class
 import Impact_Solver_Class
+import Active_Set_Class
+import Trajectory_Class
+import Rack_Generator
+import Symmetry
+import Memory_Report
 import Simple_Visualization_Class
 import My_ODE_Solver
 import Complex_Animation_Class
+import numpy
+
+
+# named solver precision settings. BALANCED is the original (and default) behaviour; see Precision_Study.py for how much
+# time each one saves and how far its outcomes drift from a very tight reference. Last measured on the 9 ft reference shots:
+# FAST runs about 1.5-2x faster than BALANCED, but sinks a different set of balls than the reference on about half the shots
+# (BALANCED: a quarter). PRECISE takes about 1.5x as long and drifts the least. stop_when_decided in take_shot saves about
+# 3-5% of the steps, but no measurable time: on 30 breaks at 8-24 m/s, 84-94 degrees, repeated 7 times, the spread between
+# runs (3.7-6.1 s) was far wider than any difference between stopping early and running to rest. So nothing uses it by
+# default.
+#   max_overlap: how far balls may overlap before the impact solver backs up and refines (Impact_Solver.max_overlap)
+#   steps_per_diameter: the fastest ball moves 1/steps_per_diameter of a diameter per step (ODE_Solver.steps_per_diameter)
+#   max_loops: steps before the timestep is re-evaluated (ODE_Solver.max_loops)
+#   max_depth: the deepest the timestep is refined around an impact (ODE_Solver.max_depth)
+#   multi_rate: every ball steps at its own rate rather than the fastest ball's (ODE_Solver.multi_rate). Optional, off if not
+#       given. Off in every preset, since it changes the outcomes (breaks are chaotic); turn it on for big tables, where it
+#       saves the most.
+PRECISION_PRESETS = {
+    "FAST": {"max_overlap": .00005715, "steps_per_diameter": 2, "max_loops": 150, "max_depth": 20, "multi_rate": False},
+    "BALANCED": {"max_overlap": .000005715, "steps_per_diameter": 4, "max_loops": 150, "max_depth": 20, "multi_rate": False},
+    "PRECISE": {"max_overlap": .0000005715, "steps_per_diameter": 8, "max_loops": 150, "max_depth": 30, "multi_rate": False},
+}
+
+
+# physics constants that can be set per table (see set_physics), and which object they belong to. The defaults are the class
+# constants in Pool_Ball_Class.py ("BALL") and Impact_Solver_Class.py ("IMPACT").
+PHYSICS_CONSTANTS = {"mu_sliding": "BALL", "mu_rolling": "BALL", "sliding_speed": "BALL", "g": "BALL",
+                     "ball_restitution": "IMPACT", "wall_restitution": "IMPACT"}
 
 
 """An object representing a pool table. This object stores a list of balls, as well as wall and pocket locations, and includes the
 base methods for moving balls around on the table and setting up their positions, although the algorithems for calculating new positions
 are implemented by other classes."""
 class Pool_Table():
-    def __init__(self, game_type):
+    def __init__(self, game_type, table_size = "9_FT", precision = "BALANCED", physics = None):
+        # table_size is either one of the names in Table_Geometry_Class.TABLE_DESCRIPTIONS or a custom description dictionary.
+        # precision is either one of the names in PRECISION_PRESETS or a dictionary with the same entries.
+        # physics is a dictionary of PHYSICS_CONSTANTS to use on this table instead of the defaults, or None for the defaults.
+        self.table_size = table_size
+        self.physics = {}
+        # False keeps only each ball's key states (see compact_history), a small fraction of the memory. state_at and
+        # states_at work the same either way.
+        self.keep_history = True
         self.setup_table(game_type)
         # creating all the objects that are needed (helper objects)
         # pens are for visualization of shots
@@ -22,59 +65,68 @@ class Pool_Table():
         self.complex_pen = Complex_Animation_Class.Complex_Animation()
         # see my_ODE_Solver.py to understand why a custom ODE solver was implemented
         self.smart_guy = My_ODE_Solver.ODE_Solver()
-        self.crash = Impact_Solver_Class.Impact_Solver(self.list_all_balls, self.list_walls, self.list_pockets)
+        self.build_impact_solver()
+        self.set_precision(precision)
+        if physics != None:
+            self.set_physics(physics)
+
+    """Creates the impact solver for the balls currently racked. Called again whenever the table is re-racked, since the
+    impact solver (and its broad phase) are built around one set of balls."""
+    def build_impact_solver(self):
+        self.crash = Impact_Solver_Class.Impact_Solver(self.list_active_balls, self.geometry)
+        # on a mirror symmetric table, the impact solver keeps mirror image shots exactly mirrored. see Symmetry.py.
+        self.crash.mirror_map = Symmetry.mirror_map(self)
+
+    """Sets how precisely shots on this table are solved, from one of the PRECISION_PRESETS (or a dictionary with the same
+    entries). The settings are stored on this table's own solvers, so other tables are not affected."""
+    def set_precision(self, precision):
+        if not isinstance(precision, dict):
+            if precision in PRECISION_PRESETS:
+                precision = PRECISION_PRESETS[precision]
+            else:
+                print "Precision preset not implemented yet. BALANCED will be used. Error Code: 3061972548"
+                precision = PRECISION_PRESETS["BALANCED"]
+        self.precision = precision
+        self.crash.max_overlap = precision["max_overlap"]
+        self.smart_guy.steps_per_diameter = precision["steps_per_diameter"]
+        self.smart_guy.max_loops = precision["max_loops"]
+        self.smart_guy.max_depth = precision["max_depth"]
+        self.smart_guy.multi_rate = precision.get("multi_rate", False)
+        self.crash.broad_phase.step_fraction = 1. / precision["steps_per_diameter"]
+        self.crash.broad_phase.reset()
 
-    """This method creates all the walls and pockets for the table. In pool, there are multiple legal table sizes available,
-    but one was picked for the purpose of this simulation. All measurements are in meters. This method is used by all the game
-    setup functions, since they all share the same table dimensions. """
+    """Sets physics constants for this table only, from a dictionary of PHYSICS_CONSTANTS names and values. They are stored on
+    this table's own balls and impact solver, overriding the class constants, so other tables (including ones in the same
+    process) are not affected. Each call replaces the last one: constants not given go back to (or keep) their defaults, even
+    if an earlier call set them. Unknown names are ignored."""
+    def set_physics(self, physics):
+        for name in physics:
+            if name not in PHYSICS_CONSTANTS:
+                print "Physics constant " + str(name) + " can't be set per table, and is ignored. Error Code: 6240087153"
+        # take off the last call's overrides first, so that the class defaults show through again.
+        for name in self.physics:
+            for owner in self.list_all_balls + [self.crash]:
+                if name in owner.__dict__:
+                    delattr(owner, name)
+        self.physics = dict([[name, physics[name]] for name in physics if name in PHYSICS_CONSTANTS])
+        for name in self.physics:
+            if PHYSICS_CONSTANTS[name] == "BALL":
+                for ball in self.list_all_balls:
+                    setattr(ball, name, self.physics[name])
+            else:
+                setattr(self.crash, name, self.physics[name])
+        # friction changes how far every ball can travel.
+        self.crash.broad_phase.reset()
+
+    """This method creates all the walls and pockets for the table. In pool, there are multiple legal table sizes available;
+    the size is picked when the table is created, and the geometry is built from its data description (see
+    Table_Geometry_Class.py). All measurements are in meters. This method is used by all the game setup functions, since
+    they all share the same table dimensions. """
     def create_walls(self):
-        # creating the walls. for a single table, it was easiest to simply manually add each additional
-        # point on the table. For future iterations, a more code-efficient technique should be developed.
         # 0,0 is bottom center. (or top center if table is rotated 180 degrees).
-        pocket_depth = .1
-        self.list_walls = []
-        self.list_walls.append([-.604178,0])
-        self.list_walls.append([.604178,0])
-        x = .604178 + (pocket_depth * math.sqrt(2)) / 2
-        y = - (pocket_depth * math.sqrt(2)) / 2
-        self.list_walls.append([x, y])
-        self.list_walls.append([x + .05715 * math.sqrt(2), y + .05715 * math.sqrt(2)])
-        self.list_walls.append([.685, .0808])
-        self.list_walls.append([.685, 1.313])
-        self.list_walls.append([.685 + pocket_depth, 1.313])
-        self.list_walls.append([.685 + pocket_depth, 1.4272])
-        self.list_walls.append([.685, 1.4272])
-        self.list_walls.append([.685, 2.66])
-        x = .685 + (pocket_depth * math.sqrt(2)) / 2
-        y = 2.66 + (pocket_depth * math.sqrt(2)) / 2
-        self.list_walls.append([x, y])
-        self.list_walls.append([x - .05715 * math.sqrt(2), y + .05715 * math.sqrt(2)])
-        self.list_walls.append([.604178, 2.74])
-        self.list_walls.append([-.604178, 2.74])
-        x = -.604178 - (pocket_depth * math.sqrt(2))/ 2
-        y =  2.74 + (pocket_depth * math.sqrt(2))/2
-        self.list_walls.append([x, y])
-        self.list_walls.append([x - .05715 * math.sqrt(2), y - .05715 * math.sqrt(2)])
-        self.list_walls.append([-.685, 2.66])
-        self.list_walls.append([-.685, 1.4272])
-        self.list_walls.append([-.685 - pocket_depth, 1.4272])
-        self.list_walls.append([-.685 - pocket_depth, 1.313])
-        self.list_walls.append([-.685, 1.313])
-        self.list_walls.append([-.685, .0808])
-        x = -.685 - (pocket_depth * math.sqrt(2))/ 2
-        y = .0808 - (pocket_depth * math.sqrt(2))/ 2
-        self.list_walls.append([x, y])
-        self.list_walls.append([x + .05715 * math.sqrt(2), y - .05715 * math.sqrt(2)])
-        
-        # creating the pockets
-        pocket_radius = .47
-        self.list_pockets = []
-        self.list_pockets.append([-.685 - (pocket_radius * math.sqrt(2)) / 2 , 0 - (pocket_radius * math.sqrt(2)) / 2])
-        self.list_pockets.append([.685 + (pocket_radius * math.sqrt(2)) / 2 , 0 - (pocket_radius * math.sqrt(2)) / 2])
-        self.list_pockets.append([.685 + (pocket_radius * math.sqrt(2)) / 2 , 2.74 + (pocket_radius * math.sqrt(2)) / 2])
-        self.list_pockets.append([-.685 - (pocket_radius * math.sqrt(2)) / 2 , 2.74 + (pocket_radius * math.sqrt(2)) / 2])
-        self.list_pockets.append([-.685 - pocket_radius - .05, 2.74/2])
-        self.list_pockets.append([.685 + pocket_radius + .05, 2.74/2])
+        self.geometry = Table_Geometry_Class.Table_Geometry(self.table_size)
+        self.list_walls = self.geometry.wall_points
+        self.list_pockets = self.geometry.pocket_points
 
     """For very basic unit tests, this function sets up a table with only one ball on it. Useful for testing the laws of physics,
     the ODE solver, and the interaction between balls and pockets. The simulations are simple enough that they can be visualized
@@ -82,21 +134,18 @@ class Pool_Table():
     def one_ball_setup(self):
         self.create_walls()
         self.list_all_balls = []
-        self.list_active_balls = []
         position_x = 0 # positions are unimportant, as long as the ball is on the table. positions will be re-assigned when a
         # shot is taken anyway, since this is the cue ball.
         position_y = .2
         ball = Pool_Ball_Class.Pool_Balls(position_x, position_y, "CUE_BALL")
         self.list_all_balls.append(ball)
-        for ball in self.list_all_balls:
-            self.list_active_balls.append(ball)
+        self.list_active_balls = Active_Set_Class.Active_Set(self.list_all_balls)
             
     """For slightly more complex unit tests than the 'one_ball_setup,' this function sets up a table with three balls on it
     (where one is a cue ball). This is useful for testing break mechanics and the interactions between balls. """        
     def three_ball_setup(self):
         self.create_walls()
         self.list_all_balls = []
-        self.list_active_balls = []
         
         position_x = 0 # dummy positions so that the balls are on the table and not touching. see below for exact ball placement.
         position_y = .2
@@ -114,15 +163,13 @@ class Pool_Table():
         self.list_all_balls[2].position_x_record[0] = -.033
         self.list_all_balls[2].position_y_record[0] = 2
                 
-        for ball in self.list_all_balls:
-            self.list_active_balls.append(ball)
+        self.list_active_balls = Active_Set_Class.Active_Set(self.list_all_balls)
         
     """The main game setup for the purpose of this project, this function sets up the table with 10 balls (9 game balls and
     a cue ball), in the formation most commonly recognized by the name '9-ball'. """   
     def nine_ball_setup(self):
         self.create_walls()
         self.list_all_balls = []
-        self.list_active_balls = []
                 
         position_x = 0 # dummy positions so that the balls are on the table and not touching. see below for exact ball placement.
         position_y = .2
@@ -131,39 +178,52 @@ class Pool_Table():
             ball = Pool_Ball_Class.Pool_Balls(position_x, position_y, "NOT_CUE_BALL")
             self.list_all_balls.append(ball)
 
-        # jenky way of setting initial positions. These are the values for a tightly racked set of balls on the size table selected
-        # for this simulation. To make this code more versatile, I would need to calculate appropriate positions based on the existing
-        # wall locations. All measurements in meters. 0,0 is bottom center. (or top center if table is rotated 180 degrees).
+        # setting initial positions for a tightly racked set of balls, with the front ball on the foot spot of the table. 
+        # All measurements in meters. 0,0 is bottom center. (or top center if table is rotated 180 degrees).
+        foot_spot = self.geometry.foot_spot
         self.list_all_balls[0].position_x_record[0] = 0
-        self.list_all_balls[0].position_y_record[0] = 1.98
+        self.list_all_balls[0].position_y_record[0] = foot_spot
         self.list_all_balls[1].position_x_record[0] = -.028829
-        self.list_all_balls[1].position_y_record[0] = 2.029933
+        self.list_all_balls[1].position_y_record[0] = foot_spot + .049933
         self.list_all_balls[2].position_x_record[0] = .028829
-        self.list_all_balls[2].position_y_record[0] = 2.029933
+        self.list_all_balls[2].position_y_record[0] = foot_spot + .049933
         self.list_all_balls[3].position_x_record[0] = -.057658
-        self.list_all_balls[3].position_y_record[0] = 2.079866
+        self.list_all_balls[3].position_y_record[0] = foot_spot + .099866
         self.list_all_balls[4].position_x_record[0] = 0
-        self.list_all_balls[4].position_y_record[0] = 2.079866
+        self.list_all_balls[4].position_y_record[0] = foot_spot + .099866
         self.list_all_balls[5].position_x_record[0] = .057658
-        self.list_all_balls[5].position_y_record[0] = 2.079866
+        self.list_all_balls[5].position_y_record[0] = foot_spot + .099866
         self.list_all_balls[6].position_x_record[0] = -.028829
-        self.list_all_balls[6].position_y_record[0] = 2.129799
+        self.list_all_balls[6].position_y_record[0] = foot_spot + .149799
         self.list_all_balls[7].position_x_record[0] = .028829
-        self.list_all_balls[7].position_y_record[0] = 2.129799
+        self.list_all_balls[7].position_y_record[0] = foot_spot + .149799
         self.list_all_balls[8].position_x_record[0] = 0
-        self.list_all_balls[8].position_y_record[0] = 2.179732
+        self.list_all_balls[8].position_y_record[0] = foot_spot + .199732
         
         # adding cue ball
-        cue_ball = Pool_Ball_Class.Pool_Balls(0,.635, "CUE_BALL")
+        cue_ball = Pool_Ball_Class.Pool_Balls(0, self.geometry.head_string, "CUE_BALL")
         self.list_all_balls.append(cue_ball)
         
-        for ball in self.list_all_balls:
-            self.list_active_balls.append(ball)
+        self.list_active_balls = Active_Set_Class.Active_Set(self.list_all_balls)
+            
+    """This function sets up the table with object balls at the given positions (see Rack_Generator.py) and a cue ball. Used
+    for every generated rack: 8-ball, 10-ball, triangles and diamonds of any size, and random scatters."""
+    def generated_setup(self, positions):
+        self.create_walls()
+        self.list_all_balls = []
+        for position in positions:
+            ball = Pool_Ball_Class.Pool_Balls(position[0], position[1], "NOT_CUE_BALL")
+            self.list_all_balls.append(ball)
+        cue_ball = Pool_Ball_Class.Pool_Balls(0, self.geometry.head_string, "CUE_BALL")
+        self.list_all_balls.append(cue_ball)
+        self.list_active_balls = Active_Set_Class.Active_Set(self.list_all_balls)
             
     """This method re-racks all the balls based on the given game type. Useful for the end of a game, or, more specifically
     for the purpose of this break simulator, it allows you to reset the game after a break without creating a new table object.
-    Future iterations will include the option for 8-ball, snookers, and potentially a 'custom' game setup."""
+    Besides the hand-placed setups, any game type Rack_Generator knows about can be used ("8_BALL", "10_BALL",
+    "TRIANGLE_<rows>", "DIAMOND_<widest row>", "SCATTER_<count>"). Future iterations may include snookers."""
     def setup_table(self, game_type):
+        self.trajectory_cache = None
         if game_type == "UNIT_TEST_1_BALL":
             self.one_ball_setup()
         elif game_type == "UNIT_TEST_3_BALLS":
@@ -171,16 +231,49 @@ class Pool_Table():
         elif game_type == "9_BALL":
             self.nine_ball_setup()
         else:
-            print "Game style not implemented yet. 9 ball will be used. Error Code: 3409283714"
-            self.nine_ball_setup()
+            # the geometry is needed to place a generated rack, so build it first.
+            self.create_walls()
+            positions = Rack_Generator.positions_for(game_type, self.geometry, Pool_Ball_Class.Pool_Balls.ball_diameter)
+            if positions != None:
+                self.generated_setup(positions)
+            else:
+                print "Game style not implemented yet. 9 ball will be used. Error Code: 3409283714"
+                self.nine_ball_setup()
+        # where every ball was racked, for rerack.
+        self.rack_positions = [[ball.position_x_record[0], ball.position_y_record[0]] for ball in self.list_all_balls]
+        if hasattr(self, "crash"):
+            # re-racking a table that has already been used. the impact solver has to be rebuilt around the new balls.
+            self.build_impact_solver()
+            self.set_precision(self.precision)
+            self.set_physics(self.physics)
+
+    """Puts every ball back where setup_table racked it, at rest and with an empty history, without building anything again,
+    so one table can take any number of breaks (and play any number of games) one after the other. The next shot is
+    solved exactly as it would be on a new table."""
+    def rerack(self):
+        for counter in range(len(self.list_all_balls)):
+            ball = self.list_all_balls[counter]
+            ball.clear_state()
+            ball.add_state_point(0, self.rack_positions[counter][0], self.rack_positions[counter][1], 0, 0)
+        self.list_active_balls.reset()
+        self.crash.build_contact_tables() # as a freshly racked table has them.
+        self.trajectory_cache = None
         
     """This method takes a position, velocity, and angle for the cue ball, and solves the differential equations to determine the
     final resting points of all the balls. Because the intention of this software is to model breaks, the cue ball is re-placed on the
     table before each shot, and as such, this method does not handle the error where the cue ball does not exist. further modifications
     are planned to enable handling a scratch, but for now this method only takes the break shot. It also fails to handle the case where
     balls have a non-empty state history (a trivial fix- empty the state history before computations!), but again not an issue because
-    the table is always re-racked before a break, so none of the balls have previous shot histories."""
-    def take_shot(self,velocity, angle, x_position = None):
+    the table is always re-racked before a break, so none of the balls have previous shot histories. To play on after the
+    break, see start_new_shot, place_ball and shoot (Game_Rollout.py plays whole games).
+    If stop_when_decided is True, the simulation stops as soon as no further ball can be sunk and no further collision can
+    happen (see outcome_decided, which is only checked once every ball has slowed to rolling). The number of balls remaining
+    is then final, but the balls may not have come to rest yet, so this mode is meant for sweeps that only need the outcome.
+    Returns "ALL_BALLS_STATIONARY" or "OUTCOME_DECIDED".
+    If round_callback is given, it is called with this table after every round of the solver (every impact), once sunk balls
+    have been removed. Between rounds, every ball's history before the current state may be read, or even trimmed away, since
+    the solvers only ever look at each ball's last state (see Live_Animation.py)."""
+    def take_shot(self,velocity, angle, x_position = None, stop_when_decided = False, round_callback = None):
         # algorithem overview:
         # check for errors (no cue balls, balls that still have shot records)
         # moves cue ball based off of input.
@@ -197,35 +290,263 @@ class Pool_Table():
         if not cue_counter == 1:
             print "Error! There is NOT exactly one cue ball. Simulation will not take a shot."
         else:
-            if x_position == None:
-                # User chose not to set position of cue ball. Calculate appropriate position under the assumption that the user wants
-                # to hit the middle of the first ball.
-                cue_ball.position_x_record[0] = -(1.98 - .635) / math.tan(math.radians(angle))
-            else:    
-                cue_ball.position_x_record[0] = x_position
-            
-            # current modeling decision- y location is fixed at the edge of the kitchen.
-            cue_ball.position_y_record[0] = .635
-            cue_ball.velocity_x_record[0] = math.cos(math.radians(angle)) * velocity
-            cue_ball.velocity_y_record[0] = math.sin(math.radians(angle)) * velocity
+            x, y, velocity_x, velocity_y = self.break_state(velocity, angle, x_position)
+            cue_ball.position_x_record[0] = x
+            cue_ball.position_y_record[0] = y
+            cue_ball.velocity_x_record[0] = velocity_x
+            cue_ball.velocity_y_record[0] = velocity_y
             
-            done = False
-            while not done:
-                done_yet = self.smart_guy.solve_till_impact(self.list_active_balls, self.list_walls, self.crash)
-                if done_yet == "ALL_BALLS_STATIONARY":
-                    done = True
-                # in case the last round sunk any balls.
-                self.remove_ball()
-    
+            return self.solve_shot(stop_when_decided, round_callback)
 
-    """In the event that a ball has entered a pocket, the x and y positions will be set to None. This method removes
-     them from the list of active balls so that future computations won't need to check them for impact. Note that they
-     are left in the list_all_balls so that they will still be drawn on plots or animations."""
-    def remove_ball(self):
+    """Returns the cue ball's starting state [x, y, velocity x, velocity y] for a break taken with take_shot."""
+    def break_state(self, velocity, angle, x_position = None):
+        # shots past 90 degrees are worked out from their mirror image instead, so that the two start out as exact mirror
+        # images. cos(95) and -cos(85) differ in the last bit, and a break is chaotic enough to amplify that (see
+        # Symmetry.py, which relies on mirrored shots doing exactly the mirrored thing).
+        if angle > 90:
+            mirror_sign = -1
+            working_angle = math.radians(180 - angle)
+        else:
+            mirror_sign = 1
+            working_angle = math.radians(angle)
+        if x_position == None:
+            # User chose not to set position of cue ball. Calculate appropriate position under the assumption that the user wants
+            # to hit the middle of the first ball.
+            x_position = -mirror_sign * (self.geometry.foot_spot - self.geometry.head_string) / math.tan(working_angle)
+        # current modeling decision- y location is fixed at the edge of the kitchen.
+        return [x_position, self.geometry.head_string, mirror_sign * math.cos(working_angle) * velocity,
+                math.sin(working_angle) * velocity]
+
+    """Takes a shot from wherever the cue ball is now, rather than re-placing it the way take_shot does for a break: the cue
+    ball is sent off at the given velocity (meters per second) and angle (degrees, counter-clockwise from the +x axis, so 90
+    is straight up the table). Call start_new_shot first if the balls still have the history of an earlier shot. Returns the
+    same as take_shot, or None if the cue ball isn't on the table (see place_ball for ball in hand)."""
+    def shoot(self, velocity, angle, stop_when_decided = False, round_callback = None):
+        cue_index = self.cue_ball_index()
+        if cue_index == None or not self.list_active_balls.contains(cue_index):
+            print "Error! The cue ball is not on the table. Simulation will not take a shot. Error Code: 5172046398"
+            return None
+        cue_ball = self.list_all_balls[cue_index]
+        end = len(cue_ball.time_record) - 1
+        cue_ball.velocity_x_record[end] = math.cos(math.radians(angle)) * velocity
+        cue_ball.velocity_y_record[end] = math.sin(math.radians(angle)) * velocity
+        # the balls are wherever the last shot (or place_ball) left them, possibly resting against each other.
+        self.crash.reset_contacts()
+        return self.solve_shot(stop_when_decided, round_callback)
+
+    """Solves the shot that has just been set up (the cue ball's velocity set directly), round by round, until every ball is
+    at rest (or the outcome is decided, see take_shot)."""
+    def solve_shot(self, stop_when_decided = False, round_callback = None):
+        # the cue ball's velocity was just set directly, so every swept bound needs working out again.
+        self.crash.broad_phase.reset()
+        self.crash.event_log.clear()
+        self.smart_guy.step_counter = 0
+        self.history_kept = [1] * len(self.list_all_balls) # leading states of each ball kept for good, see compact_history.
+        done = False
+        while not done:
+            done_yet = self.smart_guy.solve_till_impact(self.list_active_balls, self.list_walls, self.crash)
+            if done_yet == "ALL_BALLS_STATIONARY":
+                done = True
+            # in case the last round sunk any balls.
+            self.remove_ball()
+            self.trajectory_cache = None
+            if not self.keep_history:
+                self.compact_history()
+            if round_callback != None:
+                round_callback(self)
+            # outcome_decided is only worth its time once every ball has slowed to rolling, see all_rolling.
+            if not done and stop_when_decided and self.all_rolling() and self.outcome_decided():
+                return "OUTCOME_DECIDED"
+        return "ALL_BALLS_STATIONARY"
+
+    """Gets the table ready for the next shot of a game, carrying on from where the last one left off: every ball's history
+    is cut down to its last state, which becomes time 0, so the solvers start from an empty history again, and nothing of
+    the last shot is kept. Sunk balls stay sunk."""
+    def start_new_shot(self):
+        for ball in self.list_all_balls:
+            end = len(ball.time_record) - 1
+            state = [ball.position_x_record[end], ball.position_y_record[end], ball.velocity_x_record[end],
+                     ball.velocity_y_record[end]]
+            ball.clear_state()
+            ball.add_state_point(0, state[0], state[1], state[2], state[3])
+        self.trajectory_cache = None
+
+    """Returns the index of the cue ball in list_all_balls, or None if there isn't one."""
+    def cue_ball_index(self):
+        for counter in range(len(self.list_all_balls)):
+            if self.list_all_balls[counter].is_cue_ball:
+                return counter
+        return None
+
+    """Puts the ball with the given index at x, y, at rest, and back in play if it had been sunk: ball in hand for the cue
+    ball, or spotting an object ball. Returns False, leaving the ball where it was, if a ball there would be off the table
+    or overlapping another ball. Meant to be called between shots (after start_new_shot)."""
+    def place_ball(self, index, x, y):
+        ball = self.list_all_balls[index]
+        if not self.geometry.fits(x, y, ball.ball_diameter / 2):
+            return False
+        for other_index in self.list_active_balls.indices:
+            if other_index == index:
+                continue
+            other = self.list_all_balls[other_index]
+            end = len(other.time_record) - 1
+            if (math.sqrt((other.position_x_record[end] - x)**2 + (other.position_y_record[end] - y)**2) <
+                    ball.ball_diameter / 2 + other.ball_diameter / 2):
+                return False
+        end = len(ball.time_record) - 1
+        ball.position_x_record[end] = x
+        ball.position_y_record[end] = y
+        ball.velocity_x_record[end] = 0
+        ball.velocity_y_record[end] = 0
+        self.list_active_balls.add(index)
+        self.trajectory_cache = None
+        return True
+
+    """Throws away every state point that isn't a key state (see Trajectory_Class.keyframe_indices) or the state just before
+    one (which is what marks the key states out), apart from each ball's last one, which the solvers carry on from. Called
+    after every round when keep_history is False. Positions at any time can still be worked out exactly with state_at, and
+    the simple plot still draws every path, since a ball only travels in a straight line between key states. Only the
+    states added since the last call are looked at."""
+    def compact_history(self):
+        for counter in range(len(self.list_all_balls)):
+            ball = self.list_all_balls[counter]
+            kept = self.history_kept[counter]
+            final = set(range(kept))
+            for index in Trajectory_Class.keyframe_indices(ball, kept)[1:]:
+                final.update([index - 1, index])
+            keep = sorted(final)
+            last = len(ball.time_record) - 1
+            if keep[len(keep) - 1] != last:
+                keep.append(last)
+            for record in [ball.position_x_record, ball.position_y_record, ball.velocity_x_record, ball.velocity_y_record,
+                           ball.time_record]:
+                record[:] = [record[index] for index in keep]
+            self.history_kept[counter] = len(final)
+
+    """Returns a Trajectory (see Trajectory_Class.py) for every ball in list_all_balls, describing the last shot (or the
+    shot so far, from a round_callback)."""
+    def trajectories(self):
+        if self.trajectory_cache == None:
+            self.trajectory_cache = [Trajectory_Class.Trajectory(ball) for ball in self.list_all_balls]
+        return self.trajectory_cache
+
+    """Returns the state of every ball in list_all_balls at the given time of the last shot: [x, y, velocity x, velocity y],
+    or None for a ball that has been sunk by then."""
+    def state_at(self, time):
+        return [trajectory.state_at(time) for trajectory in self.trajectories()]
+
+    """Returns the states of every ball at each of the given times (an array, in any order) of the last shot, as a dictionary
+    of numpy arrays x, y, velocity_x and velocity_y, each with a row for every ball in list_all_balls and a column for every
+    time. Positions are nan where a ball has been sunk. Each ball costs a binary search over its key states per time, so
+    this is quick enough for scrubbing through a shot or rendering it at any frame rate."""
+    def states_at(self, times):
+        states = [trajectory.states_at(times) for trajectory in self.trajectories()]
+        return {"x": numpy.array([state[0] for state in states]), "y": numpy.array([state[1] for state in states]),
+                "velocity_x": numpy.array([state[2] for state in states]),
+                "velocity_y": numpy.array([state[3] for state in states])}
+
+    """Returns [ball, ball] (lower index first) for the cue ball and the first ball it hit in the last shot, or None if it
+    didn't hit one. See Event_Log_Class.py for everything else the last shot did."""
+    def first_contact(self):
+        cue_index = self.cue_ball_index()
+        if cue_index == None:
+            return None
+        return self.crash.event_log.first_contact(cue_index)
+
+    """Returns True if every ball still on the table is moving no faster than sliding_speed. Until then a moving ball can
+    still reach a pocket or another ball from almost anywhere, so outcome_decided practically never succeeds, and checking
+    it after every round of a break cost more than stopping early saved."""
+    def all_rolling(self):
+        for ball in self.list_active_balls:
+            end = len(ball.position_x_record) - 1
+            if ball.position_x_record[end] != None and ball.current_speed() > ball.sliding_speed:
+                return False
+        return True
+
+    """Returns True if the number of balls on the table can no longer change. Every moving ball can only reach the places
+    described by reachable_region, so if no moving ball can reach a pocket mouth, and no two balls can get close enough to
+    touch (each moving as far as it possibly can towards the other), nothing that happens from now on will sink another ball."""
+    def outcome_decided(self):
+        regions = []
         for ball in self.list_active_balls:
             end = len(ball.position_x_record) - 1
-            if ball.position_x_record[end] == None or ball.position_y_record[end] == None:
-                self.list_active_balls.remove(ball)           
+            if ball.position_x_record[end] == None:
+                continue
+            region = self.reachable_region(ball)
+            start, finish, disk_radius = region
+            # can this ball reach a pocket? checked as each region is found, since it is usually what fails, and finding
+            # the regions is most of the cost.
+            if not (start == finish and disk_radius == 0):
+                for pocket in self.geometry.pockets:
+                    jaw1, jaw2 = pocket["jaws"]
+                    if Table_Geometry_Class.segment_distance(start, finish, jaw1, jaw2) == 0:
+                        return False
+                    if Table_Geometry_Class.point_segment_distance(finish[0], finish[1], jaw1[0], jaw1[1], jaw2[0], jaw2[1]) <= disk_radius:
+                        return False
+            regions.append([region, ball])
+        for counter in range(len(regions)):
+            region, ball = regions[counter]
+            start, finish, disk_radius = region
+            if start == finish and disk_radius == 0:
+                continue # not moving
+            # can this ball reach any other ball? (moving pairs are checked once, stationary balls always)
+            for counter2 in range(len(regions)):
+                region2, ball2 = regions[counter2]
+                start2, finish2, disk_radius2 = region2
+                moving2 = not (start2 == finish2 and disk_radius2 == 0)
+                if counter2 == counter or (moving2 and counter2 < counter):
+                    continue
+                # with a margin for the overshoot of the solver's steps
+                touching = ball.ball_diameter / 2 + ball2.ball_diameter / 2 + ball.ball_diameter / self.smart_guy.steps_per_diameter
+                # each region is a path with a disk on the end, so check every combination.
+                distances = [Table_Geometry_Class.segment_distance(start, finish, start2, finish2),
+                             Table_Geometry_Class.point_segment_distance(finish[0], finish[1], start2[0], start2[1], finish2[0], finish2[1]) - disk_radius,
+                             Table_Geometry_Class.point_segment_distance(finish2[0], finish2[1], start[0], start[1], finish[0], finish[1]) - disk_radius2,
+                             math.sqrt((finish[0] - finish2[0])**2 + (finish[1] - finish2[1])**2) - disk_radius - disk_radius2]
+                if min(distances) <= touching:
+                    return False
+        return True
+
+    """Returns the region of the table a ball can still reach, as [path start, path end, disk radius], where the disk is
+    centered on the end of the path. Without spin, a ball travels in a straight line until it stops or hits a cushion, so
+    the region is that straight path. If it reaches a cushion, it bounces and loses speed (wall restitution), and everything
+    it can do after the bounce is covered by a disk around the point of impact. If the path passes close to a pocket jaw,
+    where the bounce direction is hard to predict, the region is instead a disk of the ball's full max_travel_distance."""
+    def reachable_region(self, ball):
+        end = len(ball.position_x_record) - 1
+        x = ball.position_x_record[end]
+        y = ball.position_y_record[end]
+        speed = ball.current_speed()
+        if speed == 0:
+            return [[x, y], [x, y], 0]
+        step_fraction = 1. / self.smart_guy.steps_per_diameter
+        reach = ball.max_travel_distance(step_fraction = step_fraction)
+        direction_x = ball.velocity_x_record[end] / speed
+        direction_y = ball.velocity_y_record[end] / speed
+        hit = self.geometry.first_cushion_hit(x, y, direction_x, direction_y, reach, ball.ball_diameter / 2)
+        if hit == None:
+            finish = [x + direction_x * reach, y + direction_y * reach]
+            disk_radius = 0
+        else:
+            finish = [x + direction_x * hit[0], y + direction_y * hit[0]]
+            disk_radius = ball.max_travel_distance(ball.speed_after_travel(hit[0]) * self.crash.wall_restitution, step_fraction)
+        for corner in self.geometry.corner_points:
+            if Table_Geometry_Class.point_segment_distance(corner[0], corner[1], x, y, finish[0], finish[1]) <= ball.ball_diameter:
+                return [[x, y], [x, y], reach]
+        return [[x, y], finish, disk_radius]
+
+    """Takes a shot exactly as take_shot does, but also measures the memory it takes. Returns a report dictionary with the
+    peak and retained bytes, a breakdown into trajectory history, impact tables and visualization, and the bytes per
+    simulated second (see Memory_Report.py). Opt in only, since walking every recorded state point takes a while."""
+    def memory_report(self, velocity, angle, x_position = None, stop_when_decided = False):
+        return Memory_Report.measure_shot(self, velocity, angle, x_position, stop_when_decided)
+
+    """In the event that a ball has entered a pocket, the x and y positions will be set to None. This method removes
+     them from the active set so that future computations won't need to check them for impact (the impact solver shares
+     the same active set). Note that they are left in the list_all_balls so that they will still be drawn on plots or
+     animations."""
+    def remove_ball(self):
+        self.list_active_balls.remove_sunk()
         
     """Returns the numboer of non-cue balls remaining on the table. Useful for generating a figure of merit after
     a break."""
@@ -238,15 +559,16 @@ class Pool_Table():
     plot where each calculated timestep for each ball is plotted as a point, or complex, where a movie-like animation
     is used to demonstrate the trajectories of balls in real time. the first option is excellent for debugging (you can
     identify which points were actually calculated by the solver), and for small numbers of balls, but becomes difficult
-    to interpret with larger numbers of balls, such as a full break."""
-    def draw(self, drawing_style):
+    to interpret with larger numbers of balls, such as a full break. The simple plot now draws each path as a line, so set
+    show_refinement to also see every calculated point."""
+    def draw(self, drawing_style, show_refinement = False):
         if drawing_style == "SIMPLE":
             print "Drawing of simple animation requested."
-            self.simple_pen.draw(self.list_all_balls, self.list_walls)
+            self.simple_pen.draw(self.list_all_balls, self.list_walls, show_refinement)
         elif drawing_style == "ADVANCED":
             print "Drawing of complex animation requested."
             self.complex_pen.draw(self.list_all_balls, self.list_walls, self.list_pockets, 1)
         else:
             print "Other Draw options not implemented yet. Simple method being used. error 135424512."
-            self.simple_pen.draw(self.list_all_balls, self.list_walls)
+            self.simple_pen.draw(self.list_all_balls, self.list_walls, show_refinement)
 
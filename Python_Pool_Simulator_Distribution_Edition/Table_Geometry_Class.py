@@ -0,0 +1,244 @@
+
+import math
+
+# Data descriptions of the standard table sizes. All measurements are in meters, and follow the convention used by the
+# original (9 ft) table in this project: length and width are the nominal table dimensions, the pocket mouths are measured
+# jaw to jaw, and the foot spot / head string are measured from the bottom rail. 0,0 is bottom center.
+TABLE_DESCRIPTIONS = {
+    "9_FT": {"length": 2.74, "width": 1.37, "corner_mouth": .1143, "side_mouth": .1142, "pocket_depth": .1,
+             "foot_spot": 1.98, "head_string": .635},
+    "8_FT": {"length": 2.44, "width": 1.22, "corner_mouth": .1143, "side_mouth": .1142, "pocket_depth": .1,
+             "foot_spot": 1.763, "head_string": .5655},
+    "7_FT": {"length": 2.13, "width": 1.07, "corner_mouth": .1143, "side_mouth": .1142, "pocket_depth": .1,
+             "foot_spot": 1.539, "head_string": .4936},
+    }
+
+"""Returns the distance from the point x,y to the line segment from x1,y1 to x2,y2."""
+def point_segment_distance(x, y, x1, y1, x2, y2):
+    px = x2 - x1
+    py = y2 - y1
+    length_sqr = px*px + py*py
+    if length_sqr == 0:
+        u = 0
+    else:
+        u = ((x - x1) * px + (y - y1) * py) / float(length_sqr)
+    if u > 1:
+        u = 1
+    elif u < 0:
+        u = 0
+    dx = x1 + u * px - x
+    dy = y1 + u * py - y
+    return math.sqrt(dx*dx + dy*dy)
+
+"""Returns the shortest distance between the line segment a1-a2 and the line segment b1-b2 (points given as [x,y])."""
+def segment_distance(a1, a2, b1, b2):
+    # if the segments cross, the distance is zero. otherwise the closest points include an end point of one of them.
+    def side(p, q, r):
+        return (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+    if side(a1, a2, b1) * side(a1, a2, b2) < 0 and side(b1, b2, a1) * side(b1, b2, a2) < 0:
+        return 0
+    return min(point_segment_distance(a1[0], a1[1], b1[0], b1[1], b2[0], b2[1]),
+               point_segment_distance(a2[0], a2[1], b1[0], b1[1], b2[0], b2[1]),
+               point_segment_distance(b1[0], b1[1], a1[0], a1[1], a2[0], a2[1]),
+               point_segment_distance(b2[0], b2[1], a1[0], a1[1], a2[0], a2[1]))
+
+"""This class holds the geometry of a pool table: the cushion polygon, the pockets, and the spots used for racking and
+for placing the cue ball. The geometry is built from a data description rather than hard-coded, either one of the standard
+sizes in TABLE_DESCRIPTIONS, or a custom dictionary. A custom dictionary may either give standard dimensions (same keys as
+TABLE_DESCRIPTIONS), or an arbitrary polygon with the keys 'walls' (list of [x,y] points, counter-clockwise), 'pockets'
+(list of dictionaries with 'jaws', the two [x,y] points of the pocket mouth, listed in the same order as the walls),
+'foot_spot' and 'head_string'. Each cushion segment gets its direction and unit normal precomputed here, so that the impact
+solver never has to work them out during a shot. Pockets get a capture region, indexed by a coarse grid over the table, so
+that only balls near a pocket mouth are ever tested against it."""
+class Table_Geometry():
+
+    region_cell_size = .1 # meters. size of the grid cells used to look up which pockets are near a ball.
+    capture_margin = .15 # meters. how far from the pocket mouth a ball may be and still need to be tested. must cover
+    # the pocket depth plus a ball radius, so that any ball that can cross the mouth is inside the region.
+
+    def __init__(self, description = "9_FT"):
+        if not isinstance(description, dict):
+            if description in TABLE_DESCRIPTIONS:
+                description = TABLE_DESCRIPTIONS[description]
+            else:
+                print "Table size not implemented yet. 9 ft table will be used. Error Code: 5829104736"
+                description = TABLE_DESCRIPTIONS["9_FT"]
+        if "walls" in description:
+            self.wall_points = [[point[0], point[1]] for point in description["walls"]]
+            self.pockets = description["pockets"]
+        else:
+            self.build_standard_table(description)
+        self.foot_spot = description["foot_spot"]
+        self.head_string = description["head_string"]
+        self.precompute_segments()
+        self.precompute_pockets()
+        self.precompute_corners()
+
+    """Builds the cushion polygon and pockets for a standard rectangular table with four corner pockets and two side
+    pockets. Every pocket is a notch in the cushion polygon: two jaw points on the rails, pushed outwards by the
+    pocket depth."""
+    def build_standard_table(self, description):
+        half_width = description["width"] / 2.
+        length = description["length"]
+        depth = description["pocket_depth"]
+        corner = description["corner_mouth"] / math.sqrt(2) # distance from the table corner to each corner jaw
+        side = description["side_mouth"] / 2.
+        diagonal = math.sqrt(2) / 2
+
+        self.wall_points = []
+        self.pockets = []
+        # walking the table counter-clockwise, starting with the bottom rail. Each pocket is listed as the jaw on the
+        # rail we are leaving, the jaw on the rail we are arriving at, and the outward direction of the pocket.
+        pocket_list = [
+            [[half_width - corner, 0], [half_width, corner], [diagonal, -diagonal]],
+            [[half_width, length / 2. - side], [half_width, length / 2. + side], [1, 0]],
+            [[half_width, length - corner], [half_width - corner, length], [diagonal, diagonal]],
+            [[-half_width + corner, length], [-half_width, length - corner], [-diagonal, diagonal]],
+            [[-half_width, length / 2. + side], [-half_width, length / 2. - side], [-1, 0]],
+            [[-half_width, corner], [-half_width + corner, 0], [-diagonal, -diagonal]],
+            ]
+        for jaw1, jaw2, outward in pocket_list:
+            self.wall_points.append([jaw1[0], jaw1[1]])
+            self.wall_points.append([jaw1[0] + outward[0] * depth, jaw1[1] + outward[1] * depth])
+            self.wall_points.append([jaw2[0] + outward[0] * depth, jaw2[1] + outward[1] * depth])
+            self.wall_points.append([jaw2[0], jaw2[1]])
+            self.pockets.append({"jaws": [jaw1, jaw2]})
+        # the polygon starts at the jaw that closes the last pocket, so rotate it to start on the bottom rail.
+        self.wall_points = self.wall_points[-1:] + self.wall_points[:-1]
+
+    """Precomputes everything the impact solver needs to know about each cushion segment. Segment i runs from wall
+    point i to wall point i+1 (wrapping back to the first point). For each segment we store the start point, the direction
+    vector, 1/length^2 (for projecting a ball onto the segment), and the inward facing unit normal. """
+    def precompute_segments(self):
+        self.segments = []
+        for counter in range(len(self.wall_points)):
+            start = self.wall_points[counter]
+            end = self.wall_points[(counter + 1) % len(self.wall_points)]
+            px = end[0] - start[0]
+            py = end[1] - start[1]
+            length = math.sqrt(px*px + py*py)
+            # the polygon is counter-clockwise, so the inward normal is the direction rotated by +90 degrees.
+            self.segments.append([start[0], start[1], px, py, 1. / (length * length), -py / length, px / length])
+
+    """Precomputes the pocket mouths and the capture regions. A ball is sunk once its center crosses the mouth (the line
+    between the two jaws), so for each pocket we store the first jaw, the mouth vector, 1/length^2 and the outward unit
+    normal. The capture regions are stored as a grid of cells over the table, where each cell lists the pockets whose mouth
+    is within capture_margin of it. Most of the table is empty cells, so most balls skip the pocket test entirely."""
+    def precompute_pockets(self):
+        self.pocket_mouths = []
+        self.pocket_points = [] # center of each pocket mouth. used for drawing.
+        for pocket in self.pockets:
+            jaw1, jaw2 = pocket["jaws"]
+            mx = jaw2[0] - jaw1[0]
+            my = jaw2[1] - jaw1[1]
+            length = math.sqrt(mx*mx + my*my)
+            # jaws are listed in the same (counter-clockwise) order as the walls, so outward is the mouth rotated by -90 degrees.
+            self.pocket_mouths.append([jaw1[0], jaw1[1], mx, my, 1. / (length * length), my / length, -mx / length])
+            self.pocket_points.append([jaw1[0] + mx / 2., jaw1[1] + my / 2.])
+
+        # setting up the grid, covering every wall point plus the margin.
+        self.region_left = min([point[0] for point in self.wall_points]) - self.capture_margin
+        self.region_bottom = min([point[1] for point in self.wall_points]) - self.capture_margin
+        right = max([point[0] for point in self.wall_points]) + self.capture_margin
+        top = max([point[1] for point in self.wall_points]) + self.capture_margin
+        self.region_columns = int(math.ceil((right - self.region_left) / self.region_cell_size))
+        self.region_rows = int(math.ceil((top - self.region_bottom) / self.region_cell_size))
+        self.pocket_regions = []
+        for row in range(self.region_rows):
+            for column in range(self.region_columns):
+                cell_left = self.region_left + column * self.region_cell_size
+                cell_bottom = self.region_bottom + row * self.region_cell_size
+                near_pockets = []
+                for counter in range(len(self.pockets)):
+                    jaw1, jaw2 = self.pockets[counter]["jaws"]
+                    # comparing bounding boxes is conservative, which is all that is needed here.
+                    if (min(jaw1[0], jaw2[0]) - self.capture_margin <= cell_left + self.region_cell_size and
+                            max(jaw1[0], jaw2[0]) + self.capture_margin >= cell_left and
+                            min(jaw1[1], jaw2[1]) - self.capture_margin <= cell_bottom + self.region_cell_size and
+                            max(jaw1[1], jaw2[1]) + self.capture_margin >= cell_bottom):
+                        near_pockets.append(counter)
+                self.pocket_regions.append(near_pockets)
+
+    """Returns the list of pocket indices whose capture region contains the point x,y. Usually this is empty."""
+    def pockets_near(self, x, y):
+        column = int((x - self.region_left) / self.region_cell_size)
+        row = int((y - self.region_bottom) / self.region_cell_size)
+        if column < 0 or row < 0 or column >= self.region_columns or row >= self.region_rows:
+            return []
+        return self.pocket_regions[row * self.region_columns + column]
+
+    """Returns the distance from the point x,y to the mouth of the given pocket. A ball has to travel at least this far
+    before it can be sunk in that pocket."""
+    def distance_to_pocket(self, pocket_index, x, y):
+        jaw1, jaw2 = self.pockets[pocket_index]["jaws"]
+        return point_segment_distance(x, y, jaw1[0], jaw1[1], jaw2[0], jaw2[1])
+
+    """Returns True if a ball of the given radius centered on x,y is on the table: inside the cushion polygon (counting
+    crossings of a ray to the right), clear of every cushion, and not past a pocket mouth (where it would drop straight
+    away, see Impact_Solver.check_for_large_contact)."""
+    def fits(self, x, y, radius):
+        for pocket in self.pockets_near(x, y):
+            jaw1X, jaw1Y, mx, my, inverse_length_sqr, out_x, out_y = self.pocket_mouths[pocket]
+            u = ((x - jaw1X) * mx + (y - jaw1Y) * my) * inverse_length_sqr
+            if u >= 0 and u <= 1 and (x - jaw1X) * out_x + (y - jaw1Y) * out_y > 0:
+                return False
+        inside = False
+        for counter in range(len(self.wall_points)):
+            x1, y1 = self.wall_points[counter - 1]
+            x2, y2 = self.wall_points[counter]
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+            if point_segment_distance(x, y, x1, y1, x2, y2) < radius:
+                return False
+        return inside
+
+    """Returns [left, right], the x positions where the cushions on either side of the table's center line (x = 0) cross
+    height y. A ball of a given radius at height y must be inside [left + radius, right - radius] (see fits)."""
+    def span(self, y):
+        left = -float("inf")
+        right = float("inf")
+        for counter in range(len(self.wall_points)):
+            x1, y1 = self.wall_points[counter - 1]
+            x2, y2 = self.wall_points[counter]
+            if (y1 > y) != (y2 > y):
+                x = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+                if x < 0:
+                    left = max(left, x)
+                else:
+                    right = min(right, x)
+        return [left, right]
+
+    """Finds the corners of the cushion polygon that stick out into the table (the pocket jaws on a standard table). A ball
+    can hit these points directly, rather than a flat cushion. The polygon is counter-clockwise, so these are the
+    points where it turns right."""
+    def precompute_corners(self):
+        self.corner_points = []
+        for counter in range(len(self.segments)):
+            previous = self.segments[counter - 1]
+            current = self.segments[counter]
+            if previous[2] * current[3] - previous[3] * current[2] < 0:
+                self.corner_points.append(self.wall_points[counter])
+
+    """Follows a ball of the given radius from x,y in the direction dx,dy (a unit vector) for up to max_distance, and
+    returns [distance travelled, segment index] for the first cushion it would touch, or None if it doesn't reach one.
+    Each segment is pushed inwards by the radius, so the distance is measured to the ball's center."""
+    def first_cushion_hit(self, x, y, dx, dy, max_distance, radius):
+        closest = None
+        for counter in range(len(self.segments)):
+            wall1X, wall1Y, px, py, inverse_length_sqr, normal_x, normal_y = self.segments[counter]
+            heading = dx * normal_x + dy * normal_y
+            if heading >= 0:
+                # moving away from (or along) the cushion, it can't be hit.
+                continue
+            # solving x + s*dx = wall1 + radius*normal + t*p for s (distance along the ray) and t (position along the wall).
+            ax = wall1X + radius * normal_x - x
+            ay = wall1Y + radius * normal_y - y
+            determinant = px * dy - py * dx
+            if determinant == 0:
+                continue
+            s = (px * ay - py * ax) / determinant
+            t = (dx * ay - dy * ax) / determinant
+            if s >= 0 and s <= max_distance and t >= 0 and t <= 1:
+                if closest == None or s < closest[0]:
+                    closest = [s, counter]
+        return closest
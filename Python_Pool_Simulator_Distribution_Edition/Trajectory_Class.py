@@ -0,0 +1,75 @@
+
+import numpy
+
+"""Returns the indices of a ball's key states: the first one, every state that starts a new straight line path because
+something other than friction changed the ball's velocity (an impact, or being sunk), and the state where friction brings
+the ball to rest. The impact solver records impacts and sinks at the same time as the state before them, so they are easy
+to pick out. Only states from index start on are looked at (index 0 is always included)."""
+def keyframe_indices(ball, start = 1):
+    times = ball.time_record
+    velocity_x = ball.velocity_x_record
+    velocity_y = ball.velocity_y_record
+    indices = [0]
+    for counter in range(max(start, 1), len(times)):
+        if times[counter] == times[counter - 1]:
+            indices.append(counter)
+        elif (velocity_x[counter] == 0 and velocity_y[counter] == 0 and
+              (velocity_x[counter - 1] != 0 or velocity_y[counter - 1] != 0)):
+            indices.append(counter)
+    return indices
+
+
+"""This class answers "where is this ball at time t" for any t, from the ball's key states alone (see keyframe_indices).
+Between key states a ball only feels friction: it moves in a straight line, slowing at mu_sliding * g until it is down to
+sliding_speed, then at mu_rolling * g until it stops. That is the same model the solver integrates step by step, so the
+positions can be worked out exactly instead of looked up in the step history: find the last key state at or before t with
+a binary search, and move the ball on from there. Any number of times can be asked for at once, as a numpy array.
+The solver's first order steps drift from the exact motion, most of all for slow balls, whose steps are long: at the
+BALANCED precision, by up to about a centimeter by the time a ball stops. The key states are the solver's, so a path can
+jump by that much at an impact or where the ball comes to rest, and the final positions are exactly the solver's.
+The physics constants are taken from the ball, so per table physics (see Table_Class.set_physics) is respected."""
+class Trajectory():
+
+    def __init__(self, ball):
+        indices = keyframe_indices(ball)
+        self.times = numpy.array([ball.time_record[index] for index in indices], dtype = float)
+        # a sunk ball's position is None, which becomes nan here, and stays nan for every later time.
+        self.x = numpy.array([numpy.nan if ball.position_x_record[index] == None else ball.position_x_record[index]
+                              for index in indices], dtype = float)
+        self.y = numpy.array([numpy.nan if ball.position_y_record[index] == None else ball.position_y_record[index]
+                              for index in indices], dtype = float)
+        self.velocity_x = numpy.array([ball.velocity_x_record[index] for index in indices], dtype = float)
+        self.velocity_y = numpy.array([ball.velocity_y_record[index] for index in indices], dtype = float)
+        self.speeds = numpy.sqrt(self.velocity_x**2 + self.velocity_y**2)
+        self.sliding_deceleration = ball.mu_sliding * ball.g
+        self.rolling_deceleration = ball.mu_rolling * ball.g
+        self.sliding_speed = ball.sliding_speed
+
+    """Returns [x, y, velocity x, velocity y] at each of the given times (a number or an array), as numpy arrays the shape of
+    times. Positions are nan once the ball has been sunk. Times before the first key state give the first key state."""
+    def states_at(self, times):
+        times = numpy.asarray(times, dtype = float)
+        index = numpy.maximum(numpy.searchsorted(self.times, times, side = "right") - 1, 0)
+        elapsed = numpy.maximum(times - self.times[index], 0)
+        speed = self.speeds[index]
+        # sliding, until the ball is down to sliding_speed (if it was going that fast to begin with).
+        sliding_time = numpy.maximum(speed - self.sliding_speed, 0) / self.sliding_deceleration
+        time = numpy.minimum(elapsed, sliding_time)
+        distance = speed * time - .5 * self.sliding_deceleration * time**2
+        new_speed = speed - self.sliding_deceleration * time
+        # then rolling, until it stops.
+        time = numpy.clip(elapsed - sliding_time, 0, new_speed / self.rolling_deceleration)
+        distance += new_speed * time - .5 * self.rolling_deceleration * time**2
+        new_speed -= self.rolling_deceleration * time
+        moving = speed > 0
+        direction_x = numpy.where(moving, self.velocity_x[index] / numpy.where(moving, speed, 1), 0)
+        direction_y = numpy.where(moving, self.velocity_y[index] / numpy.where(moving, speed, 1), 0)
+        return [self.x[index] + direction_x * distance, self.y[index] + direction_y * distance, direction_x * new_speed,
+                direction_y * new_speed]
+
+    """Returns [x, y, velocity x, velocity y] at a single time, or None if the ball has been sunk by then."""
+    def state_at(self, time):
+        state = [float(value) for value in self.states_at(time)]
+        if numpy.isnan(state[0]):
+            return None
+        return state